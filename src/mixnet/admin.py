@@ -0,0 +1,256 @@
+import abc
+import asyncio
+import collections
+import cProfile
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from mixnet.mixnet_pb2 import (
+    PeerStatus,
+    ProfileResponse,
+    QueueStatus,
+    StartProfileRequest,
+    StatusResponse,
+)
+from mixnet.mixnet_pb2_grpc import AdminServicer
+
+
+class Profiler:
+    """Profiles a running node on demand, for some seconds or rounds, or until stopped.
+    A sampling profile has a thread sample the stack of the event loop's thread every
+    `sample_interval` seconds and writes the samples as collapsed stacks, one
+    `frame;frame;... count` line per stack, as flame graph tools read them. A
+    deterministic profile runs cProfile on the event loop's thread and writes pstats.
+    Profiles are written to `output_dir`, named after the node. While no profile runs,
+    the profiler costs a single check at the end of each round.
+    """
+
+    def __init__(self, node_id: str, output_dir: Optional[str] = None):
+        self._node_id = node_id
+        self._output_dir = output_dir or tempfile.gettempdir()
+        self._done: Optional[asyncio.Future] = None
+        self._path: Optional[str] = None
+        self._rounds_left = 0
+
+    @property
+    def active(self) -> bool:
+        return self._done is not None
+
+    async def profile(
+        self,
+        deterministic: bool = False,
+        seconds: float = 0,
+        rounds: int = 0,
+        sample_interval: float = 0.005,
+    ) -> str:
+        """Profiles until `seconds` passed or `rounds` rounds ended, whichever is first,
+        or until `stop` is called.
+
+        Raises:
+            RuntimeError: a profile is already running
+
+        Returns:
+            str: the path of the profile
+        """
+        if self.active:
+            raise RuntimeError(f"A profile is already running, into {self._path}")
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        extension = "pstats" if deterministic else "collapsed"
+        path = os.path.join(
+            self._output_dir, f"{self._node_id}_profile_{timestamp}.{extension}"
+        )
+        self._path = path
+        self._done = asyncio.get_running_loop().create_future()
+        self._rounds_left = rounds
+        if deterministic:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            sampler = _Sampler(threading.get_ident(), sample_interval)
+            sampler.start()
+        try:
+            async with asyncio.timeout(seconds or None):
+                await self._done
+        except TimeoutError:
+            pass
+        finally:
+            self._done = None
+            self._rounds_left = 0
+            if deterministic:
+                profiler.disable()
+                await asyncio.to_thread(profiler.dump_stats, path)
+            else:
+                sampler.stop()
+                await asyncio.to_thread(sampler.write, path)
+        return path
+
+    def stop(self) -> Optional[str]:
+        """Ends the running profile, returning its path, or None if none runs."""
+        if self._done is None:
+            return None
+        if not self._done.done():
+            self._done.set_result(None)
+        return self._path
+
+    def round_ended(self):
+        """Called by the node at the end of each round."""
+        if self._rounds_left:
+            self._rounds_left -= 1
+            if not self._rounds_left:
+                self.stop()
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stopped = threading.Event()
+        self.samples: "collections.Counter[str]" = collections.Counter()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def write(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class PeerLatency:
+    """The forwards to one peer: their count, failures and latencies, kept in a few
+    numbers updated on every forward, for status snapshots.
+    """
+
+    __slots__ = ("forwards", "failures", "last", "mean", "max")
+
+    # Weight of the latest forward in the moving average
+    SMOOTHING = 1 / 16
+
+    def __init__(self):
+        self.forwards = 0
+        self.failures = 0
+        self.last = 0.0
+        self.mean = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float, failed: bool = False):
+        self.mean = (
+            seconds
+            if not self.forwards
+            else self.mean + (seconds - self.mean) * self.SMOOTHING
+        )
+        self.forwards += 1
+        self.failures += failed
+        self.last = seconds
+        self.max = max(self.max, seconds)
+
+    def status(self, address: str, circuit_open: bool = False) -> PeerStatus:
+        return PeerStatus(
+            address=address,
+            forwards=self.forwards,
+            failures=self.failures,
+            last_latency=self.last,
+            mean_latency=self.mean,
+            max_latency=self.max,
+            circuit_open=circuit_open,
+        )
+
+
+class Queues:
+    """Counts the messages a node holds, and their bytes, by round."""
+
+    def __init__(self):
+        self._queues: Dict[int, QueueStatus] = {}
+        self.bytes = 0
+
+    def add(self, round: int, messages: int, size: int):
+        queue = self._queues.get(round)
+        if queue is None:
+            queue = self._queues[round] = QueueStatus(round=round)
+        queue.messages += messages
+        queue.bytes += size
+        self.bytes += size
+
+    def status(self) -> List[QueueStatus]:
+        return [self._queues[round] for round in sorted(self._queues)]
+
+
+class AdminService(AdminServicer, abc.ABC):
+    """The Admin gRPC service, served by every node next to its own service. The node
+    creates its `_profiler`, and takes its status snapshot in `status`.
+    """
+
+    _profiler: Profiler
+
+    @abc.abstractmethod
+    def status(self) -> StatusResponse:
+        """The node's status snapshot, which GetStatus returns."""
+
+    async def StartProfile(self, request, context):
+        """A gRPC API method to profile the node, responding once the profile ended
+
+        Args:
+            request (StartProfileRequest): gRPC request with the mode and the duration
+            context (_type_): gRPC context
+
+        Returns:
+            ProfileResponse: the path of the profile, or why it could not run
+        """
+        try:
+            path = await self._profiler.profile(
+                deterministic=request.mode == StartProfileRequest.DETERMINISTIC,
+                seconds=request.seconds,
+                rounds=request.rounds,
+                sample_interval=request.sample_interval or 0.005,
+            )
+        except RuntimeError as e:
+            return ProfileResponse(status=False, error=str(e))
+        return ProfileResponse(status=True, path=path)
+
+    async def StopProfile(self, request, context):
+        """A gRPC API method to end the running profile early
+
+        Args:
+            request (StopProfileRequest): gRPC request
+            context (_type_): gRPC context
+
+        Returns:
+            ProfileResponse: the path of the profile, which StartProfile also returns
+        """
+        path = self._profiler.stop()
+        if path is None:
+            return ProfileResponse(status=False, error="No profile is running")
+        return ProfileResponse(status=True, path=path)
+
+    async def GetStatus(self, request, context):
+        """A gRPC API method for a snapshot of the node's round progress, queues and
+        peers, taken without awaiting anything, so it answers even while rounds are
+        stuck.
+
+        Args:
+            request (GetStatusRequest): gRPC request
+            context (_type_): gRPC context
+
+        Returns:
+            StatusResponse: the node's status
+        """
+        return self.status()
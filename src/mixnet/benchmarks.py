@@ -1,15 +1,38 @@
 import asyncio
+import json
+import logging
 import os
+import random
+import subprocess
+import sys
+import tempfile
 import time
-from typing import List
+import tracemalloc
+from typing import List, Optional, Tuple
 
-import matplotlib.pyplot as plt
-import pandas as pd
+import yaml
 
-from mixnet.client import Client
+from mixnet.compression import Compressor, train_dictionary, zstandard
+from mixnet.crypto import decrypt, encrypt, generate_key_pair
+from mixnet.eventloop import loop_factory, run, run_from_env
+from mixnet.mixnet_pb2 import ForwardMessageRequest, PollMessagesRequest
 from mixnet.models import Client as ClientConfig
-from mixnet.models import Config, Server
+from mixnet.models import Config, Forwarding, Fragmentation, GrpcTuning, Server
+from mixnet.onion import Route, build_onion, encode_layer
+from mixnet.routing import RoutingTable
 from mixnet.server import MixServer
+from mixnet.testing import Cluster, StandInServer
+from mixnet.timer_wheel import TimerWheel
+from mixnet.transport import GrpcTransport, InMemoryTransport
+from mixnet.wire import (
+    ForwardBatch,
+    ForwardFrame,
+    parse_forward_request,
+    serialize_forward_request,
+    split_batch,
+)
+
+MESSAGE_SIZES = [10, 100, 1000, 10000, 100000, 1000000]
 
 
 def generate_config(num_clients: int, message_size: int = 10) -> Config:
@@ -37,7 +60,7 @@ def generate_config(num_clients: int, message_size: int = 10) -> Config:
 async def main():
     results = []
     num_clients_list = list(range(2, 11))
-    message_sizes = [10, 100, 1000, 10000, 100000, 1000000]
+    message_sizes = MESSAGE_SIZES
     for num_clients in num_clients_list:
         for message_size in message_sizes:
             print(f"Testing with {num_clients} clients and message size {message_size}")
@@ -51,6 +74,13 @@ async def main():
                     "mix_latency": mix_latency,
                 }
             )
+    plot_results(results, num_clients_list, message_sizes)
+
+
+def plot_results(results: List[dict], num_clients_list: List[int], message_sizes):
+    # Plotting dependencies are only needed here, not by the other benchmarks
+    import matplotlib.pyplot as plt
+    import pandas as pd
 
     df = pd.DataFrame(results)
 
@@ -89,96 +119,678 @@ async def main():
 
 
 async def test(num_clients: int, message_size: int):
-    config = generate_config(num_clients=num_clients, message_size=message_size)
-    config_dir = "config"
-    output_dir = "output"
-    metrics = {}
-
-    # Create servers
-    servers: List[MixServer] = []
-    for server in config.mix_servers:
-        port = int(server.address.split(":")[1])
-        servers.append(
-            MixServer(
-                server.id,
-                port,
-                config.messages_per_round,
-                [client.address for client in config.clients],
-                config_dir=config_dir,
-                output_dir=output_dir,
-                round_duration=config.round_duration,
-                enable_metrics=True,
-                metrics=metrics,
-            )
-        )
-        metrics[server.id] = {}
-    # Start servers asynchronously
-    await asyncio.gather(*(server.start() for server in servers))
-    print("Servers started successfully")
-
-    # Collect mix addresses and public keys
-    mix_addrs = []
-    mix_pubkeys = []
-    for server in config.mix_servers:
-        mix_addrs.append(server.address)
-        pubkey_path = os.path.join(config_dir, f"{server.id}.key")
-        with open(pubkey_path, "rb") as f:
-            mix_pubkeys.append(f.read())
-
-    # Create clients
-    clients: List[Client] = []
-    for client in config.clients:
-        port = int(client.address.split(":")[1])
-        clients.append(
-            Client(
-                client.id,
-                client.address,
-                port,
-                config_dir=config_dir,
-                mix_pubkeys=mix_pubkeys,
-                mix_addrs=mix_addrs,
-                dummy_payload=config.dummy_payload,
-                enable_metrics=True,
-                metrics=metrics,
-            )
-        )
-        metrics[client.id] = {}
-    await asyncio.gather(*(client.start() for client in clients))
-
-    # get two clients
-    client_1 = clients[0]
-    client_2 = clients[1]
-    client_2_pubkey_path = os.path.join(config_dir, f"{client_2._id}.key")
-    with open(client_2_pubkey_path, "rb") as f:
-        client_2_pubkey = f.read()
-
-    start_time = time.perf_counter_ns()
-    await client_1._prepare_message(
-        message_size * "y",
-        client_2_pubkey,
-        client_2._addr,
-    )
-    messages = []
-    while not messages:
-        await asyncio.sleep(0.1)
-        messages = await client_2._poll_messages(config.mix_servers[2].address)
-    end_time = time.perf_counter_ns()
-    await asyncio.gather(*(client.stop() for client in clients))
-    await asyncio.sleep(1)
-    await asyncio.gather(*(server.stop() for server in servers))
+    async with Cluster(
+        num_clients=num_clients,
+        round_duration=0.1,
+        dummy_payload=message_size * "x",
+        enable_metrics=True,
+    ) as cluster:
+        print("Servers and clients started successfully")
+        metrics = cluster.metrics
+        start_time = time.perf_counter_ns()
+        await cluster.send("client_1", message_size * "y", "client_2")
+        await cluster.receive("client_2", timeout=60)
+        end_time = time.perf_counter_ns()
     print("Servers and clients stopped successfully.")
     E2E_time = (end_time - start_time) / 1_000_000_000
     prepare_time = (
-        metrics[client_1._id]["prepare_end_time"]
-        - metrics[client_1._id]["prepare_start_time"]
+        metrics["client_1"]["prepare_end_time"]
+        - metrics["client_1"]["prepare_start_time"]
     ) / 1_000_000_000
     mix_latency = (
-        metrics[servers[2]._id]["round_end_time"]
-        - metrics[servers[0]._id]["round_start_time"]
+        metrics["server_3"]["round_end_time"] - metrics["server_1"]["round_start_time"]
     ) / 1_000_000_000
     print(f"{E2E_time=}, {prepare_time=}, {mix_latency=}")
     return E2E_time, prepare_time, mix_latency
 
 
+def hop_benchmark(repeats: int = 20):
+    """Measures a single mix hop: parsing the received request, peeling the layer and
+    serializing the forwarded request. Reports the time per hop and the peak memory
+    allocated by a hop in multiples of the message size (i.e. the number of copies).
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        server = MixServer("server_1", 0, 1, RoutingTable(), tmpdir, tmpdir)
+        for message_size in MESSAGE_SIZES:
+            layer = encode_layer(message_size * b"y", 2)
+            packet = encrypt(layer, server._pubkey_b64)
+            data = ForwardMessageRequest(payload=packet, round=0).SerializeToString()
+
+            def hop():
+                frame = parse_forward_request(data)
+                message = server._peel(frame.payload, frame.round)
+                return serialize_forward_request(ForwardFrame(message.payload, 0))
+
+            start_time = time.perf_counter_ns()
+            for _ in range(repeats):
+                hop()
+            hop_time = (time.perf_counter_ns() - start_time) / repeats / 1_000_000_000
+            tracemalloc.start()
+            hop()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            copies = peak / message_size
+            print(f"{message_size=}, {hop_time=:.6f}, {copies=:.2f}")
+
+
+def startup_benchmark(runs: int = 5):
+    """Measures the wall time of one-shot CLI invocations, from process start to exit.
+    The commands target a client that is not running, so they fail right after the
+    first RPC attempt and the measurement is dominated by interpreter start-up and
+    imports. Reports the best of `runs` invocations of each command.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = os.path.join(tmpdir, "config.yaml")
+        config = generate_config(num_clients=2)
+        with open(config_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(config.model_dump(), f)
+        with open(os.path.join(tmpdir, "client_2.key"), "wb") as f:
+            f.write(b"unused")
+        cli = [sys.executable, "-m", "mixnet.cli"]
+        commands = {
+            "python": [sys.executable, "-c", "pass"],
+            "help": [*cli, "--help"],
+            "poll-messages": [
+                *cli,
+                "poll-messages",
+                "--client-id",
+                "client_1",
+                "--config",
+                config_path,
+            ],
+            "prepare-message": [
+                *cli,
+                "prepare-message",
+                "--message",
+                "hi",
+                "--sender-id",
+                "client_1",
+                "--recipient-id",
+                "client_2",
+                "--config",
+                config_path,
+            ],
+        }
+        for name, argv in commands.items():
+            times = []
+            for _ in range(runs):
+                start_time = time.perf_counter_ns()
+                subprocess.run(argv, capture_output=True)
+                times.append((time.perf_counter_ns() - start_time) / 1_000_000_000)
+            startup_time = min(times)
+            print(f"{name}: {startup_time=:.3f}")
+
+
+def timer_benchmark(counts=(10_000, 100_000, 1_000_000), max_delay: int = 10_000):
+    """Measures the insert and expire rates of the timer wheel that schedules per-packet
+    mixing delays, for growing numbers of packets in flight with random delays of up to
+    `max_delay` ticks. For comparison, it measures scheduling the same number of
+    per-packet asyncio timers (a heap, O(log n) per operation) spread over one second.
+    """
+    rng = random.Random(0)
+    for count in counts:
+        delays = [rng.randrange(1, max_delay) for _ in range(count)]
+
+        wheel = TimerWheel()
+        start_time = time.perf_counter_ns()
+        for item, delay in enumerate(delays):
+            wheel.insert(item, delay)
+        insert_time = time.perf_counter_ns() - start_time
+        start_time = time.perf_counter_ns()
+        expired = len(wheel.advance(max_delay))
+        expire_time = time.perf_counter_ns() - start_time
+        assert expired == count
+        inserts_per_sec = count / insert_time * 1_000_000_000
+        expires_per_sec = count / expire_time * 1_000_000_000
+        print(f"wheel: {count=}, {inserts_per_sec=:.0f}, {expires_per_sec=:.0f}")
+
+        async def asyncio_timers():
+            loop = asyncio.get_running_loop()
+            done = asyncio.Event()
+            fired = 0
+
+            def fire():
+                nonlocal fired
+                fired += 1
+                if fired == count:
+                    done.set()
+
+            start_time = time.perf_counter_ns()
+            for delay in delays:
+                loop.call_later(delay / max_delay, fire)
+            insert_time = time.perf_counter_ns() - start_time
+            await done.wait()
+            return insert_time
+
+        insert_time = asyncio.run(asyncio_timers())
+        inserts_per_sec = count / insert_time * 1_000_000_000
+        print(f"asyncio: {count=}, {inserts_per_sec=:.0f}")
+
+
+async def transport_round(num_clients: int, message_size: int, transport) -> float:
+    """Sends one message from every client to the next one and returns the time until
+    all of them were received.
+    """
+    async with Cluster(
+        num_clients=num_clients,
+        round_duration=0.05,
+        dummy_payload=message_size * "x",
+        transport=transport,
+    ) as cluster:
+        ids = cluster.client_ids
+        start_time = time.perf_counter_ns()
+        for sender, recipient in zip(ids, ids[1:] + ids[:1]):
+            await cluster.send(sender, message_size * "y", recipient)
+        await asyncio.gather(*(cluster.receive(id, timeout=60) for id in ids))
+        return (time.perf_counter_ns() - start_time) / 1_000_000_000
+
+
+def transport_benchmark(num_clients_list=(10, 50, 200), message_size: int = 1000):
+    """Compares the end-to-end time of a round over gRPC and over the in-memory
+    transport, which leaves only the crypto and mixing costs.
+    """
+    for num_clients in num_clients_list:
+        grpc_time = asyncio.run(transport_round(num_clients, message_size, None))
+        memory_time = asyncio.run(
+            transport_round(num_clients, message_size, InMemoryTransport())
+        )
+        print(f"{num_clients=}, {grpc_time=:.3f}, {memory_time=:.3f}")
+
+
+def compression_benchmark(count: int = 200):
+    """Measures the onion size and the client's prepare and decrypt time per message
+    for gateway-like JSON payloads, with each compression codec available.
+    """
+    rng = random.Random(0)
+    words = ["hello", "meeting", "tomorrow", "at", "the", "office", "ok", "thanks"]
+    payloads = [
+        json.dumps(
+            {
+                "type": "chat",
+                "conversation": f"conv-{rng.randrange(100)}",
+                "text": " ".join(
+                    rng.choice(words) for _ in range(rng.randrange(5, 60))
+                ),
+            }
+        ).encode()
+        for _ in range(count)
+    ]
+    mix_keys = [generate_key_pair()[1] for _ in range(3)]
+    route = Route(mix_keys, [1, 2, 3])
+    recipient_priv, recipient_pub = generate_key_pair()
+    compressors = {
+        "none": Compressor(),
+        "zlib": Compressor("zlib"),
+        "zlib+dictionary": Compressor("zlib", train_dictionary("zlib", payloads[::2])),
+    }
+    if zstandard:
+        compressors["zstd"] = Compressor("zstd")
+    for name, compressor in compressors.items():
+        start_time = time.perf_counter_ns()
+        onions = [
+            build_onion(compressor.compress(payload), recipient_pub, 4, route)
+            for payload in payloads
+        ]
+        prepare_time = (time.perf_counter_ns() - start_time) / count / 1_000_000_000
+        innermost = [
+            encrypt(compressor.compress(payload), recipient_pub) for payload in payloads
+        ]
+        start_time = time.perf_counter_ns()
+        for ciphertext in innermost:
+            compressor.decompress(decrypt(ciphertext, recipient_priv))
+        decrypt_time = (time.perf_counter_ns() - start_time) / count / 1_000_000_000
+        onion_size = sum(len(onion) for onion in onions) / count
+        print(f"{name}: {onion_size=:.0f}, {prepare_time=:.6f}, {decrypt_time=:.6f}")
+
+
+async def grpc_profile_run(
+    tuning: GrpcTuning, count: int, concurrency: int, message_size: int
+) -> Tuple[float, float]:
+    """Sends `count` packets of `message_size` bytes to a mix server, first as single
+    ForwardMessage calls (`concurrency` at a time) and then as one ForwardMessages
+    batch, returning the throughput of both in MB/s.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        server = MixServer(
+            "server_1",
+            0,
+            10**9,  # Never complete a round, so that only receiving is measured
+            RoutingTable(),
+            None,
+            tmpdir,
+            transport=GrpcTransport(tuning),
+        )
+        await server.start()
+        address = f"localhost:{server.port}"
+        # Mix servers drop packets they already received, so every packet is distinct
+        packets = [
+            encrypt(encode_layer(message_size * b"y", 2), server.pubkey)
+            for _ in range(2 * count)
+        ]
+        transport = GrpcTransport(tuning)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(packet: bytes):
+            async with semaphore:
+                await transport.call(address, "ForwardMessage", ForwardFrame(packet, 0))
+
+        start_time = time.perf_counter_ns()
+        await asyncio.gather(*(send(packet) for packet in packets[:count]))
+        single_time = (time.perf_counter_ns() - start_time) / 1_000_000_000
+        start_time = time.perf_counter_ns()
+        await asyncio.gather(
+            *(
+                transport.call(address, "ForwardMessages", ForwardBatch(chunk, 0))
+                for chunk in split_batch(packets[count:], transport.max_batch_bytes)
+            )
+        )
+        batch_time = (time.perf_counter_ns() - start_time) / 1_000_000_000
+        await transport.close()
+        await server.stop()
+    size = count * len(packets[0]) / 1_000_000
+    return size / single_time, size / batch_time
+
+
+def grpc_benchmark(
+    count: int = 32, concurrency: int = 8, message_size: int = 1_000_000
+):
+    """Compares gRPC tuning profiles on 1 MB packets sent to a mix server."""
+    profiles = {
+        "grpc defaults": GrpcTuning(max_message_bytes=None),
+        "default profile": GrpcTuning(),
+        "16 MB windows": GrpcTuning(initial_window_bytes=16 * 1024 * 1024),
+        "gzip": GrpcTuning(compression="gzip"),
+    }
+    for name, tuning in profiles.items():
+        single_mbps, batch_mbps = asyncio.run(
+            grpc_profile_run(tuning, count, concurrency, message_size)
+        )
+        print(f"{name}: {single_mbps=:.0f}, {batch_mbps=:.0f}")
+
+
+async def channel_pool_run(calls: int) -> Tuple[float, float]:
+    """Times `calls` sequential calls to a mix server over the transport's pooled
+    channel, and with a new channel for every call, returning the time per call of both.
+    """
+    server = MixServer("server_1", 0, 1, RoutingTable(), None, None)
+    await server.start()
+    address = f"localhost:{server.port}"
+    transport = GrpcTransport()
+    request = PollMessagesRequest(client_addr="localhost:1")
+    await transport.call(address, "PollMessages", request)
+    start_time = time.perf_counter_ns()
+    for _ in range(calls):
+        await transport.call(address, "PollMessages", request)
+    pooled_time = (time.perf_counter_ns() - start_time) / calls / 1_000_000_000
+    start_time = time.perf_counter_ns()
+    for _ in range(calls):
+        await transport.call(address, "PollMessages", request)
+        await transport.close()
+    fresh_time = (time.perf_counter_ns() - start_time) / calls / 1_000_000_000
+    await server.stop()
+    return pooled_time, fresh_time
+
+
+def routing_benchmark(repeats: int = 5):
+    """Measures resolving the next hops of a round at the exit mix, where every client
+    receives one message: looking the addresses up in the list of client addresses
+    against resolving node IDs with the routing table. Also compares calls over pooled
+    gRPC channels with opening a channel per call.
+    """
+    for num_clients in (10, 100, 1000, 5000):
+        client_addrs = [
+            f"client-{i}.example.org:{50101 + i}" for i in range(num_clients)
+        ]
+        routing = RoutingTable(
+            [f"localhost:{50051 + i}" for i in range(3)], client_addrs
+        )
+        addresses = client_addrs[::-1]
+        node_ids = [routing.node_id(address) for address in addresses]
+        start_time = time.perf_counter_ns()
+        for _ in range(repeats):
+            for address in addresses:
+                _ = address in client_addrs
+        list_time = (time.perf_counter_ns() - start_time) / repeats / 1_000_000_000
+        start_time = time.perf_counter_ns()
+        for _ in range(repeats):
+            for node_id in node_ids:
+                routing.is_client(node_id) and routing.address(node_id)
+        table_time = (time.perf_counter_ns() - start_time) / repeats / 1_000_000_000
+        address_bytes = 2 + len(client_addrs[-1].encode())
+        print(f"{num_clients=}, {list_time=:.6f}, {table_time=:.6f}, {address_bytes=}")
+    pooled_time, fresh_time = asyncio.run(channel_pool_run(200))
+    print(f"{pooled_time=:.6f}, {fresh_time=:.6f}")
+
+
+async def fault_run(
+    forwarding: Forwarding, rounds: int, stall_rate: float, stall_time: float
+) -> Tuple[List[float], float]:
+    """Runs `rounds` rounds of 10 messages through a mix server whose next hop is a
+    stand-in that stalls a fraction of the forwards. Returns the sorted output time of
+    every round, and the fraction of the messages that reached the stand-in.
+    """
+    messages_per_round = 10
+    transport = InMemoryTransport()
+    stand_in = StandInServer(
+        transport, stall_rate=stall_rate, stall_time=stall_time, seed=0
+    )
+    await stand_in.start()
+    metrics = {"server_1": {}}
+    server = MixServer(
+        "server_1",
+        0,
+        messages_per_round,
+        RoutingTable([f"localhost:{stand_in.port}"]),
+        None,
+        None,
+        enable_metrics=True,
+        metrics=metrics,
+        transport=transport,
+        forwarding=forwarding,
+    )
+    await server.start()
+    address = f"localhost:{server.port}"
+    for round in range(rounds):
+        packets = [
+            encrypt(encode_layer(100 * b"y", 1), server.pubkey)
+            for _ in range(messages_per_round)
+        ]
+        await transport.call(address, "ForwardMessages", ForwardBatch(packets, round))
+    while len(metrics["server_1"].get("output_times", [])) < rounds:
+        await asyncio.sleep(0.01)
+    await server.stop()
+    await stand_in.stop()
+    output_times = sorted(
+        t / 1_000_000_000 for t in metrics["server_1"]["output_times"]
+    )
+    return output_times, len(stand_in.received) / (rounds * messages_per_round)
+
+
+def fault_benchmark(
+    rounds: int = 200, stall_rate: float = 0.05, stall_time: float = 0.5
+):
+    """Measures the output time of rounds at a mix server whose next hop stalls 5% of
+    the forwards for 0.5 s, without deadlines, with deadlines and retries, and with
+    hedged forwards to the exit mix as well.
+    """
+    policies = {
+        "no deadline": Forwarding(deadline=None, retries=0),
+        "deadline + retries": Forwarding(deadline=0.02, retries=2, backoff=0.005),
+        "hedged": Forwarding(
+            deadline=0.02, retries=2, backoff=0.005, hedge_delay=0.005
+        ),
+    }
+    for name, forwarding in policies.items():
+        output_times, delivered = asyncio.run(
+            fault_run(forwarding, rounds, stall_rate, stall_time)
+        )
+        p50 = output_times[len(output_times) // 2]
+        p99 = output_times[int(len(output_times) * 0.99)]
+        print(
+            f"{name}: {p50=:.4f}, {p99=:.4f}, max={output_times[-1]:.4f}, {delivered=:.3f}"
+        )
+
+
+async def host_run(num_clients: int, client_host: bool) -> Tuple[float, float, float]:
+    """Starts a cluster whose clients are separate nodes or identities of one client
+    host, and sends one message from every client to the next one. Returns the start
+    time, the memory allocated by the start in KB per client, and the round time.
+    """
+    tracemalloc.start()
+    start_time = time.perf_counter_ns()
+    cluster = Cluster(
+        num_clients=num_clients, round_duration=0.05, client_host=client_host
+    )
+    await cluster.start()
+    start_seconds = (time.perf_counter_ns() - start_time) / 1_000_000_000
+    memory_kb = tracemalloc.get_traced_memory()[0] / num_clients / 1024
+    tracemalloc.stop()
+    try:
+        ids = cluster.client_ids
+        start_time = time.perf_counter_ns()
+        for sender, recipient in zip(ids, ids[1:] + ids[:1]):
+            await cluster.send(sender, "hello", recipient)
+        await asyncio.gather(*(cluster.receive(id, timeout=60) for id in ids))
+        round_seconds = (time.perf_counter_ns() - start_time) / 1_000_000_000
+    finally:
+        await cluster.stop()
+    return start_seconds, memory_kb, round_seconds
+
+
+def host_benchmark(num_clients_list=(50, 200, 500)):
+    """Compares running every client as its own node (a listener and a round task
+    each) with serving them all from one client host.
+    """
+    for num_clients in num_clients_list:
+        for client_host in (False, True):
+            start_time, memory_kb, round_time = asyncio.run(
+                host_run(num_clients, client_host)
+            )
+            print(
+                f"{num_clients=}, {client_host=}, {start_time=:.3f}, "
+                f"{memory_kb=:.1f}, {round_time=:.3f}"
+            )
+
+
+def session_benchmark(num_clients_list=(100, 1000), rounds: int = 16, epoch: int = 16):
+    """Measures the CPU time per round of building every client's packet and of
+    peeling the packets at the three mix servers, with every layer sealed under its own
+    ephemeral key pair against session mode with `epoch`-round epochs.
+    """
+    for num_clients in num_clients_list:
+        for session_epoch in (None, epoch):
+            servers = [
+                MixServer(
+                    f"server_{i + 1}",
+                    0,
+                    num_clients,
+                    RoutingTable(),
+                    None,
+                    None,
+                    session_epoch=session_epoch,
+                )
+                for i in range(3)
+            ]
+            route = Route([server.pubkey for server in servers], [1, 2, 3])
+            _, pubkey = generate_key_pair()
+            sessions = [
+                route.open_sessions(session_epoch, 0) if session_epoch else None
+                for _ in range(num_clients)
+            ]
+            client_time = mix_time = 0.0
+            for round in range(rounds):
+                start_time = time.process_time()
+                packets = [
+                    build_onion(b"y" * 100, pubkey, 4, route, client_sessions, round)
+                    for client_sessions in sessions
+                ]
+                client_time += time.process_time() - start_time
+                start_time = time.process_time()
+                for server in servers:
+                    packets = [
+                        server._peel(packet, round).payload for packet in packets
+                    ]
+                mix_time += time.process_time() - start_time
+            print(
+                f"{num_clients=}, {session_epoch=}, client_time={client_time / rounds:.4f}, "
+                f"mix_time={mix_time / rounds:.4f}"
+            )
+
+
+async def aggregation_run(
+    num_clients: int, messages: int, aggregate_bytes: Optional[int]
+) -> Tuple[int, float, int]:
+    """Sends `messages` short messages from every client to the next one, and returns
+    the rounds they took, the time until all were received and the packet size.
+    """
+    async with Cluster(
+        num_clients=num_clients,
+        round_duration=0.05,
+        transport=InMemoryTransport(),
+        aggregate_bytes=aggregate_bytes,
+    ) as cluster:
+        ids = cluster.client_ids
+        packet_sizes = []
+        first_server = cluster.servers[0]
+        forward = first_server.ForwardMessage
+
+        async def record(request, context):
+            packet_sizes.append(len(request.payload))
+            return await forward(request, context)
+
+        first_server.ForwardMessage = record
+        start_time = time.perf_counter_ns()
+        rounds = set()
+        for i in range(messages):
+            for sender, recipient in zip(ids, ids[1:] + ids[:1]):
+                rounds.add(await cluster.send(sender, f"message {i:04}", recipient))
+        await asyncio.gather(
+            *(cluster.receive(id, count=messages, timeout=60) for id in ids)
+        )
+        seconds = (time.perf_counter_ns() - start_time) / 1_000_000_000
+    return len(rounds), seconds, max(packet_sizes)
+
+
+def aggregation_benchmark(num_clients: int = 10, messages: int = 8):
+    """Compares sending several short messages per client with one message per packet
+    against bundling them in 1 KB packets.
+    """
+    for aggregate_bytes in (None, 1024):
+        rounds, seconds, packet_bytes = asyncio.run(
+            aggregation_run(num_clients, messages, aggregate_bytes)
+        )
+        print(f"{aggregate_bytes=}, {rounds=}, {seconds=:.3f}, {packet_bytes=}")
+
+
+async def fragment_run(
+    message_bytes: int, fragmentation: Optional[Fragmentation]
+) -> Tuple[float, float]:
+    """Sends one large message over gRPC, returning the time until it was received and
+    the longest output stage of a round at any mix server.
+    """
+    message = os.urandom(message_bytes // 2).hex()
+    async with Cluster(
+        round_duration=0.05, enable_metrics=True, fragmentation=fragmentation
+    ) as cluster:
+        start_time = time.perf_counter_ns()
+        await cluster.send("client_1", message, "client_2")
+        assert await cluster.receive("client_2", timeout=60) == [message]
+        seconds = (time.perf_counter_ns() - start_time) / 1_000_000_000
+        longest_stage = max(
+            max(cluster.metrics[server._id]["output_times"])
+            for server in cluster.servers
+        )
+    return seconds, longest_stage / 1_000_000_000
+
+
+def fragment_benchmark(message_sizes=(100_000, 1_000_000, 4_000_000)):
+    """Compares sending a large message as one packet with splitting it into 64 KB
+    erasure-coded fragments, sent over the following rounds.
+    """
+    for message_bytes in message_sizes:
+        for fragmentation in (None, Fragmentation(fragment_bytes=64 * 1024)):
+            seconds, longest_stage = asyncio.run(
+                fragment_run(message_bytes, fragmentation)
+            )
+            print(
+                f"{message_bytes=}, fragmented={fragmentation is not None}, "
+                f"{seconds=:.3f}, {longest_stage=:.4f}"
+            )
+
+
+async def loop_run(num_packets: int, rounds: int) -> float:
+    """Sends `rounds` rounds of `num_packets` concurrent ForwardMessage calls over gRPC
+    to a mix server whose next hop is a stand-in, returning the packets per second.
+    """
+    transport = GrpcTransport()
+    stand_in = StandInServer(transport)
+    await stand_in.start()
+    server = MixServer(
+        "server_1",
+        0,
+        num_packets,
+        RoutingTable([f"localhost:{stand_in.port}"]),
+        None,
+        None,
+        transport=transport,
+    )
+    await server.start()
+    address = f"localhost:{server.port}"
+    # Every packet is distinct, or the mix server would drop the copies as replays
+    packets = [
+        [
+            encrypt(encode_layer(100 * b"y", 1), server.pubkey)
+            for _ in range(num_packets)
+        ]
+        for _ in range(rounds)
+    ]
+    start_time = time.perf_counter_ns()
+    for round in range(rounds):
+        await asyncio.gather(
+            *(
+                transport.call(address, "ForwardMessage", ForwardFrame(packet, round))
+                for packet in packets[round]
+            )
+        )
+    while len(stand_in.received) < num_packets * rounds:
+        await asyncio.sleep(0.001)
+    seconds = (time.perf_counter_ns() - start_time) / 1_000_000_000
+    await server.stop()
+    await stand_in.stop()
+    await transport.close()
+    return num_packets * rounds / seconds
+
+
+def loop_benchmark(num_packets_list=(100, 1000), rounds: int = 10, repeats: int = 3):
+    """Compares the ForwardMessage throughput of a mix server on each event loop, with
+    and without eager tasks, keeping the best of `repeats` runs. The per-message log
+    lines are turned off, so that they do not hide the loop's own overhead.
+    """
+    logging.disable(logging.INFO)
+    loops = ["asyncio"]
+    if loop_factory("auto") is not None:
+        loops.append("uvloop")
+    else:
+        print("uvloop is not installed, only asyncio is measured")
+    for num_packets in num_packets_list:
+        for loop in loops:
+            for eager_tasks in (False, True):
+                packets_per_second = max(
+                    run(loop_run(num_packets, rounds), loop, eager_tasks)
+                    for _ in range(repeats)
+                )
+                print(
+                    f"{num_packets=}, {loop=}, {eager_tasks=}, "
+                    f"{packets_per_second=:.0f}"
+                )
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if sys.argv[1:] == ["hop"]:
+        hop_benchmark()
+    elif sys.argv[1:] == ["startup"]:
+        startup_benchmark()
+    elif sys.argv[1:] == ["timers"]:
+        timer_benchmark()
+    elif sys.argv[1:] == ["transport"]:
+        transport_benchmark()
+    elif sys.argv[1:] == ["compression"]:
+        compression_benchmark()
+    elif sys.argv[1:] == ["grpc"]:
+        grpc_benchmark()
+    elif sys.argv[1:] == ["routing"]:
+        routing_benchmark()
+    elif sys.argv[1:] == ["faults"]:
+        fault_benchmark()
+    elif sys.argv[1:] == ["host"]:
+        host_benchmark()
+    elif sys.argv[1:] == ["sessions"]:
+        session_benchmark()
+    elif sys.argv[1:] == ["aggregation"]:
+        aggregation_benchmark()
+    elif sys.argv[1:] == ["fragments"]:
+        fragment_benchmark()
+    elif sys.argv[1:] == ["loops"]:
+        loop_benchmark()
+    else:
+        run_from_env(main())
@@ -1,30 +1,29 @@
+# Heavy modules (grpc, protobuf, pydantic, the peers) are imported by the commands that
+# need them, so that the one-shot commands only pay for what they use.
 import asyncio
 import logging
 import os
 import signal
 import time
+from typing import TYPE_CHECKING, Optional
 
-import grpc
 import typer
-import yaml
 from typing_extensions import Annotated
 
-import mixnet.mixnet_pb2 as pb2
-from mixnet.client import Client
-from mixnet.mixnet_pb2_grpc import ClientStub
-from mixnet.models import Config
-from mixnet.server import MixServer
-
-app = typer.Typer()
+from mixnet.config import find_client, load_config
 
+if TYPE_CHECKING:
+    from mixnet.client import Client
+    from mixnet.compression import Compressor
+    from mixnet.diagnostics import LoopMonitor
+    from mixnet.host import ClientHost
+    from mixnet.models import Config
+    from mixnet.server import MixServer
 
-def load_config(config_path):
-    with open(config_path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
-    return Config(**data)
+app = typer.Typer()
 
 
-async def start_peer(peer: MixServer | Client):
+async def start_peer(peer: "MixServer | Client | ClientHost"):
     loop = asyncio.get_running_loop()
     stop_event = asyncio.Event()
 
@@ -47,6 +46,24 @@ async def start_peer(peer: MixServer | Client):
         await peer.stop()
 
 
+def run_peer(
+    peer: "MixServer | Client | ClientHost",
+    config: "Config",
+    event_loop: Optional[str],
+    eager_tasks: Optional[bool],
+):
+    """Runs a peer until it is stopped, on the event loop selected on the command line,
+    or else in the config.
+    """
+    from mixnet.eventloop import run
+
+    run(
+        start_peer(peer),
+        event_loop or config.event_loop.loop,
+        config.event_loop.eager_tasks if eager_tasks is None else eager_tasks,
+    )
+
+
 @app.command()
 def server(
     id: Annotated[str, typer.Option(envvar="SERVER_ID", help="Server ID")],
@@ -57,7 +74,33 @@ def server(
         str,
         typer.Option(envvar="OUTPUT_DIR", help="Output directory for last server logs"),
     ],
+    wal_dir: Annotated[
+        Optional[str],
+        typer.Option(
+            envvar="WAL_DIR",
+            help="Directory for the write-ahead log used to resume rounds after a restart",
+        ),
+    ] = None,
+    event_loop: Annotated[
+        Optional[str],
+        typer.Option(
+            envvar="EVENT_LOOP",
+            help="Event loop: asyncio, uvloop or auto (uvloop if installed). Overrides the config",
+        ),
+    ] = None,
+    eager_tasks: Annotated[
+        Optional[bool],
+        typer.Option(
+            envvar="EAGER_TASKS",
+            help="Run new tasks eagerly, up to their first wait. Overrides the config",
+        ),
+    ] = None,
 ):
+    from mixnet.mixing import make_mixing
+    from mixnet.routing import RoutingTable
+    from mixnet.server import MixServer
+    from mixnet.transport import GrpcTransport
+
     config = load_config(config_path)
     server_config = next((s for s in config.mix_servers if s.id == id), None)
     if not server_config:
@@ -68,15 +111,21 @@ def server(
         id=id,
         port=int(server_config.address.split(":")[1]),
         messages_per_round=config.messages_per_round,
-        clients_addrs=[client.address for client in config.clients],
+        routing=RoutingTable.from_config(config),
         config_dir=os.path.dirname(config_path),
         output_dir=output_dir,
         round_duration=round_duration,
+        wal_dir=wal_dir,
+        mixing=make_mixing(config.mixing, config.messages_per_round),
+        transport=GrpcTransport(config.grpc_tuning),
+        forwarding=config.forwarding,
+        session_epoch=config.session_epoch,
+        monitor=load_monitor(config_path, config, id),
     )
-    asyncio.run(start_peer(server))
+    run_peer(server, config, event_loop, eager_tasks)
 
 
-def servers_data(config_path: str, config: Config):
+def servers_data(config_path: str, config: "Config"):
     mix_addrs = []
     mix_pubkeys = []
 
@@ -97,13 +146,65 @@ def servers_data(config_path: str, config: Config):
     return mix_addrs, mix_pubkeys
 
 
+def load_compressor(config_path: str, config: "Config") -> "Compressor":
+    from mixnet.compression import Compressor
+
+    dictionary = None
+    if config.compression_dictionary:
+        dictionary_path = os.path.join(
+            os.path.dirname(config_path), config.compression_dictionary
+        )
+        with open(dictionary_path, "rb") as f:
+            dictionary = f.read()
+    return Compressor(config.compression, dictionary)
+
+
+def load_monitor(
+    config_path: str, config: "Config", id: str
+) -> Optional["LoopMonitor"]:
+    """The stall detector of a node, if the config enables diagnostics."""
+    if config.diagnostics is None:
+        return None
+    from mixnet.diagnostics import LoopMonitor
+
+    diagnostics_dir = os.path.join(os.path.dirname(config_path), config.diagnostics.dir)
+    os.makedirs(diagnostics_dir, exist_ok=True)
+    return LoopMonitor(
+        os.path.join(diagnostics_dir, f"{id}_loop.json"),
+        config.diagnostics.stall_threshold,
+        config.diagnostics.interval,
+    )
+
+
 @app.command()
 def client(
     id: Annotated[str, typer.Option(envvar="CLIENT_ID", help="Client ID")],
     config_path: Annotated[
         str, typer.Option("--config", envvar="CONFIG_PATH", help="Path to config file")
     ],
+    output_dir: Annotated[
+        Optional[str],
+        typer.Option(envvar="OUTPUT_DIR", help="Output directory for profiles"),
+    ] = None,
+    event_loop: Annotated[
+        Optional[str],
+        typer.Option(
+            envvar="EVENT_LOOP",
+            help="Event loop: asyncio, uvloop or auto (uvloop if installed). Overrides the config",
+        ),
+    ] = None,
+    eager_tasks: Annotated[
+        Optional[bool],
+        typer.Option(
+            envvar="EAGER_TASKS",
+            help="Run new tasks eagerly, up to their first wait. Overrides the config",
+        ),
+    ] = None,
 ):
+    from mixnet.client import Client
+    from mixnet.routing import RoutingTable
+    from mixnet.transport import GrpcTransport
+
     config = load_config(config_path)
     client_config = next((c for c in config.clients if c.id == id), None)
     if not client_config:
@@ -117,13 +218,89 @@ def client(
         config_dir=os.path.dirname(config_path),
         mix_pubkeys=mix_pubkeys,
         mix_addrs=mix_addrs,
+        routing=RoutingTable.from_config(config),
+        dummy_payload=config.dummy_payload,
+        compressor=load_compressor(config_path, config),
+        drop_dummies_at_exit=config.drop_dummies_at_exit,
+        transport=GrpcTransport(config.grpc_tuning),
+        session_epoch=config.session_epoch,
+        aggregate_bytes=config.aggregate_bytes,
+        fragmentation=config.fragmentation,
+        monitor=load_monitor(config_path, config, id),
+        output_dir=output_dir,
+    )
+    run_peer(client, config, event_loop, eager_tasks)
+
+
+@app.command()
+def client_host(
+    host: Annotated[
+        str,
+        typer.Option(
+            envvar="CLIENT_HOST",
+            help="Address of the client host, serving the clients whose host it is",
+        ),
+    ],
+    config_path: Annotated[
+        str, typer.Option("--config", envvar="CONFIG_PATH", help="Path to config file")
+    ],
+    output_dir: Annotated[
+        Optional[str],
+        typer.Option(envvar="OUTPUT_DIR", help="Output directory for profiles"),
+    ] = None,
+    event_loop: Annotated[
+        Optional[str],
+        typer.Option(
+            envvar="EVENT_LOOP",
+            help="Event loop: asyncio, uvloop or auto (uvloop if installed). Overrides the config",
+        ),
+    ] = None,
+    eager_tasks: Annotated[
+        Optional[bool],
+        typer.Option(
+            envvar="EAGER_TASKS",
+            help="Run new tasks eagerly, up to their first wait. Overrides the config",
+        ),
+    ] = None,
+):
+    from mixnet.host import ClientHost
+    from mixnet.routing import RoutingTable
+    from mixnet.transport import GrpcTransport
+
+    config = load_config(config_path)
+    clients = [c for c in config.clients if c.host == host]
+    if not clients:
+        typer.echo(f"No client with host '{host}' found in config.")
+        raise typer.Exit(code=1)
+    mix_addrs, mix_pubkeys = servers_data(config_path, config)
+    client_host = ClientHost(
+        addr=host,
+        port=int(host.split(":")[1]),
+        config_dir=os.path.dirname(config_path),
+        mix_pubkeys=mix_pubkeys,
+        mix_addrs=mix_addrs,
+        routing=RoutingTable.from_config(config),
         dummy_payload=config.dummy_payload,
+        transport=GrpcTransport(config.grpc_tuning),
+        compressor=load_compressor(config_path, config),
+        drop_dummies_at_exit=config.drop_dummies_at_exit,
+        session_epoch=config.session_epoch,
+        aggregate_bytes=config.aggregate_bytes,
+        fragmentation=config.fragmentation,
+        monitor=load_monitor(config_path, config, f"host_{host.replace(':', '_')}"),
+        output_dir=output_dir,
     )
-    asyncio.run(start_peer(client))
+    for client_config in clients:
+        client_host.add(client_config.id, client_config.address)
+    run_peer(client_host, config, event_loop, eager_tasks)
+
 
+async def call_client_prepare_message(sender_addr: str, request):
+    import grpc
 
-async def call_client_prepare_message(sender: Client, request):
-    async with grpc.aio.insecure_channel(sender.address) as channel:
+    from mixnet.mixnet_pb2_grpc import ClientStub
+
+    async with grpc.aio.insecure_channel(sender_addr) as channel:
         stub = ClientStub(channel)
         return await stub.PrepareMessage(request)
 
@@ -139,12 +316,16 @@ def prepare_message(
         str, typer.Option("--config", envvar="CONFIG_PATH", help="Path to config file")
     ],
 ):
-    config = load_config(config_path)
-    recipient = next((c for c in config.clients if c.id == recipient_id), None)
-    sender = next((c for c in config.clients if c.id == sender_id), None)
+    import mixnet.mixnet_pb2 as pb2
+
+    recipient = find_client(config_path, recipient_id)
+    sender = find_client(config_path, sender_id)
     if not recipient:
         typer.echo(f"Recipient client with id '{recipient_id}' not found in config.")
         raise typer.Exit(code=1)
+    if not sender:
+        typer.echo(f"Sender client with id '{sender_id}' not found in config.")
+        raise typer.Exit(code=1)
 
     pubkey_path = os.path.join(os.path.dirname(config_path), f"{recipient_id}.key")
     try:
@@ -160,10 +341,13 @@ def prepare_message(
     request = pb2.PrepareMessageRequest(
         message=message,
         recipient_pubkey=recipient_pubkey,
-        recipient_addr=recipient.address,
+        recipient_addr=recipient["address"],
+        client_id=sender_id,
     )
+    # A client served by a client host is reached at the host's address
+    sender_addr = sender.get("host") or sender["address"]
     try:
-        response = asyncio.run(call_client_prepare_message(sender, request))
+        response = asyncio.run(call_client_prepare_message(sender_addr, request))
         if response.status:
             typer.echo("Message prepared successfully.")
         else:
@@ -172,8 +356,12 @@ def prepare_message(
         typer.echo(f"Failed to send message: {e}")
 
 
-async def call_client_poll_messages(client: Client, request):
-    async with grpc.aio.insecure_channel(client.address) as channel:
+async def call_client_poll_messages(client_addr: str, request):
+    import grpc
+
+    from mixnet.mixnet_pb2_grpc import ClientStub
+
+    async with grpc.aio.insecure_channel(client_addr) as channel:
         stub = ClientStub(channel)
         return await stub.PollMessages(request)
 
@@ -187,20 +375,102 @@ def poll_messages(
         str, typer.Option("--config", envvar="CONFIG_PATH", help="Path to config file")
     ],
 ):
-    config = load_config(config_path)
-    client = next((c for c in config.clients if c.id == client_id), None)
+    import mixnet.mixnet_pb2 as pb2
+
+    client = find_client(config_path, client_id)
     if not client:
         typer.echo(f"Client with id '{client_id}' not found in config.")
         raise typer.Exit(code=1)
 
     # Prepare gRPC request
-    request = pb2.ClientPollMessagesRequest()
+    request = pb2.ClientPollMessagesRequest(client_id=client_id)
+    client_addr = client.get("host") or client["address"]
     try:
-        response = asyncio.run(call_client_poll_messages(client, request))
+        response = asyncio.run(call_client_poll_messages(client_addr, request))
         typer.echo(response.messages)
     except Exception as e:
         typer.echo(f"Failed to send message: {e}")
 
 
+async def call_admin(address: str, method: str, request):
+    import grpc
+
+    from mixnet.mixnet_pb2_grpc import AdminStub
+
+    async with grpc.aio.insecure_channel(address) as channel:
+        stub = AdminStub(channel)
+        return await getattr(stub, method)(request)
+
+
+@app.command()
+def profile(
+    address: Annotated[
+        str, typer.Option(help="Address of the mix server, client or client host")
+    ],
+    seconds: Annotated[
+        float, typer.Option(help="Seconds to profile for (0 for no limit)")
+    ] = 0,
+    rounds: Annotated[
+        int, typer.Option(help="Rounds to profile for (0 for no limit)")
+    ] = 0,
+    deterministic: Annotated[
+        bool,
+        typer.Option(help="Profile every call with cProfile instead of sampling"),
+    ] = False,
+    stop: Annotated[
+        bool, typer.Option(help="Stop the running profile instead of starting one")
+    ] = False,
+):
+    """Profiles a running node, and prints the path of the profile it wrote."""
+    import mixnet.mixnet_pb2 as pb2
+
+    if stop:
+        method, request = "StopProfile", pb2.StopProfileRequest()
+    else:
+        if not seconds and not rounds:
+            typer.echo("The profile runs until stopped with --stop.")
+        mode = (
+            pb2.StartProfileRequest.DETERMINISTIC
+            if deterministic
+            else pb2.StartProfileRequest.SAMPLING
+        )
+        method = "StartProfile"
+        request = pb2.StartProfileRequest(mode=mode, seconds=seconds, rounds=rounds)
+    try:
+        response = asyncio.run(call_admin(address, method, request))
+    except Exception as e:
+        typer.echo(f"Failed to call {method}: {e}")
+        raise typer.Exit(code=1)
+    if not response.status:
+        typer.echo(f"{method} failed: {response.error}")
+        raise typer.Exit(code=1)
+    typer.echo(response.path)
+
+
+@app.command()
+def status(
+    address: Annotated[
+        str, typer.Option(help="Address of the mix server, client or client host")
+    ],
+):
+    """Prints a snapshot of a running node's rounds, queues and peers, as JSON."""
+    from google.protobuf.json_format import MessageToJson
+
+    import mixnet.mixnet_pb2 as pb2
+
+    try:
+        response = asyncio.run(call_admin(address, "GetStatus", pb2.GetStatusRequest()))
+    except Exception as e:
+        typer.echo(f"Failed to call GetStatus: {e}")
+        raise typer.Exit(code=1)
+    typer.echo(
+        MessageToJson(
+            response,
+            preserving_proto_field_name=True,
+            always_print_fields_with_no_presence=True,
+        )
+    )
+
+
 if __name__ == "__main__":
     app()
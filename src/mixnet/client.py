@@ -1,131 +1,223 @@
 import asyncio
+import contextlib
 import logging
-import os
 import time
-from typing import Dict, List
+from typing import Dict, List, Optional
 
-import grpc
-
-from mixnet.crypto import decrypt, encrypt, generate_key_pair
+from mixnet.admin import AdminService, PeerLatency, Profiler, Queues
+from mixnet.compression import Compressor
+from mixnet.diagnostics import LoopMonitor
+from mixnet.identity import ClientIdentity, ClientPackets
 from mixnet.mixnet_pb2 import (
     ClientPollMessagesResponse,
-    ForwardMessageRequest,
-    PollMessagesRequest,
     PrepareMessageResponse,
-    RegisterRequest,
-    WaitForStartRequest,
-)
-from mixnet.mixnet_pb2_grpc import (
-    ClientServicer,
-    MixServerStub,
-    add_ClientServicer_to_server,
+    RoundClockRequest,
+    RoundTick,
+    StatusResponse,
 )
-from mixnet.models import Message
+from mixnet.mixnet_pb2_grpc import ClientServicer
+from mixnet.models import Fragmentation
+from mixnet.onion import Route
+from mixnet.routing import RoutingTable
+from mixnet.transport import GrpcTransport, Transport
+from mixnet.wire import ForwardFrame
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
 
-class Client(ClientServicer):
+class Client(ClientServicer, AdminService):
     def __init__(
         self,
         id: str,
         addr: str,
         port: int,
-        config_dir: str,
+        config_dir: Optional[str],
         mix_pubkeys: List[bytes],
         mix_addrs: List[str],
+        routing: RoutingTable,
         dummy_payload: str = "dummy",
         enable_metrics: bool = False,
         metrics: Dict[str, float] = {},
+        transport: Optional[Transport] = None,
+        compressor: Optional[Compressor] = None,
+        drop_dummies_at_exit: bool = False,
+        session_epoch: Optional[int] = None,
+        aggregate_bytes: Optional[int] = None,
+        fragmentation: Optional[Fragmentation] = None,
+        monitor: Optional[LoopMonitor] = None,
+        output_dir: Optional[str] = None,
     ):
         self._logger = logging.getLogger(id)
         self._id = id
         self._addr = addr
-        self._dummy_payload = dummy_payload
-        self._pubkey_path = os.path.join(config_dir, f"{id}.key")
-        self._privkey_b64, self._pubkey_b64 = generate_key_pair(self._pubkey_path)
+        self._identity = ClientIdentity(id, addr, config_dir)
         self._running = False
         self._mix_pubkeys = mix_pubkeys
         self._mix_addrs = mix_addrs
+        # Layers name the next hop by its node ID in the routing table
+        self._routing = routing
+        self._route = Route(mix_pubkeys, [routing.node_id(addr) for addr in mix_addrs])
         self._first_host = mix_addrs[0]
         self._last_host = mix_addrs[-1]
-        self._messages: Dict[int, bytes] = {}
         self._round = 0
         self._run_forever_future = None
+        self._ticks = None
         self._port = port
         self._listener = None
+        # A transport created here is owned, and its pooled channels closed on stop
+        self._owns_transport = transport is None
+        self._transport = transport or GrpcTransport()
+        self._packets = ClientPackets(
+            self._logger,
+            self._route,
+            routing,
+            self._transport,
+            compressor or Compressor(),
+            dummy_payload,
+            drop_dummies_at_exit,
+            aggregate_bytes,
+            fragmentation,
+        )
         self._enable_metrics = enable_metrics
         self._metrics = metrics
+        self._session_epoch = session_epoch
+        self._monitor = monitor
+        # Profiles requested over the Admin service are written to the output directory
+        self._profiler = Profiler(id, output_dir)
+        self._registered = False
+        # The sends to the first mix server
+        self._latency = PeerLatency()
+        self._failed_rounds = 0
+
+    @property
+    def address(self) -> str:
+        return self._addr
+
+    @property
+    def pubkey(self) -> bytes:
+        return self._identity.pubkey
+
+    def bind(self) -> int:
+        """Creates the listener and binds its port, before the client starts.
+        With port 0 the OS assigns the port, and the client's address is updated to it.
+
+        Returns:
+            int: the bound port
+        """
+        if self._listener is None:
+            self._listener = self._transport.bind(self, self._port)
+            if not self._port:
+                host = self._addr.rsplit(":", 1)[0]
+                self._addr = self._identity.address = f"{host}:{self._listener.port}"
+            self._port = self._listener.port
+        return self._port
 
     async def start(self):
         self._logger.info("Client started")
-        self._listener = grpc.aio.server()
-        add_ClientServicer_to_server(self, self._listener)
-        self._listener.add_insecure_port(f"[::]:{self._port}")
+        if self._monitor:
+            self._monitor.start()
+        self.bind()
+        self._ticks = aiter(
+            self._transport.stream(
+                self._first_host, "RoundClock", RoundClockRequest(client_ids=[self._id])
+            )
+        )
         await self.register()
-        round_duration = await self.wait_for_start()
+        await self.wait_for_start()
         await self._listener.start()
         self._running = True
-        self._run_forever_future = asyncio.create_task(self.run_forever(round_duration))
+        self._run_forever_future = asyncio.create_task(self.run_forever())
 
-    async def run_forever(self, round_duration: float):
-        """Main loop for the client to send messages periodically
-        Client sleeps for `round_duration` seconds and checks if there are messages to send.
-        If no messages are found for the current round, it prepares a dummy message.
-        Then it sends the message to the first mix server in the list.
+    async def run_forever(self):
+        """Main loop for the client to send messages at the first mix server's round
+        boundaries, as streamed by its round clock.
+        When a round closes, the client sends its packet for that round to the first
+        mix server, preparing a dummy message if there is none. A failed send drops
+        the round's packet, and the client goes on with the next round.
+        """
+        async for tick in self._ticks:
+            if tick.event == RoundTick.OPEN:
+                self._round = max(self._round, tick.round)
+            elif tick.event == RoundTick.CLOSE:
+                try:
+                    await self._send_round(tick.round)
+                except Exception as e:
+                    self._failed_rounds += 1
+                    self._logger.warning(
+                        f"Dropping the round {tick.round} packet: {e!r}"
+                    )
+                self._profiler.round_ended()
+        if self._running:
+            self._logger.warning("Round clock stream ended")
 
-        Args:
-            round_duration (float): round duration in seconds
+    async def _send_round(self, round: int):
+        """Sends the round's packet: the prepared one, a dummy, or with aggregation the
+        round's bundle.
         """
-        while self._running:
-            await asyncio.sleep(round_duration)
-            if self._round not in self._messages:
-                self._logger.debug(
-                    f"No messages for round {self._round}, creating a dummy"
-                )
-                await self._prepare_message(
-                    self._dummy_payload, self._pubkey_b64, self._addr
-                )
-            await self.send_message(
-                self._messages[self._round], self._mix_addrs[0], self._round
-            )
-            self._round += 1
+        # Move to the next round before sending, so that a message prepared while
+        # the send is in flight is not scheduled for the round already sent
+        packet = self._packets.take(self._identity, round)
+        self._round = round + 1
+        if self._identity.sessions:
+            self._identity.sessions.forget(round + 1)
+        await self.send_message(packet.build(self._route), self._first_host, round)
+
+    def status(self) -> StatusResponse:
+        """A snapshot of the round, the packets prepared for the coming rounds, the
+        sends to the first mix server and the messages still missing fragments.
+        """
+        queues = Queues()
+        self._identity.add_queues(queues)
+        return StatusResponse(
+            node_id=self._id,
+            running=self._running,
+            round=self._round,
+            registered=int(self._registered),
+            queues=queues.status(),
+            bytes_held=queues.bytes,
+            peers=[self._latency.status(self._first_host)],
+            failed_forwards=self._failed_rounds,
+            pending_fragments=self._identity.reassembler.pending,
+        )
 
     async def stop(self):
         self._logger.info("Stopping client")
         self._running = False
         if self._run_forever_future:
-            await self._run_forever_future
+            # Ends the round clock stream too
+            self._run_forever_future.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._run_forever_future
         if self._listener:
             await self._listener.stop(grace=5.0)
-        if os.path.exists(self._pubkey_path):
-            os.remove(self._pubkey_path)
+        if self._owns_transport:
+            await self._transport.close()
+        self._identity.remove_pubkey()
+        if self._monitor:
+            await self._monitor.stop()
         self._logger.info("Client stopped")
 
     async def register(self):
-        """Calls the server's gRPC mathod to register
+        """Reads the registration outcome from the first mix server's round clock
 
         Raises:
             Exception: Failed to register
 
         Returns:
-            RegisterResponse: response from the server
+            RoundTick: the REGISTERED tick
         """
-        async with grpc.aio.insecure_channel(self._first_host) as channel:
-            stub = MixServerStub(channel)
-            request = RegisterRequest(client_id=self._id)
-            response = await stub.Register(request)
-            if not response.status:
-                raise Exception(f"Failed to register with server: {self._first_host}")
-            self._logger.info(f"Registered with server: {self._first_host}")
-            return response
+        tick = await anext(self._ticks, None)
+        if tick is None or tick.event != RoundTick.REGISTERED:
+            raise Exception(f"Failed to register with server: {self._first_host}")
+        self._registered = True
+        self._logger.info(f"Registered with server: {self._first_host}")
+        return tick
 
     async def wait_for_start(self):
-        """Calls the server's gRPC method to wait for the server to be ready.
-        Once the server is ready, it means the first round starts and the client
-        should start sending messages.
+        """Waits on the round clock for the first round to open, which means all the
+        clients are registered and the client should start sending messages.
 
         Raises:
             Exception: Server is not ready
@@ -133,54 +225,48 @@ class Client(ClientServicer):
         Returns:
             float: round duration in seconds
         """
-        async with grpc.aio.insecure_channel(self._first_host) as channel:
-            stub = MixServerStub(channel)
-            request = WaitForStartRequest(client_id=self._id)
-            response = await stub.WaitForStart(request)
-            if not response.ready:
-                raise Exception(f"Server is not ready: {self._first_host}")
-            self._logger.info(
-                f"Server is ready: {self._first_host}, round duration: {response.round_duration}"
+        tick = await anext(self._ticks, None)
+        if tick is None or tick.event != RoundTick.OPEN:
+            raise Exception(f"Server is not ready: {self._first_host}")
+        self._round = tick.round
+        if self._session_epoch:
+            self._identity.sessions = self._route.open_sessions(
+                self._session_epoch, self._round
             )
-            return response.round_duration
+        self._logger.info(
+            f"Server is ready: {self._first_host}, round duration: {tick.round_duration}"
+        )
+        return tick.round_duration
 
     async def _prepare_message(
         self,
         message: str,
         recipient_pubkey: bytes,
         recipient_addr: str,
-    ):
-        """Prepares a message to be sent in the mixnet by encrypting it in layers like an onion.
-        The message is encrypted with the recipient's public key and then with the public keys of
-        the mix servers in reverse order.
+    ) -> int:
+        """Prepares a message to be sent in the mixnet (see `ClientPackets.prepare`),
+        from the current round on.
 
         Args:
             message (str): the message to be sent
             recipient_pubkey (bytes): the public key of the recipient
             recipient_addr (str): the address of the recipient
+
+        Raises:
+            ValueError: the recipient is not in the routing table
+
+        Returns:
+            int: the round the message will be sent in
         """
-        round = self._round
-        if round in self._messages:
-            self._logger.debug(f"Message for round {round} already prepared")
-            if message == self._dummy_payload:
-                self._logger.debug(f"Dummy message for round {round} ignored")
-                return
-            round += 1
-        if self._enable_metrics:
-            prepare_start_time = time.perf_counter_ns()
-            if round == 0:
-                self._metrics[self._id]["prepare_start_time"] = prepare_start_time
-        self._logger.info(f"Preparing message for round {round}")
-        pubkeys = [recipient_pubkey] + self._mix_pubkeys[::-1]
-        addresses = [recipient_addr] + self._mix_addrs[::-1]
-        for pubkey, addr in zip(pubkeys, addresses):
-            ciphertext = encrypt(message.encode(), pubkey)
-            message = Message(payload=ciphertext, address=addr).model_dump_json()
-        self._messages[round] = ciphertext
-        if self._enable_metrics:
-            prepare_end_time = time.perf_counter_ns()
-            if round == 0:
-                self._metrics[self._id]["prepare_end_time"] = prepare_end_time
+        prepare_start_time = time.perf_counter_ns()
+        round = self._packets.prepare(
+            self._identity, message, recipient_pubkey, recipient_addr, self._round
+        )
+        self._logger.info(f"Prepared message for round {round}")
+        if self._enable_metrics and round == 0:
+            self._metrics[self._id]["prepare_start_time"] = prepare_start_time
+            self._metrics[self._id]["prepare_end_time"] = time.perf_counter_ns()
+        return round
 
     async def send_message(self, payload: bytes, addr: str, round: int):
         """Calls the server's gRPC method to forward the message to it.
@@ -190,16 +276,18 @@ class Client(ClientServicer):
             addr (str): the address of the mix server to send the message to
             round (int): the message round number
         """
-        async with grpc.aio.insecure_channel(addr) as channel:
-            stub = MixServerStub(channel)
-            request = ForwardMessageRequest(payload=payload, round=round)
-            response = await stub.ForwardMessage(request)
-            self._logger.debug(f"Server responded: {response.status}")
+        request = ForwardFrame(payload=payload, round=round)
+        started = time.monotonic()
+        try:
+            response = await self._transport.call(addr, "ForwardMessage", request)
+        except Exception:
+            self._latency.record(time.monotonic() - started, failed=True)
+            raise
+        self._latency.record(time.monotonic() - started)
+        self._logger.debug(f"Server responded: {response.status}")
 
     async def _poll_messages(self, server_host: str) -> List[str]:
-        """Calls the server's gRPC method to poll messages from it.
-        It decrypts the messages using the client's private key and returns a list of
-        messages that are not dummy payloads.
+        """Polls the client's messages from a mix server (see `ClientPackets.poll`).
 
         Args:
             server_host (str): the address of the mix server to poll messages from
@@ -207,18 +295,10 @@ class Client(ClientServicer):
         Returns:
             List[str]: list of decrypted messages that are not dummy payloads
         """
-        async with grpc.aio.insecure_channel(server_host) as channel:
-            stub = MixServerStub(channel)
-            request = PollMessagesRequest(client_addr=self._addr)
-            response = await stub.PollMessages(request)
-        messages = []
-        for payload in response.payloads:
-            message = decrypt(payload, self._privkey_b64).decode()
-            if message != self._dummy_payload:
-                messages.append(message)
-                self._logger.info("Polled message")
-                self._logger.debug(f"{message=}")
-
+        messages = await self._packets.poll(self._identity, server_host)
+        for message in messages:
+            self._logger.info("Polled message")
+            self._logger.debug(f"{message=}")
         return messages
 
     async def PrepareMessage(self, request, context):
@@ -231,12 +311,43 @@ class Client(ClientServicer):
         Returns:
             PrepareMessageResponse: the response indicating the status of the operation
         """
-        await self._prepare_message(
+        round = await self._prepare_message(
             request.message,
             request.recipient_pubkey,
             request.recipient_addr,
         )
-        return PrepareMessageResponse(status=True)
+        return PrepareMessageResponse(
+            status=True, request_id=request.request_id, round=round
+        )
+
+    async def PrepareMessages(self, request_iterator, context):
+        """A streaming gRPC API method to invoke _prepare_message for every request
+        received on a long-lived stream. Each request is acknowledged with a response
+        carrying its request_id, and a failing request does not end the stream.
+
+        Args:
+            request_iterator (AsyncIterator[PrepareMessageRequest]): gRPC request stream
+            context (_type_): gRPC context
+
+        Yields:
+            PrepareMessageResponse: the acknowledgement of each request
+        """
+        async for request in request_iterator:
+            try:
+                round = await self._prepare_message(
+                    request.message,
+                    request.recipient_pubkey,
+                    request.recipient_addr,
+                )
+            except Exception as e:
+                self._logger.warning(f"Failed to prepare message: {e}")
+                yield PrepareMessageResponse(
+                    status=False, request_id=request.request_id, error=str(e)
+                )
+                continue
+            yield PrepareMessageResponse(
+                status=True, request_id=request.request_id, round=round
+            )
 
     async def PollMessages(self, request, context):
         """A gRPC API method to invoke _poll_messages
@@ -0,0 +1,92 @@
+import zlib
+from typing import Optional, Sequence
+
+# zstd is optional: it is only needed when the config selects it
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+_ERRORS = (zlib.error, zstandard.ZstdError) if zstandard else (zlib.error,)
+_ZSTD_MISSING = "zstd compression requires the zstandard package: install mixnet[zstd]"
+
+# The first byte of a compressed plaintext tells how the rest is encoded, so that a
+# payload that does not shrink can be sent as-is
+_RAW = 0
+_ZLIB = 1
+_ZSTD = 2
+
+# zlib only looks back 32 KB, so a longer dictionary is never used
+_ZLIB_MAX_DICTIONARY = 32 * 1024
+
+
+class Compressor:
+    """Compresses the innermost plaintext of a message before it is sealed, and
+    decompresses it after the recipient opens it. The codec ("none", "zlib" or "zstd")
+    and the optional dictionary are shared by all the clients through the config.
+    With "none" plaintexts are left untouched, as without compression.
+    """
+
+    def __init__(self, codec: str = "none", dictionary: Optional[bytes] = None):
+        if codec not in ("none", "zlib", "zstd"):
+            raise ValueError(f"Unknown compression codec '{codec}'")
+        if codec == "zstd" and zstandard is None:
+            raise ImportError(_ZSTD_MISSING)
+        self.codec = codec
+        self._zlib_options = {"zdict": dictionary} if dictionary else {}
+        self._zstd_compressor = self._zstd_decompressor = None
+        if codec == "zstd":
+            zstd_dict = (
+                zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            )
+            self._zstd_compressor = zstandard.ZstdCompressor(dict_data=zstd_dict)
+            self._zstd_decompressor = zstandard.ZstdDecompressor(dict_data=zstd_dict)
+
+    def compress(self, plaintext: bytes) -> bytes:
+        if self.codec == "none":
+            return plaintext
+        if self.codec == "zstd":
+            tag, compressed = _ZSTD, self._zstd_compressor.compress(plaintext)
+        else:
+            compressor = zlib.compressobj(9, **self._zlib_options)
+            tag = _ZLIB
+            compressed = compressor.compress(plaintext) + compressor.flush()
+        if len(compressed) >= len(plaintext):
+            tag, compressed = _RAW, plaintext
+        return bytes((tag,)) + compressed
+
+    def decompress(self, data: bytes) -> bytes:
+        """Raises:
+        ValueError: `data` was not produced by a compressor with the same codec
+        """
+        if self.codec == "none":
+            return data
+        if not data:
+            raise ValueError("Empty compressed payload")
+        tag, body = data[0], data[1:]
+        try:
+            if tag == _RAW:
+                return body
+            if tag == _ZLIB:
+                decompressor = zlib.decompressobj(**self._zlib_options)
+                return decompressor.decompress(body) + decompressor.flush()
+            if tag == _ZSTD and self._zstd_decompressor:
+                return self._zstd_decompressor.decompress(body)
+        except _ERRORS as e:
+            raise ValueError(f"Failed to decompress payload: {e}") from e
+        raise ValueError(f"Unsupported compression tag {tag}")
+
+
+def train_dictionary(codec: str, samples: Sequence[bytes], size: int = 16384) -> bytes:
+    """Builds a compression dictionary of up to `size` bytes from sample payloads of
+    the expected traffic, to be shared with the clients via `compression_dictionary`.
+    zstd trains a dictionary from the samples; zlib uses the samples themselves as
+    dictionary, the most recent ones last since zlib matches best near the end.
+    """
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImportError(_ZSTD_MISSING)
+        return zstandard.train_dictionary(size, list(samples)).as_bytes()
+    if codec == "zlib":
+        return b"".join(samples)[-min(size, _ZLIB_MAX_DICTIONARY) :]
+    raise ValueError(f"Codec '{codec}' does not use a dictionary")
@@ -0,0 +1,25 @@
+from typing import TYPE_CHECKING, Optional
+
+import yaml
+
+if TYPE_CHECKING:
+    from mixnet.models import Config
+
+
+def read_config(config_path) -> dict:
+    with open(config_path, "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+
+def load_config(config_path) -> "Config":
+    from mixnet.models import Config
+
+    return Config(**read_config(config_path))
+
+
+def find_client(config_path, client_id: str) -> Optional[dict]:
+    """Looks up a client's entry without validating the whole config, which keeps
+    pydantic out of the one-shot commands.
+    """
+    clients = read_config(config_path).get("clients") or []
+    return next((c for c in clients if c.get("id") == client_id), None)
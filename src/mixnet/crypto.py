@@ -1,12 +1,20 @@
-from typing import Tuple
+import hashlib
+import hmac
+import os
+from array import array
+from typing import List, Optional, Sequence, Tuple, TypeVar
 
+from nacl._sodium import ffi, lib
+from nacl.bindings import crypto_box_beforenm, crypto_box_SEALBYTES
 from nacl.encoding import Base64Encoder
 from nacl.exceptions import CryptoError
 from nacl.public import PrivateKey, PublicKey, SealedBox
 
 
-def generate_key_pair(pubkey_path: str) -> Tuple[bytes, bytes]:
-    """Generate a NaCl key pair and return private and public keys (Base64 encoded)."""
+def generate_key_pair(pubkey_path: Optional[str] = None) -> Tuple[bytes, bytes]:
+    """Generate a NaCl key pair and return private and public keys (Base64 encoded).
+    The public key is published to `pubkey_path`, unless it is None.
+    """
     privkey = PrivateKey.generate()
     pubkey = privkey.public_key
 
@@ -15,15 +23,60 @@ def generate_key_pair(pubkey_path: str) -> Tuple[bytes, bytes]:
     pubkey_b64 = pubkey.encode(encoder=Base64Encoder)
 
     # Write public key to file
-    with open(pubkey_path, "wb") as f:
-        f.write(pubkey_b64)
+    if pubkey_path:
+        with open(pubkey_path, "wb") as f:
+            f.write(pubkey_b64)
     return privkey_b64, pubkey_b64
 
 
+def load_key_pair(
+    privkey_path: str, pubkey_path: Optional[str] = None
+) -> Tuple[bytes, bytes]:
+    """Load a persisted NaCl private key, generating and persisting it on first use.
+    The public key is (re)written to `pubkey_path` (unless it is None) and both keys
+    are returned Base64 encoded.
+    """
+    if os.path.exists(privkey_path):
+        with open(privkey_path, "rb") as f:
+            privkey = PrivateKey(f.read(), encoder=Base64Encoder)
+    else:
+        privkey = PrivateKey.generate()
+        fd = os.open(privkey_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(privkey.encode(encoder=Base64Encoder))
+
+    privkey_b64 = privkey.encode(encoder=Base64Encoder)
+    pubkey_b64 = privkey.public_key.encode(encoder=Base64Encoder)
+    if pubkey_path:
+        with open(pubkey_path, "wb") as f:
+            f.write(pubkey_b64)
+    return privkey_b64, pubkey_b64
+
+
+T = TypeVar("T")
+
+
+def secure_shuffle(items: Sequence[T]) -> List[T]:
+    """Return a uniformly random permutation of `items` (Fisher-Yates).
+    The randomness is drawn from the OS CSPRNG in a single call instead of one call
+    per element; reducing 64-bit values modulo the range has a negligible bias.
+    """
+    shuffled = list(items)
+    randoms = array("Q", os.urandom(8 * len(shuffled)))
+    for i in range(len(shuffled) - 1, 0, -1):
+        j = randoms[i] % (i + 1)
+        shuffled[i], shuffled[j] = shuffled[j], shuffled[i]
+    return shuffled
+
+
+def sealing_box(pubkey_b64: bytes) -> SealedBox:
+    """Build a reusable SealedBox that encrypts for the given public key."""
+    return SealedBox(PublicKey(pubkey_b64, encoder=Base64Encoder))
+
+
 def encrypt(message: bytes, pubkey_b64: bytes) -> bytes:
     """Encrypt a message using the recipient's public key (SealedBox)."""
-    pubkey = PublicKey(pubkey_b64, encoder=Base64Encoder)
-    sealed_box = SealedBox(pubkey)
+    sealed_box = sealing_box(pubkey_b64)
     ciphertext = sealed_box.encrypt(message)
     return ciphertext
 
@@ -37,3 +90,103 @@ def decrypt(ciphertext: bytes, privkey_b64: bytes) -> bytes:
         return plaintext
     except CryptoError:
         raise ValueError("Decryption failed. Invalid key or corrupted ciphertext.")
+
+
+# PyNaCl's public bindings only take and return bytes, and copy the plaintext out of
+# a buffer of their own, so the two decryptions of a hop call libsodium through
+# PyNaCl's cffi module, which is private: pyproject.toml pins the PyNaCl releases it
+# was checked against. Both decrypt `ciphertext`, any bytes-like object, straight into
+# `out` and return whether it was authentic.
+
+
+def seal_open_into(out: bytearray, ciphertext, pk: bytes, sk: bytes) -> bool:
+    return (
+        lib.crypto_box_seal_open(
+            ffi.from_buffer("unsigned char[]", out, require_writable=True),
+            ffi.from_buffer("unsigned char[]", ciphertext),
+            len(ciphertext),
+            pk,
+            sk,
+        )
+        == 0
+    )
+
+
+def aead_open_into(
+    out: bytearray, ciphertext, aad: bytes, nonce: bytes, key: bytes
+) -> bool:
+    return (
+        lib.crypto_aead_chacha20poly1305_ietf_decrypt(
+            ffi.from_buffer("unsigned char[]", out, require_writable=True),
+            ffi.NULL,
+            ffi.NULL,
+            ffi.from_buffer("unsigned char[]", ciphertext),
+            len(ciphertext),
+            aad,
+            len(aad),
+            nonce,
+            key,
+        )
+        == 0
+    )
+
+
+class Unsealer:
+    """Opens sealed boxes for a single private key.
+    libsodium decrypts straight into a buffer allocated once per packet, skipping the
+    intermediate copies `SealedBox.decrypt` makes, and the ciphertext may be any
+    bytes-like object, such as a memoryview into a received request.
+    """
+
+    __slots__ = ("_sk", "_pk")
+
+    def __init__(self, privkey_b64: bytes):
+        privkey = PrivateKey(privkey_b64, encoder=Base64Encoder)
+        self._sk = bytes(privkey)
+        self._pk = bytes(privkey.public_key)
+
+    def unseal(self, ciphertext) -> bytearray:
+        if len(ciphertext) < crypto_box_SEALBYTES:
+            raise ValueError("Decryption failed. Invalid ciphertext size.")
+        plaintext = bytearray(len(ciphertext) - crypto_box_SEALBYTES)
+        if not seal_open_into(plaintext, ciphertext, self._pk, self._sk):
+            raise ValueError("Decryption failed. Invalid key or corrupted ciphertext.")
+        return plaintext
+
+    def shared_key(self, epk) -> bytes:
+        """The box key agreed with the ephemeral public key of a sealed box."""
+        return crypto_box_beforenm(bytes(epk), self._sk)
+
+
+class DummyMarker:
+    """Makes and recognises a client's own dummy payloads without public-key crypto.
+    A dummy is random bytes ending with a keyed BLAKE2b tag of them, under a key derived
+    from the client's private key. To the mixes it is as random as a sealed box of the
+    same size, and only the client can tell it apart, with a hash instead of a decryption.
+    """
+
+    TAG_BYTES = 16
+
+    __slots__ = ("_key",)
+
+    def __init__(self, privkey_b64: bytes):
+        privkey = PrivateKey(privkey_b64, encoder=Base64Encoder)
+        self._key = hashlib.blake2b(
+            bytes(privkey), digest_size=32, person=b"mixnet-dummy"
+        ).digest()
+
+    def _tag(self, body) -> bytes:
+        return hashlib.blake2b(body, key=self._key, digest_size=self.TAG_BYTES).digest()
+
+    def make(self, size: int) -> bytes:
+        """Returns a dummy payload of `size` bytes (at least the tag size)."""
+        body = os.urandom(max(0, size - self.TAG_BYTES))
+        return body + self._tag(body)
+
+    def is_dummy(self, payload: bytes) -> bool:
+        if len(payload) < self.TAG_BYTES:
+            return False
+        view = memoryview(payload)
+        return hmac.compare_digest(
+            view[-self.TAG_BYTES :].tobytes(), self._tag(view[: -self.TAG_BYTES])
+        )
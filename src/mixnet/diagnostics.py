@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds of the lag histogram's buckets, in milliseconds; the last is unbounded
+LAG_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+_STACK_DEPTH = 20
+
+
+class LoopMonitor:
+    """Watches a node's event loop for stalls and attributes them to the code that
+    blocked it.
+    A heartbeat task sleeps `interval` seconds at a time and records how late it wakes
+    up in a histogram. A watchdog thread checks the heartbeat every `interval / 2`
+    seconds, and once the loop has not run it for `threshold` seconds, samples the
+    stack of the loop's thread, which is the stack of the blocking call. The stalls
+    are grouped by stack with their count and lag, and written to `path` as JSON, along
+    with the histogram, after each stall and when the monitor stops.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.1, interval: float = 0.02):
+        self._logger = logging.getLogger("loop_monitor")
+        self._path = path
+        self._threshold = threshold
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._histogram = [0] * (len(LAG_BUCKETS_MS) + 1)
+        # Stalls by stack: count, total and longest lag in seconds
+        self._stalls: Dict[Tuple[str, ...], List[float]] = {}
+        self._sample: Optional[Tuple[str, ...]] = None
+        self._beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._heartbeat_future = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._dirty = threading.Event()
+
+    def start(self):
+        """Starts monitoring the running loop."""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat_future = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._heartbeat_future:
+            self._heartbeat_future.cancel()
+        self._stopped.set()
+        if self._watchdog:
+            await asyncio.to_thread(self._watchdog.join)
+        self.write()
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self._interval
+            await asyncio.sleep(self._interval)
+            self._record(max(0.0, loop.time() - expected))
+            self._beat = time.monotonic()
+
+    def _record(self, lag: float):
+        lag_ms = lag * 1000
+        bucket = next(
+            (i for i, bound in enumerate(LAG_BUCKETS_MS) if lag_ms < bound),
+            len(LAG_BUCKETS_MS),
+        )
+        with self._lock:
+            self._histogram[bucket] += 1
+            sample, self._sample = self._sample, None
+            if sample is None:
+                return
+            stall = self._stalls.setdefault(sample, [0, 0.0, 0.0])
+            stall[0] += 1
+            stall[1] += lag
+            stall[2] = max(stall[2], lag)
+        self._logger.warning(f"Event loop stalled for {lag_ms:.0f} ms in {sample[-1]}")
+        self._dirty.set()
+
+    def _watch(self):
+        """The watchdog thread: samples the loop's stack once per stall."""
+        sampled_beat = None
+        while not self._stopped.wait(self._interval / 2):
+            beat = self._beat
+            if beat != sampled_beat and time.monotonic() - beat > self._threshold:
+                sampled_beat = beat
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    stack = tuple(
+                        f"{entry.filename}:{entry.lineno} in {entry.name}"
+                        for entry in traceback.extract_stack(frame)[-_STACK_DEPTH:]
+                    )
+                    with self._lock:
+                        self._sample = stack
+            if self._dirty.is_set():
+                self._dirty.clear()
+                self.write()
+
+    def snapshot(self) -> dict:
+        """The lag histogram and the stalls, longest first."""
+        with self._lock:
+            histogram = list(self._histogram)
+            stalls = sorted(self._stalls.items(), key=lambda item: -item[1][2])
+        bounds = [f"<{bound}ms" for bound in LAG_BUCKETS_MS]
+        bounds.append(f">={LAG_BUCKETS_MS[-1]}ms")
+        return {
+            "threshold": self._threshold,
+            "lag_histogram": dict(zip(bounds, histogram)),
+            "stalls": [
+                {
+                    "count": int(count),
+                    "total_lag": round(total, 6),
+                    "max_lag": round(longest, 6),
+                    "stack": list(stack),
+                }
+                for stack, (count, total, longest) in stalls
+            ],
+        }
+
+    def write(self):
+        """Writes the snapshot to the diagnostics file, replacing it atomically."""
+        snapshot = self.snapshot()
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp_path, self._path)
@@ -0,0 +1,59 @@
+import asyncio
+import os
+from typing import Any, Callable, Coroutine, Optional, TypeVar
+
+T = TypeVar("T")
+
+LOOPS = ("asyncio", "uvloop", "auto")
+
+
+def loop_factory(
+    loop: str = "asyncio",
+) -> Optional[Callable[[], asyncio.AbstractEventLoop]]:
+    """The factory of the selected event loop: None for asyncio's default loop, which
+    `asyncio.Runner` then creates, or uvloop's. `auto` selects uvloop if it is installed.
+
+    Raises:
+        ValueError: the loop is unknown
+        ImportError: uvloop is selected but not installed
+    """
+    if loop not in LOOPS:
+        raise ValueError(f"Unknown event loop '{loop}'")
+    if loop == "asyncio":
+        return None
+    # uvloop is optional: it is only imported when the config or the CLI selects it
+    try:
+        import uvloop
+    except ImportError:
+        if loop == "uvloop":
+            raise ImportError(
+                "The uvloop event loop requires the uvloop package: install mixnet[uvloop]"
+            )
+        return None
+    return uvloop.new_event_loop
+
+
+def run(
+    main: Coroutine[Any, Any, T], loop: str = "asyncio", eager_tasks: bool = False
+) -> T:
+    """Runs `main` like `asyncio.run`, on the selected event loop. With `eager_tasks`,
+    every task the loop creates runs up to its first suspension as soon as it is
+    created, so that RPC handlers and releases that complete without waiting skip a
+    trip through the loop's ready queue.
+    """
+    with asyncio.Runner(loop_factory=loop_factory(loop)) as runner:
+        if eager_tasks:
+            runner.get_loop().set_task_factory(asyncio.eager_task_factory)
+        return runner.run(main)
+
+
+def run_from_env(main: Coroutine[Any, Any, T]) -> T:
+    """Runs `main` on the event loop selected by the EVENT_LOOP and EAGER_TASKS
+    environment variables, which the CLI's options also read, for the scripts that
+    take no options.
+    """
+    return run(
+        main,
+        os.environ.get("EVENT_LOOP", "asyncio"),
+        os.environ.get("EAGER_TASKS", "").lower() in ("1", "true", "yes"),
+    )
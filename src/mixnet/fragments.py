@@ -0,0 +1,185 @@
+import functools
+import math
+import os
+import struct
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Reed-Solomon erasure coding over GF(2^8), with the primitive polynomial x^8 + x^4 +
+# x^3 + x^2 + 1. A fragment is multiplied by a coefficient with one `bytes.translate`
+# through the coefficient's multiplication table, and fragments are added (XORed) as
+# integers, so the per-byte work runs in C
+_EXP = [0] * 512
+_LOG = [0] * 256
+_value = 1
+for _power in range(255):
+    _EXP[_power] = _value
+    _LOG[_value] = _power
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11D
+for _power in range(255, 512):
+    _EXP[_power] = _EXP[_power - 255]
+
+# A fragment starts with a marker, the message's random ID, the fragment's index, k, n
+# and the length of the message. No UTF-8 text or compressed stream starts with 0xFF,
+# so fragments are told apart from whole messages by the marker
+MARKER = b"\xffF"
+_HEADER = struct.Struct("<2s16sBBBI")
+HEADER_BYTES = _HEADER.size
+MAX_FRAGMENTS = 255
+
+
+def _mul(a: int, b: int) -> int:
+    if a == 0 or b == 0:
+        return 0
+    return _EXP[_LOG[a] + _LOG[b]]
+
+
+def _inverse(a: int) -> int:
+    return _EXP[255 - _LOG[a]]
+
+
+@functools.lru_cache(maxsize=256)
+def _mul_table(coefficient: int) -> bytes:
+    return bytes(_mul(coefficient, x) for x in range(256))
+
+
+def _combine(coefficients: Sequence[int], shards: Sequence[bytes]) -> bytes:
+    """The sum of the shards multiplied by their coefficients."""
+    size = len(shards[0])
+    total = 0
+    for coefficient, shard in zip(coefficients, shards):
+        if coefficient == 1:
+            total ^= int.from_bytes(shard, "little")
+        elif coefficient:
+            total ^= int.from_bytes(shard.translate(_mul_table(coefficient)), "little")
+    return total.to_bytes(size, "little")
+
+
+def _row(index: int, k: int) -> List[int]:
+    """The coefficients of fragment `index` over the k data shards: the data shards
+    themselves first, then the rows of a Cauchy matrix, so that any k rows are
+    independent.
+    """
+    if index < k:
+        return [int(i == index) for i in range(k)]
+    return [_inverse(index ^ i) for i in range(k)]
+
+
+def _invert(matrix: List[List[int]]) -> List[List[int]]:
+    """Gauss-Jordan inversion of a square matrix over GF(2^8)."""
+    size = len(matrix)
+    rows = [row[:] + [int(i == j) for j in range(size)] for i, row in enumerate(matrix)]
+    for column in range(size):
+        pivot = next(i for i in range(column, size) if rows[i][column])
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        scale = _inverse(rows[column][column])
+        rows[column] = [_mul(scale, value) for value in rows[column]]
+        for i in range(size):
+            factor = rows[i][column]
+            if i != column and factor:
+                rows[i] = [
+                    value ^ _mul(factor, pivot_value)
+                    for value, pivot_value in zip(rows[i], rows[column])
+                ]
+    return [row[size:] for row in rows]
+
+
+def encode(data: bytes, k: int, n: int) -> List[bytes]:
+    """Splits `data` into k equal shards, zero-padding the last, and returns them
+    followed by n - k parity shards. Any k of the n shards rebuild the data.
+    """
+    if not 0 < k <= n <= MAX_FRAGMENTS:
+        raise ValueError(f"Invalid erasure code: {k} of {n} fragments")
+    size = max(1, math.ceil(len(data) / k))
+    data = data.ljust(size * k, b"\x00")
+    shards = [data[i * size : (i + 1) * size] for i in range(k)]
+    return shards + [_combine(_row(index, k), shards) for index in range(k, n)]
+
+
+def decode(shards: Dict[int, bytes], k: int, length: int) -> bytes:
+    """Rebuilds `length` bytes of data from any k shards, by their index.
+
+    Raises:
+        ValueError: fewer than k shards
+    """
+    if len(shards) < k:
+        raise ValueError(f"{len(shards)} fragments of the {k} needed")
+    indices = sorted(shards)[:k]
+    if indices == list(range(k)):
+        data = [shards[i] for i in indices]
+    else:
+        inverse = _invert([_row(index, k) for index in indices])
+        received = [shards[index] for index in indices]
+        data = [_combine(inverse[i], received) for i in range(k)]
+    return b"".join(data)[:length]
+
+
+def split_message(data: bytes, fragment_bytes: int, parity: float) -> List[bytes]:
+    """Splits a message into fragments of `fragment_bytes` bytes plus the header, k
+    for the data and `parity` times as many more (at least one) for redundancy, any k
+    of which rebuild the message.
+
+    Raises:
+        ValueError: the message needs more than 255 fragments
+    """
+    k = max(1, math.ceil(len(data) / fragment_bytes))
+    n = k + (max(1, math.ceil(k * parity)) if parity > 0 else 0)
+    if n > MAX_FRAGMENTS:
+        raise ValueError(
+            f"Message of {len(data)} bytes needs {n} fragments, more than {MAX_FRAGMENTS}"
+        )
+    message_id = os.urandom(16)
+    # Every fragment is padded to the full size, so that all the packets are alike
+    shards = encode(data.ljust(k * fragment_bytes, b"\x00"), k, n)
+    return [
+        _HEADER.pack(MARKER, message_id, index, k, n, len(data)) + shard
+        for index, shard in enumerate(shards)
+    ]
+
+
+def is_fragment(plaintext) -> bool:
+    return len(plaintext) >= HEADER_BYTES and bytes(plaintext[:2]) == MARKER
+
+
+class Reassembler:
+    """Collects the fragments of a recipient's messages, returning each message once
+    k of its fragments arrived. The fragments of a message that arrive after it was
+    rebuilt are ignored. Incomplete messages beyond the last `max_pending` are dropped.
+    """
+
+    def __init__(self, max_pending: int = 64):
+        self._max_pending = max_pending
+        self._pending: "OrderedDict[bytes, Tuple[int, int, Dict[int, bytes]]]" = (
+            OrderedDict()
+        )
+        self._done: "OrderedDict[bytes, None]" = OrderedDict()
+
+    @property
+    def pending(self) -> int:
+        """The messages with fragments still missing."""
+        return len(self._pending)
+
+    def add(self, fragment) -> Optional[bytes]:
+        """Adds a fragment, returning its message if it is the k-th.
+
+        Raises:
+            ValueError: the fragment is malformed
+        """
+        marker, message_id, index, k, n, length = _HEADER.unpack_from(fragment)
+        if marker != MARKER or not index < n or not 0 < k <= n:
+            raise ValueError("Malformed fragment")
+        if message_id in self._done:
+            return None
+        _, _, shards = self._pending.setdefault(message_id, (k, length, {}))
+        shards[index] = bytes(memoryview(fragment)[HEADER_BYTES:])
+        if len(shards) < k:
+            while len(self._pending) > self._max_pending:
+                self._pending.popitem(last=False)
+            return None
+        del self._pending[message_id]
+        self._done[message_id] = None
+        while len(self._done) > self._max_pending:
+            self._done.popitem(last=False)
+        return decode(shards, k, length)
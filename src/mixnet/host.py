@@ -0,0 +1,356 @@
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Dict, List, Optional
+
+from mixnet.admin import AdminService, PeerLatency, Profiler, Queues
+from mixnet.compression import Compressor
+from mixnet.crypto import secure_shuffle
+from mixnet.diagnostics import LoopMonitor
+from mixnet.identity import ClientIdentity, ClientPackets
+from mixnet.mixnet_pb2 import (
+    ClientPollMessagesResponse,
+    PrepareMessageResponse,
+    RoundClockRequest,
+    RoundTick,
+    StatusResponse,
+)
+from mixnet.mixnet_pb2_grpc import ClientServicer
+from mixnet.models import Fragmentation
+from mixnet.onion import Route
+from mixnet.routing import RoutingTable
+from mixnet.transport import GrpcTransport, Transport
+from mixnet.wire import ForwardBatch, split_batch
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+
+class ClientHost(ClientServicer, AdminService):
+    """Serves many client identities behind one listener, as a gateway does. Requests
+    name the identity in their `client_id`. All the identities share the route, the
+    transport and a single round clock stream, which registers them as one roster: when
+    a round closes, the host sends the packets of all of them to the first mix server
+    as one batch, building the missing dummies and the bundles on a worker thread from
+    what `ClientPackets.take` took out of the identities on the event loop. Each
+    identity only costs a compact record, instead of a listener, a task and a timer per
+    client.
+    """
+
+    def __init__(
+        self,
+        addr: str,
+        port: int,
+        config_dir: Optional[str],
+        mix_pubkeys: List[bytes],
+        mix_addrs: List[str],
+        routing: RoutingTable,
+        dummy_payload: str = "dummy",
+        transport: Optional[Transport] = None,
+        compressor: Optional[Compressor] = None,
+        drop_dummies_at_exit: bool = False,
+        session_epoch: Optional[int] = None,
+        aggregate_bytes: Optional[int] = None,
+        fragmentation: Optional[Fragmentation] = None,
+        monitor: Optional[LoopMonitor] = None,
+        output_dir: Optional[str] = None,
+    ):
+        self._logger = logging.getLogger(f"host_{port}")
+        self._addr = addr
+        self._port = port
+        self._config_dir = config_dir
+        self._routing = routing
+        self._route = Route(mix_pubkeys, [routing.node_id(addr) for addr in mix_addrs])
+        self._first_host = mix_addrs[0]
+        self._last_host = mix_addrs[-1]
+        # A transport created here is owned, and its pooled channels closed on stop
+        self._owns_transport = transport is None
+        self._transport = transport or GrpcTransport()
+        self._packets = ClientPackets(
+            self._logger,
+            self._route,
+            routing,
+            self._transport,
+            compressor or Compressor(),
+            dummy_payload,
+            drop_dummies_at_exit,
+            aggregate_bytes,
+            fragmentation,
+        )
+        self._session_epoch = session_epoch
+        self._monitor = monitor
+        self._profiler = Profiler(f"host_{port}", output_dir)
+        self._registered = False
+        # The sends to the first mix server, one per round
+        self._latency = PeerLatency()
+        self._failed_rounds = 0
+        self._failed_forwards = 0
+        self._identities: Dict[str, ClientIdentity] = {}
+        self._round = 0
+        self._listener = None
+        self._ticks = None
+        self._run_future = None
+
+    @property
+    def address(self) -> str:
+        return self._addr
+
+    def add(self, client_id: str, address: str) -> bytes:
+        """Adds an identity, before the host starts. Its address must be in the routing
+        table, and only names it: all the identities are reached at the host's address.
+
+        Returns:
+            bytes: the identity's public key
+        """
+        # Fails early for an address missing from the routing table
+        self._routing.node_id(address)
+        identity = ClientIdentity(client_id, address, self._config_dir)
+        self._identities[client_id] = identity
+        return identity.pubkey
+
+    def pubkey(self, client_id: str) -> bytes:
+        return self._identity(client_id).pubkey
+
+    def _identity(self, client_id: str) -> ClientIdentity:
+        """Raises:
+        ValueError: the host does not serve this client
+        """
+        identity = self._identities.get(client_id)
+        if identity is None:
+            raise ValueError(f"Client '{client_id}' is not served by this host")
+        return identity
+
+    def bind(self) -> int:
+        """Creates the listener and binds its port, before the host starts.
+        With port 0 the OS assigns the port, and the host's address is updated to it.
+
+        Returns:
+            int: the bound port
+        """
+        if self._listener is None:
+            self._listener = self._transport.bind(self, self._port)
+            if not self._port:
+                host = self._addr.rsplit(":", 1)[0]
+                self._addr = f"{host}:{self._listener.port}"
+            self._port = self._listener.port
+        return self._port
+
+    async def start(self):
+        if self._monitor:
+            self._monitor.start()
+        self.bind()
+        request = RoundClockRequest(client_ids=list(self._identities))
+        self._ticks = aiter(
+            self._transport.stream(self._first_host, "RoundClock", request)
+        )
+        tick = await anext(self._ticks, None)
+        if tick is None or tick.event != RoundTick.REGISTERED:
+            raise Exception(f"Failed to register with server: {self._first_host}")
+        self._registered = True
+        tick = await anext(self._ticks, None)
+        if tick is None or tick.event != RoundTick.OPEN:
+            raise Exception(f"Server is not ready: {self._first_host}")
+        self._round = tick.round
+        if self._session_epoch:
+            # Every identity has its own sessions, so that they cannot be linked
+            for identity in self._identities.values():
+                identity.sessions = self._route.open_sessions(
+                    self._session_epoch, self._round
+                )
+        await self._listener.start()
+        self._run_future = asyncio.create_task(self.run_forever())
+        self._logger.info(
+            f"Client host started with {len(self._identities)} clients, "
+            f"round duration: {tick.round_duration}"
+        )
+
+    async def run_forever(self):
+        """Sends the packets of all the identities whenever the round clock closes a
+        round.
+        """
+        async for tick in self._ticks:
+            if tick.event == RoundTick.OPEN:
+                self._round = max(self._round, tick.round)
+            elif tick.event == RoundTick.CLOSE:
+                await self._send_round(tick.round)
+                self._profiler.round_ended()
+
+    async def _send_round(self, round: int):
+        # Messages prepared from now on go into the next round
+        self._round = round + 1
+        packets = [
+            self._packets.take(identity, round)
+            for identity in self._identities.values()
+        ]
+        for identity in self._identities.values():
+            if identity.sessions:
+                identity.sessions.forget(round + 1)
+        payloads = await asyncio.to_thread(self._packets.build, packets)
+        # The packets follow the identities' order, which would let the first mix link
+        # them from one round to the next
+        payloads = secure_shuffle(payloads)
+        started = time.monotonic()
+        chunks = split_batch(payloads, self._transport.max_batch_bytes)
+        results = await asyncio.gather(
+            *(
+                self._transport.call(
+                    self._first_host, "ForwardMessages", ForwardBatch(chunk, round)
+                )
+                for chunk in chunks
+            ),
+            return_exceptions=True,
+        )
+        failed = sum(
+            len(chunk)
+            for chunk, result in zip(chunks, results)
+            if isinstance(result, Exception)
+        )
+        self._latency.record(time.monotonic() - started, failed=bool(failed))
+        if failed:
+            # A failed round is dropped like a failed forward between mixes, and the
+            # host goes on with the next round
+            self._failed_rounds += 1
+            self._failed_forwards += failed
+            error = next(result for result in results if isinstance(result, Exception))
+            self._logger.warning(
+                f"Dropping {failed} of {len(payloads)} round {round} packets: {error!r}"
+            )
+            return
+        built = sum(not packet.prepared for packet in packets)
+        self._logger.debug(
+            f"Sent {len(payloads)} round {round} packets, {built} built on sending"
+        )
+
+    def status(self) -> StatusResponse:
+        """A snapshot of the round, the packets all the identities prepared for the
+        coming rounds, the sends to the first mix server and the messages still
+        missing fragments.
+        """
+        queues = Queues()
+        pending_fragments = 0
+        for identity in self._identities.values():
+            identity.add_queues(queues)
+            pending_fragments += identity.reassembler.pending
+        return StatusResponse(
+            node_id=f"host_{self._port}",
+            running=self._run_future is not None and not self._run_future.done(),
+            round=self._round,
+            registered=len(self._identities) if self._registered else 0,
+            queues=queues.status(),
+            bytes_held=queues.bytes,
+            peers=[self._latency.status(self._first_host)],
+            failed_forwards=self._failed_forwards,
+            pending_fragments=pending_fragments,
+        )
+
+    async def stop(self):
+        self._logger.info("Stopping client host")
+        if self._run_future:
+            # Ends the round clock stream too
+            self._run_future.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._run_future
+        if self._listener:
+            await self._listener.stop(grace=5.0)
+        if self._owns_transport:
+            await self._transport.close()
+        for identity in self._identities.values():
+            identity.remove_pubkey()
+        if self._monitor:
+            await self._monitor.stop()
+        self._logger.info("Client host stopped")
+
+    async def prepare_message(
+        self,
+        client_id: str,
+        message: str,
+        recipient_pubkey: bytes,
+        recipient_addr: str,
+    ) -> int:
+        """Prepares a message from one identity like `Client._prepare_message` does
+        (see `ClientPackets.prepare`), from the current round on.
+
+        Raises:
+            ValueError: the host does not serve the client, the recipient is not in
+                the routing table, the message needs too many fragments, or does not
+                fit in a bundle
+
+        Returns:
+            int: the round the message (or its last fragment) will be sent in
+        """
+        return self._packets.prepare(
+            self._identity(client_id),
+            message,
+            recipient_pubkey,
+            recipient_addr,
+            self._round,
+        )
+
+    async def poll_messages(self, client_id: str, server_host: str) -> List[str]:
+        """Polls one identity's messages like `Client._poll_messages` does."""
+        return await self._packets.poll(self._identity(client_id), server_host)
+
+    async def PrepareMessage(self, request, context):
+        """A gRPC API method to invoke prepare_message for the request's client
+
+        Args:
+            request (PrepareMessageRequest): gRPC request
+            context (_type_): gRPC context
+
+        Returns:
+            PrepareMessageResponse: the response indicating the status of the operation
+        """
+        round = await self.prepare_message(
+            request.client_id,
+            request.message,
+            request.recipient_pubkey,
+            request.recipient_addr,
+        )
+        return PrepareMessageResponse(
+            status=True, request_id=request.request_id, round=round
+        )
+
+    async def PrepareMessages(self, request_iterator, context):
+        """A streaming gRPC API method to invoke prepare_message for every request
+        received on a long-lived stream, like `Client.PrepareMessages` does. Requests
+        on one stream may come from different clients of the host.
+
+        Args:
+            request_iterator (AsyncIterator[PrepareMessageRequest]): gRPC request stream
+            context (_type_): gRPC context
+
+        Yields:
+            PrepareMessageResponse: the acknowledgement of each request
+        """
+        async for request in request_iterator:
+            try:
+                round = await self.prepare_message(
+                    request.client_id,
+                    request.message,
+                    request.recipient_pubkey,
+                    request.recipient_addr,
+                )
+            except Exception as e:
+                self._logger.warning(f"Failed to prepare message: {e}")
+                yield PrepareMessageResponse(
+                    status=False, request_id=request.request_id, error=str(e)
+                )
+                continue
+            yield PrepareMessageResponse(
+                status=True, request_id=request.request_id, round=round
+            )
+
+    async def PollMessages(self, request, context):
+        """A gRPC API method to invoke poll_messages for the request's client
+
+        Args:
+            request (ClientPollMessagesRequest): gRPC request
+            context (_type_): gRPC context
+
+        Returns:
+            ClientPollMessagesResponse: the response containing the list of messages
+        """
+        messages = await self.poll_messages(request.client_id, self._last_host)
+        return ClientPollMessagesResponse(messages=messages)
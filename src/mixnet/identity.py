@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Sequence, Union
+
+from nacl.bindings import crypto_box_SEALBYTES
+
+from mixnet.admin import Queues
+from mixnet.compression import Compressor
+from mixnet.crypto import DummyMarker, Unsealer, generate_key_pair, sealing_box
+from mixnet.fragments import Reassembler, is_fragment, split_message
+from mixnet.mixnet_pb2 import PollMessagesRequest
+from mixnet.models import Fragmentation
+from mixnet.onion import Bundle, Route, add_to_bundles
+from mixnet.routing import AGGREGATE_ID, DROP_ID, RoutingTable
+from mixnet.session import ClientSessions, RoundSeals
+from mixnet.transport import Transport
+
+
+class ClientIdentity:
+    """A client's keys, its address and the packets it prepared, by round. A `Client`
+    has one and a `ClientHost` serves many, and both prepare, send and open packets
+    through `ClientPackets`. Its state is only touched on the event loop.
+    """
+
+    __slots__ = (
+        "id",
+        "address",
+        "pubkey",
+        "pubkey_path",
+        "unsealer",
+        "marker",
+        "messages",
+        "sessions",
+        "bundles",
+        "reassembler",
+    )
+
+    def __init__(self, id: str, address: str, config_dir: Optional[str]):
+        self.id = id
+        self.address = address
+        # Without a config directory the public key is only handed out in memory
+        self.pubkey_path = os.path.join(config_dir, f"{id}.key") if config_dir else None
+        privkey, self.pubkey = generate_key_pair(self.pubkey_path)
+        self.unsealer = Unsealer(privkey)
+        # Dummies are marked rather than sealed, with the size of a sealed dummy payload
+        self.marker = DummyMarker(privkey)
+        self.messages: Dict[int, bytes] = {}
+        # Session mode starts with the first round the client sends in
+        self.sessions: Optional[ClientSessions] = None
+        self.bundles: Dict[int, Bundle] = {}
+        # Received fragments are reassembled whether or not this client sends any
+        self.reassembler = Reassembler()
+
+    def add_queues(self, queues: Queues):
+        """Adds the packets prepared for the coming rounds to a status snapshot."""
+        for round, payload in self.messages.items():
+            queues.add(round, 1, len(payload))
+        for round, bundle in self.bundles.items():
+            queues.add(round, len(bundle), bundle.size)
+
+    def remove_pubkey(self):
+        if self.pubkey_path and os.path.exists(self.pubkey_path):
+            os.remove(self.pubkey_path)
+
+
+class OutgoingPacket:
+    """A client's packet for a round, as `ClientPackets.take` takes it out of the
+    identity: either prepared already, or a bundle or dummy to wrap for the route with
+    the round's seals. `build` uses no identity state, so it can run on a worker thread.
+    """
+
+    __slots__ = ("_packet", "_body", "_recipient_id", "_seals", "_round")
+
+    def __init__(
+        self,
+        packet: Optional[bytes] = None,
+        body: Union[bytes, Bundle, None] = None,
+        recipient_id: int = 0,
+        seals: Optional[RoundSeals] = None,
+        round: int = 0,
+    ):
+        self._packet = packet
+        self._body = body
+        self._recipient_id = recipient_id
+        self._seals = seals
+        self._round = round
+
+    @property
+    def prepared(self) -> bool:
+        return self._packet is not None
+
+    def build(self, route: Route) -> bytes:
+        if self._packet is not None:
+            return self._packet
+        body = self._body
+        if isinstance(body, Bundle):
+            body = body.encode()
+        return route.wrap(body, self._recipient_id, self._seals, self._round)
+
+
+class ClientPackets:
+    """What clients do with their packets, shared by `Client` and `ClientHost`:
+    preparing messages and scheduling them in the coming rounds, taking a round's
+    packet (with a dummy or an empty bundle if none was prepared), and polling and
+    opening the messages delivered to them.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        route: Route,
+        routing: RoutingTable,
+        transport: Transport,
+        compressor: Compressor,
+        dummy_payload: str,
+        drop_dummies_at_exit: bool,
+        aggregate_bytes: Optional[int],
+        fragmentation: Optional[Fragmentation],
+    ):
+        self._logger = logger
+        self._route = route
+        self._routing = routing
+        self._transport = transport
+        self._compressor = compressor
+        self._dummy_payload = dummy_payload
+        self._drop_dummies_at_exit = drop_dummies_at_exit
+        self._aggregate_bytes = aggregate_bytes
+        self._fragmentation = fragmentation
+        self._dummy_size = (
+            len(compressor.compress(dummy_payload.encode())) + crypto_box_SEALBYTES
+        )
+
+    def prepare(
+        self,
+        identity: ClientIdentity,
+        message: str,
+        recipient_pubkey: bytes,
+        recipient_addr: str,
+        round: int,
+    ) -> int:
+        """Prepares a message to be sent in the mixnet by encrypting it in layers like an onion.
+        The message is compressed with the configured codec, encrypted with the recipient's
+        public key and then with the public keys of the mix servers in reverse order.
+        It is scheduled for the first round from `round` on that has no message yet, or
+        with aggregation, added to the first bundle with room for it. A message larger
+        than a fragment is split into erasure-coded fragments, each sealed for the
+        recipient and scheduled like a message of its own, so that every fragment is a
+        standard-size packet and the recipient rebuilds the message from any k.
+        A dummy (the dummy payload sent to the client itself) is never read, so instead of
+        being sealed it is replaced by a marked random payload of the same size, and if
+        enabled its final layer is addressed to the drop ID, which the exit mix drops.
+        A dummy for a round that already has a message is ignored, and with aggregation,
+        dummies are not bundled: a round without messages sends an empty bundle.
+
+        Raises:
+            ValueError: the recipient is not in the routing table, the message needs too
+                many fragments, or it does not fit in a bundle
+
+        Returns:
+            int: the round the message (or its last fragment) will be sent in
+        """
+        recipient_id = self._routing.node_id(recipient_addr)
+        if message == self._dummy_payload and recipient_addr == identity.address:
+            if not self._aggregate_bytes and round not in identity.messages:
+                identity.messages[round] = self._route.wrap(
+                    identity.marker.make(self._dummy_size),
+                    DROP_ID if self._drop_dummies_at_exit else recipient_id,
+                    identity.sessions,
+                    round,
+                )
+            return round
+        plaintext = self._compressor.compress(message.encode())
+        plaintexts = [plaintext]
+        if self._fragmentation and len(plaintext) > self._fragmentation.fragment_bytes:
+            plaintexts = split_message(
+                plaintext,
+                self._fragmentation.fragment_bytes,
+                self._fragmentation.parity,
+            )
+        box = sealing_box(recipient_pubkey)
+        last_round = round
+        for plaintext in plaintexts:
+            last_round = max(
+                last_round,
+                self._schedule(identity, box.encrypt(plaintext), recipient_id, round),
+            )
+        if len(plaintexts) > 1:
+            self._logger.info(
+                f"Prepared {len(plaintexts)} fragments for rounds up to {last_round}"
+            )
+        return last_round
+
+    def _schedule(
+        self, identity: ClientIdentity, ciphertext: bytes, recipient_id: int, round: int
+    ) -> int:
+        """Schedules a message sealed for its recipient in the identity's first round
+        from `round` on with no message yet, or with aggregation whose bundle has room
+        for it.
+
+        Returns:
+            int: the round the message will be sent in
+        """
+        if self._aggregate_bytes:
+            return add_to_bundles(
+                identity.bundles, self._aggregate_bytes, round, ciphertext, recipient_id
+            )
+        while round in identity.messages:
+            round += 1
+        identity.messages[round] = self._route.wrap(
+            ciphertext, recipient_id, identity.sessions, round
+        )
+        return round
+
+    def take(self, identity: ClientIdentity, round: int) -> OutgoingPacket:
+        """Takes an identity's packet for a round out of its state: the prepared packet,
+        or else a marked dummy, and with aggregation the round's bundle, which is empty
+        if no message was prepared for it. Unless dummies are dropped at the exit, an
+        empty bundle carries a dummy.
+        """
+        seals = identity.sessions.round_seals(round) if identity.sessions else None
+        if self._aggregate_bytes:
+            bundle = identity.bundles.pop(round, None) or Bundle(self._aggregate_bytes)
+            if not bundle and not self._drop_dummies_at_exit:
+                bundle.add(
+                    identity.marker.make(self._dummy_size),
+                    self._routing.node_id(identity.address),
+                )
+            return OutgoingPacket(
+                body=bundle, recipient_id=AGGREGATE_ID, seals=seals, round=round
+            )
+        packet = identity.messages.pop(round, None)
+        if packet is not None:
+            return OutgoingPacket(packet)
+        return OutgoingPacket(
+            body=identity.marker.make(self._dummy_size),
+            recipient_id=(
+                DROP_ID
+                if self._drop_dummies_at_exit
+                else self._routing.node_id(identity.address)
+            ),
+            seals=seals,
+            round=round,
+        )
+
+    def build(self, packets: Sequence[OutgoingPacket]) -> List[bytes]:
+        """Builds the packets taken by `take`, off the identities' state."""
+        return [packet.build(self._route) for packet in packets]
+
+    async def poll(self, identity: ClientIdentity, server_host: str) -> List[str]:
+        """Calls the server's gRPC method to poll an identity's messages from it.
+        The identity's own dummies are recognised by their marker and dropped without
+        decrypting them. The remaining payloads are decrypted with the identity's
+        private key in one batch on a worker thread, off the event loop. They are
+        then reassembled, if they are fragments, and decompressed back on the loop,
+        where the identity's reassembler and the shared compressor are only used by
+        one poll at a time.
+
+        Args:
+            identity (ClientIdentity): the identity whose messages to poll
+            server_host (str): the address of the mix server to poll messages from
+
+        Returns:
+            List[str]: list of decrypted messages that are not dummy payloads
+        """
+        request = PollMessagesRequest(client_addr=identity.address)
+        response = await self._transport.call(server_host, "PollMessages", request)
+        payloads = [
+            payload
+            for payload in response.payloads
+            if not identity.marker.is_dummy(payload)
+        ]
+        self._logger.debug(
+            f"Dropped {len(response.payloads) - len(payloads)} dummies without decrypting"
+        )
+        if not payloads:
+            return []
+        plaintexts = await asyncio.to_thread(self._unseal, identity, payloads)
+        return self._open_messages(identity, plaintexts)
+
+    @staticmethod
+    def _unseal(identity: ClientIdentity, payloads: Sequence[bytes]) -> List[bytes]:
+        return [identity.unsealer.unseal(payload) for payload in payloads]
+
+    def _open_messages(
+        self, identity: ClientIdentity, plaintexts: Sequence[bytes]
+    ) -> List[str]:
+        """Decompresses decrypted payloads, dropping dummy payloads.
+        Fragments are held until enough of them arrived to rebuild their message.
+        """
+        messages = []
+        for plaintext in plaintexts:
+            if is_fragment(plaintext):
+                plaintext = identity.reassembler.add(plaintext)
+                if plaintext is None:
+                    continue
+            message = self._compressor.decompress(plaintext).decode()
+            if message != self._dummy_payload:
+                messages.append(message)
+        return messages
@@ -0,0 +1,192 @@
+import abc
+import asyncio
+import logging
+import math
+import random
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from mixnet.crypto import secure_shuffle
+from mixnet.models import Message, Mixing
+from mixnet.timer_wheel import TimerScheduler
+
+# Receives a batch of messages leaving the mix and the round (or tick) they leave in
+Release = Callable[[List[Message], int], Awaitable[None]]
+
+_rng = random.SystemRandom()
+
+
+class MixingStrategy(abc.ABC):
+    """Decides when the messages a mix server received leave it.
+    The server hands every peeled message to `add`, and runs `run` as a background task
+    that hands the batches leaving the mix to the `release` callback, until `stop`.
+    """
+
+    def __init__(self):
+        self._logger = logging.getLogger(type(self).__name__)
+        self._release: Optional[Release] = None
+        # Cleared by `stop`, which may come before `run` started
+        self._running = True
+        self._releases: Set[asyncio.Task] = set()
+
+    def bind(self, release: Release):
+        self._release = release
+
+    @abc.abstractmethod
+    async def add(self, messages: List[Message], round: int):
+        """Takes the peeled messages received for a round."""
+
+    @abc.abstractmethod
+    async def run(self):
+        """Releases the batches leaving the mix until `stop`."""
+
+    async def stop(self):
+        self._running = False
+        await asyncio.gather(*self._releases)
+
+    def held(self) -> Dict[int, List[Message]]:
+        """The messages waiting in the mix, by the round (or flush, or tick) they
+        arrived in or wait at.
+        """
+        return {}
+
+    def _emit(self, messages: List[Message], round: int):
+        """Releases a batch without holding up the strategy's clock."""
+        task = asyncio.create_task(self._release(messages, round))
+        self._releases.add(task)
+        task.add_done_callback(self._releases.discard)
+
+
+class ThresholdMixing(MixingStrategy):
+    """Strict threshold batches: a round leaves the mix once exactly
+    `messages_per_round` messages were received for it, one round after another.
+    """
+
+    def __init__(self, messages_per_round: int):
+        super().__init__()
+        self.messages_per_round = messages_per_round
+        self.round = 0
+        self.messages: Dict[int, List[Message]] = {}
+        self._cond = asyncio.Condition()
+
+    def ready(self) -> bool:
+        return len(self.messages.get(self.round, [])) >= self.messages_per_round
+
+    def held(self) -> Dict[int, List[Message]]:
+        return self.messages
+
+    async def add(self, messages: List[Message], round: int):
+        async with self._cond:
+            self.messages.setdefault(round, []).extend(messages)
+            self._logger.debug(
+                f"Stored {len(messages)} messages for round {round}. Count: {len(self.messages[round])}/{self.messages_per_round}"
+            )
+            if len(self.messages[round]) >= self.messages_per_round:
+                self._logger.info(
+                    f"All messages received for round {round}. Notifying."
+                )
+                self._cond.notify()
+
+    async def run(self):
+        """Waits for all the messages of the current round, then releases them."""
+        while self._running:
+            async with self._cond:
+                await self._cond.wait_for(lambda: not self._running or self.ready())
+                if not self._running:
+                    break
+                messages = self.messages.pop(self.round)
+                current_round = self.round
+                self._logger.info(
+                    f"Processing round {current_round} with {len(messages)} messages."
+                )
+                self.round += 1
+            await self._release(messages, current_round)
+
+    async def stop(self):
+        async with self._cond:
+            self._running = False
+            self._cond.notify()  # Wake up the round task to check the running flag
+        await super().stop()
+
+
+class PoolMixing(MixingStrategy):
+    """Timed dynamic pool mixing: every `interval` seconds, a random `fraction` of the
+    messages exceeding `pool_min` leaves the mix, and the rest stays in the pool.
+    Messages do not wait for a full round, while the pool keeps every flush mixed with
+    messages from earlier ones.
+    """
+
+    def __init__(self, interval: float, pool_min: int = 0, fraction: float = 1.0):
+        super().__init__()
+        self._interval = interval
+        self._pool_min = pool_min
+        self._fraction = fraction
+        self._pool: List[Message] = []
+        self._flushes = 0
+
+    async def add(self, messages: List[Message], round: int):
+        self._pool.extend(messages)
+
+    def held(self) -> Dict[int, List[Message]]:
+        return {self._flushes: self._pool} if self._pool else {}
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        next_flush = loop.time()
+        while self._running:
+            next_flush += self._interval
+            await asyncio.sleep(max(0.0, next_flush - loop.time()))
+            count = math.floor((len(self._pool) - self._pool_min) * self._fraction)
+            if count <= 0:
+                continue
+            pool = secure_shuffle(self._pool)
+            self._pool = pool[count:]
+            self._logger.info(
+                f"Flush {self._flushes}: releasing {count} messages, {len(self._pool)} stay in the pool"
+            )
+            self._emit(pool[:count], self._flushes)
+            self._flushes += 1
+
+
+class ContinuousMixing(MixingStrategy):
+    """Continuous-time (stop-and-go) mixing: every message is delayed independently by
+    an exponentially distributed time with mean `mean_delay` seconds, and leaves the mix
+    when its delay expires, with no round barrier. Delays are kept in a timer wheel that
+    advances every `tick` seconds and releases each tick's expired messages as one batch.
+    A longer mean delay mixes each message with more others, at the cost of latency.
+    """
+
+    def __init__(self, mean_delay: float, tick: float = 0.01):
+        super().__init__()
+        self._mean_delay = mean_delay
+        self._scheduler = TimerScheduler(tick, self._emit)
+        self._stopped = asyncio.Event()
+
+    async def add(self, messages: List[Message], round: int):
+        for message in messages:
+            self._scheduler.schedule(message, _rng.expovariate(1 / self._mean_delay))
+
+    async def run(self):
+        await self._stopped.wait()
+
+    def held(self) -> Dict[int, List[Message]]:
+        return (
+            {self._scheduler.tick: self._scheduler.items()}
+            if len(self._scheduler)
+            else {}
+        )
+
+    async def stop(self):
+        dropped = self._scheduler.cancel()
+        if dropped:
+            self._logger.warning(f"Dropping {len(dropped)} delayed messages")
+        self._stopped.set()
+        await super().stop()
+
+
+def make_mixing(mixing: Mixing, messages_per_round: int) -> MixingStrategy:
+    """Builds the mixing strategy selected in the config."""
+    if mixing.strategy == "pool":
+        return PoolMixing(mixing.interval, mixing.pool_min, mixing.pool_fraction)
+    if mixing.strategy == "continuous":
+        return ContinuousMixing(mixing.mean_delay, mixing.tick)
+    return ThresholdMixing(messages_per_round)
@@ -20,7 +20,7 @@ _sym_db = _symbol_database.Default()
 
 
 DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(
-    b'\n\x0cmixnet.proto\x12\x06mixnet"7\n\x15\x46orwardMessageRequest\x12\x0f\n\x07payload\x18\x01 \x01(\x0c\x12\r\n\x05round\x18\x02 \x01(\x05"(\n\x16\x46orwardMessageResponse\x12\x0e\n\x06status\x18\x01 \x01(\t"*\n\x13PollMessagesRequest\x12\x13\n\x0b\x63lient_addr\x18\x01 \x01(\t"(\n\x14PollMessagesResponse\x12\x10\n\x08payloads\x18\x01 \x03(\x0c"$\n\x0fRegisterRequest\x12\x11\n\tclient_id\x18\x01 \x01(\t""\n\x10RegisterResponse\x12\x0e\n\x06status\x18\x01 \x01(\x08"(\n\x13WaitForStartRequest\x12\x11\n\tclient_id\x18\x01 \x01(\t"=\n\x14WaitForStartResponse\x12\r\n\x05ready\x18\x01 \x01(\x08\x12\x16\n\x0eround_duration\x18\x02 \x01(\x02"Z\n\x15PrepareMessageRequest\x12\x0f\n\x07message\x18\x01 \x01(\t\x12\x18\n\x10recipient_pubkey\x18\x02 \x01(\x0c\x12\x16\n\x0erecipient_addr\x18\x03 \x01(\t"(\n\x16PrepareMessageResponse\x12\x0e\n\x06status\x18\x01 \x01(\x08"\x1b\n\x19\x43lientPollMessagesRequest".\n\x1a\x43lientPollMessagesResponse\x12\x10\n\x08messages\x18\x01 \x03(\t2\xb1\x02\n\tMixServer\x12O\n\x0e\x46orwardMessage\x12\x1d.mixnet.ForwardMessageRequest\x1a\x1e.mixnet.ForwardMessageResponse\x12I\n\x0cPollMessages\x12\x1b.mixnet.PollMessagesRequest\x1a\x1c.mixnet.PollMessagesResponse\x12=\n\x08Register\x12\x17.mixnet.RegisterRequest\x1a\x18.mixnet.RegisterResponse\x12I\n\x0cWaitForStart\x12\x1b.mixnet.WaitForStartRequest\x1a\x1c.mixnet.WaitForStartResponse2\xb0\x01\n\x06\x43lient\x12O\n\x0ePrepareMessage\x12\x1d.mixnet.PrepareMessageRequest\x1a\x1e.mixnet.PrepareMessageResponse\x12U\n\x0cPollMessages\x12!.mixnet.ClientPollMessagesRequest\x1a".mixnet.ClientPollMessagesResponseb\x06proto3'
+    b'\n\x0cmixnet.proto\x12\x06mixnet"7\n\x15\x46orwardMessageRequest\x12\x0f\n\x07payload\x18\x01 \x01(\x0c\x12\r\n\x05round\x18\x02 \x01(\x05"9\n\x16\x46orwardMessagesRequest\x12\x10\n\x08payloads\x18\x01 \x03(\x0c\x12\r\n\x05round\x18\x02 \x01(\x05"(\n\x16\x46orwardMessageResponse\x12\x0e\n\x06status\x18\x01 \x01(\t"*\n\x13PollMessagesRequest\x12\x13\n\x0b\x63lient_addr\x18\x01 \x01(\t"(\n\x14PollMessagesResponse\x12\x10\n\x08payloads\x18\x01 \x03(\x0c"$\n\x0fRegisterRequest\x12\x11\n\tclient_id\x18\x01 \x01(\t""\n\x10RegisterResponse\x12\x0e\n\x06status\x18\x01 \x01(\x08"(\n\x13WaitForStartRequest\x12\x11\n\tclient_id\x18\x01 \x01(\t"=\n\x14WaitForStartResponse\x12\r\n\x05ready\x18\x01 \x01(\x08\x12\x16\n\x0eround_duration\x18\x02 \x01(\x02"\'\n\x11RoundClockRequest\x12\x12\n\nclient_ids\x18\x01 \x03(\t"\x96\x01\n\tRoundTick\x12&\n\x05\x65vent\x18\x01 \x01(\x0e\x32\x17.mixnet.RoundTick.Event\x12\r\n\x05round\x18\x02 \x01(\x05\x12\x16\n\x0eround_duration\x18\x03 \x01(\x02":\n\x05\x45vent\x12\x0c\n\x08REJECTED\x10\x00\x12\x0e\n\nREGISTERED\x10\x01\x12\x08\n\x04OPEN\x10\x02\x12\t\n\x05\x43LOSE\x10\x03"\x81\x01\n\x15PrepareMessageRequest\x12\x0f\n\x07message\x18\x01 \x01(\t\x12\x18\n\x10recipient_pubkey\x18\x02 \x01(\x0c\x12\x16\n\x0erecipient_addr\x18\x03 \x01(\t\x12\x12\n\nrequest_id\x18\x04 \x01(\x04\x12\x11\n\tclient_id\x18\x05 \x01(\t"Z\n\x16PrepareMessageResponse\x12\x0e\n\x06status\x18\x01 \x01(\x08\x12\x12\n\nrequest_id\x18\x02 \x01(\x04\x12\r\n\x05round\x18\x03 \x01(\x05\x12\r\n\x05\x65rror\x18\x04 \x01(\t".\n\x19\x43lientPollMessagesRequest\x12\x11\n\tclient_id\x18\x01 \x01(\t".\n\x1a\x43lientPollMessagesResponse\x12\x10\n\x08messages\x18\x01 \x03(\t"\xa8\x01\n\x13StartProfileRequest\x12.\n\x04mode\x18\x01 \x01(\x0e\x32 .mixnet.StartProfileRequest.Mode\x12\x0f\n\x07seconds\x18\x02 \x01(\x02\x12\x0e\n\x06rounds\x18\x03 \x01(\x05\x12\x17\n\x0fsample_interval\x18\x04 \x01(\x02"\'\n\x04Mode\x12\x0c\n\x08SAMPLING\x10\x00\x12\x11\n\rDETERMINISTIC\x10\x01"\x14\n\x12StopProfileRequest">\n\x0fProfileResponse\x12\x0e\n\x06status\x18\x01 \x01(\x08\x12\x0c\n\x04path\x18\x02 \x01(\t\x12\r\n\x05\x65rror\x18\x03 \x01(\t"\x12\n\x10GetStatusRequest"=\n\x0bQueueStatus\x12\r\n\x05round\x18\x01 \x01(\x05\x12\x10\n\x08messages\x18\x02 \x01(\x05\x12\r\n\x05\x62ytes\x18\x03 \x01(\x03"A\n\rMailboxStatus\x12\x0f\n\x07\x61\x64\x64ress\x18\x01 \x01(\t\x12\x10\n\x08messages\x18\x02 \x01(\x05\x12\r\n\x05\x62ytes\x18\x03 \x01(\x03"\x98\x01\n\nPeerStatus\x12\x0f\n\x07\x61\x64\x64ress\x18\x01 \x01(\t\x12\x10\n\x08\x66orwards\x18\x02 \x01(\x03\x12\x10\n\x08\x66\x61ilures\x18\x03 \x01(\x03\x12\x14\n\x0clast_latency\x18\x04 \x01(\x02\x12\x14\n\x0cmean_latency\x18\x05 \x01(\x02\x12\x13\n\x0bmax_latency\x18\x06 \x01(\x02\x12\x14\n\x0c\x63ircuit_open\x18\x07 \x01(\x08"\xab\x03\n\x0eStatusResponse\x12\x0f\n\x07node_id\x18\x01 \x01(\t\x12\x0f\n\x07running\x18\x02 \x01(\x08\x12\r\n\x05round\x18\x03 \x01(\x05\x12\x13\n\x0b\x63lock_round\x18\x04 \x01(\x05\x12\x12\n\nregistered\x18\x05 \x01(\x05\x12\x10\n\x08\x65xpected\x18\x06 \x01(\x05\x12#\n\x06queues\x18\x07 \x03(\x0b\x32\x13.mixnet.QueueStatus\x12(\n\tmailboxes\x18\x08 \x03(\x0b\x32\x15.mixnet.MailboxStatus\x12\x12\n\nbytes_held\x18\t \x01(\x03\x12!\n\x05peers\x18\n \x03(\x0b\x32\x12.mixnet.PeerStatus\x12\x19\n\x11outputs_in_flight\x18\x0b \x01(\x05\x12\x19\n\x11oldest_output_age\x18\x0c \x01(\x02\x12\x17\n\x0f\x64ropped_dummies\x18\r \x01(\x03\x12\x17\n\x0f\x66\x61iled_forwards\x18\x0e \x01(\x03\x12\x12\n\nduplicates\x18\x0f \x01(\x03\x12\x10\n\x08sessions\x18\x10 \x01(\x05\x12\x19\n\x11pending_fragments\x18\x11 \x01(\x05\x32\xc2\x03\n\tMixServer\x12O\n\x0e\x46orwardMessage\x12\x1d.mixnet.ForwardMessageRequest\x1a\x1e.mixnet.ForwardMessageResponse\x12Q\n\x0f\x46orwardMessages\x12\x1e.mixnet.ForwardMessagesRequest\x1a\x1e.mixnet.ForwardMessageResponse\x12I\n\x0cPollMessages\x12\x1b.mixnet.PollMessagesRequest\x1a\x1c.mixnet.PollMessagesResponse\x12=\n\x08Register\x12\x17.mixnet.RegisterRequest\x1a\x18.mixnet.RegisterResponse\x12I\n\x0cWaitForStart\x12\x1b.mixnet.WaitForStartRequest\x1a\x1c.mixnet.WaitForStartResponse\x12<\n\nRoundClock\x12\x19.mixnet.RoundClockRequest\x1a\x11.mixnet.RoundTick0\x01\x32\x86\x02\n\x06\x43lient\x12O\n\x0ePrepareMessage\x12\x1d.mixnet.PrepareMessageRequest\x1a\x1e.mixnet.PrepareMessageResponse\x12T\n\x0fPrepareMessages\x12\x1d.mixnet.PrepareMessageRequest\x1a\x1e.mixnet.PrepareMessageResponse(\x01\x30\x01\x12U\n\x0cPollMessages\x12!.mixnet.ClientPollMessagesRequest\x1a".mixnet.ClientPollMessagesResponse2\xd0\x01\n\x05\x41\x64min\x12\x44\n\x0cStartProfile\x12\x1b.mixnet.StartProfileRequest\x1a\x17.mixnet.ProfileResponse\x12\x42\n\x0bStopProfile\x12\x1a.mixnet.StopProfileRequest\x1a\x17.mixnet.ProfileResponse\x12=\n\tGetStatus\x12\x18.mixnet.GetStatusRequest\x1a\x16.mixnet.StatusResponseb\x06proto3'
 )
 
 _globals = globals()
@@ -30,30 +30,58 @@ if not _descriptor._USE_C_DESCRIPTORS:
     DESCRIPTOR._loaded_options = None
     _globals["_FORWARDMESSAGEREQUEST"]._serialized_start = 24
     _globals["_FORWARDMESSAGEREQUEST"]._serialized_end = 79
-    _globals["_FORWARDMESSAGERESPONSE"]._serialized_start = 81
-    _globals["_FORWARDMESSAGERESPONSE"]._serialized_end = 121
-    _globals["_POLLMESSAGESREQUEST"]._serialized_start = 123
-    _globals["_POLLMESSAGESREQUEST"]._serialized_end = 165
-    _globals["_POLLMESSAGESRESPONSE"]._serialized_start = 167
-    _globals["_POLLMESSAGESRESPONSE"]._serialized_end = 207
-    _globals["_REGISTERREQUEST"]._serialized_start = 209
-    _globals["_REGISTERREQUEST"]._serialized_end = 245
-    _globals["_REGISTERRESPONSE"]._serialized_start = 247
-    _globals["_REGISTERRESPONSE"]._serialized_end = 281
-    _globals["_WAITFORSTARTREQUEST"]._serialized_start = 283
-    _globals["_WAITFORSTARTREQUEST"]._serialized_end = 323
-    _globals["_WAITFORSTARTRESPONSE"]._serialized_start = 325
-    _globals["_WAITFORSTARTRESPONSE"]._serialized_end = 386
-    _globals["_PREPAREMESSAGEREQUEST"]._serialized_start = 388
-    _globals["_PREPAREMESSAGEREQUEST"]._serialized_end = 478
-    _globals["_PREPAREMESSAGERESPONSE"]._serialized_start = 480
-    _globals["_PREPAREMESSAGERESPONSE"]._serialized_end = 520
-    _globals["_CLIENTPOLLMESSAGESREQUEST"]._serialized_start = 522
-    _globals["_CLIENTPOLLMESSAGESREQUEST"]._serialized_end = 549
-    _globals["_CLIENTPOLLMESSAGESRESPONSE"]._serialized_start = 551
-    _globals["_CLIENTPOLLMESSAGESRESPONSE"]._serialized_end = 597
-    _globals["_MIXSERVER"]._serialized_start = 600
-    _globals["_MIXSERVER"]._serialized_end = 905
-    _globals["_CLIENT"]._serialized_start = 908
-    _globals["_CLIENT"]._serialized_end = 1084
+    _globals["_FORWARDMESSAGESREQUEST"]._serialized_start = 81
+    _globals["_FORWARDMESSAGESREQUEST"]._serialized_end = 138
+    _globals["_FORWARDMESSAGERESPONSE"]._serialized_start = 140
+    _globals["_FORWARDMESSAGERESPONSE"]._serialized_end = 180
+    _globals["_POLLMESSAGESREQUEST"]._serialized_start = 182
+    _globals["_POLLMESSAGESREQUEST"]._serialized_end = 224
+    _globals["_POLLMESSAGESRESPONSE"]._serialized_start = 226
+    _globals["_POLLMESSAGESRESPONSE"]._serialized_end = 266
+    _globals["_REGISTERREQUEST"]._serialized_start = 268
+    _globals["_REGISTERREQUEST"]._serialized_end = 304
+    _globals["_REGISTERRESPONSE"]._serialized_start = 306
+    _globals["_REGISTERRESPONSE"]._serialized_end = 340
+    _globals["_WAITFORSTARTREQUEST"]._serialized_start = 342
+    _globals["_WAITFORSTARTREQUEST"]._serialized_end = 382
+    _globals["_WAITFORSTARTRESPONSE"]._serialized_start = 384
+    _globals["_WAITFORSTARTRESPONSE"]._serialized_end = 445
+    _globals["_ROUNDCLOCKREQUEST"]._serialized_start = 447
+    _globals["_ROUNDCLOCKREQUEST"]._serialized_end = 486
+    _globals["_ROUNDTICK"]._serialized_start = 489
+    _globals["_ROUNDTICK"]._serialized_end = 639
+    _globals["_ROUNDTICK_EVENT"]._serialized_start = 581
+    _globals["_ROUNDTICK_EVENT"]._serialized_end = 639
+    _globals["_PREPAREMESSAGEREQUEST"]._serialized_start = 642
+    _globals["_PREPAREMESSAGEREQUEST"]._serialized_end = 771
+    _globals["_PREPAREMESSAGERESPONSE"]._serialized_start = 773
+    _globals["_PREPAREMESSAGERESPONSE"]._serialized_end = 863
+    _globals["_CLIENTPOLLMESSAGESREQUEST"]._serialized_start = 865
+    _globals["_CLIENTPOLLMESSAGESREQUEST"]._serialized_end = 911
+    _globals["_CLIENTPOLLMESSAGESRESPONSE"]._serialized_start = 913
+    _globals["_CLIENTPOLLMESSAGESRESPONSE"]._serialized_end = 959
+    _globals["_STARTPROFILEREQUEST"]._serialized_start = 962
+    _globals["_STARTPROFILEREQUEST"]._serialized_end = 1130
+    _globals["_STARTPROFILEREQUEST_MODE"]._serialized_start = 1091
+    _globals["_STARTPROFILEREQUEST_MODE"]._serialized_end = 1130
+    _globals["_STOPPROFILEREQUEST"]._serialized_start = 1132
+    _globals["_STOPPROFILEREQUEST"]._serialized_end = 1152
+    _globals["_PROFILERESPONSE"]._serialized_start = 1154
+    _globals["_PROFILERESPONSE"]._serialized_end = 1216
+    _globals["_GETSTATUSREQUEST"]._serialized_start = 1218
+    _globals["_GETSTATUSREQUEST"]._serialized_end = 1236
+    _globals["_QUEUESTATUS"]._serialized_start = 1238
+    _globals["_QUEUESTATUS"]._serialized_end = 1299
+    _globals["_MAILBOXSTATUS"]._serialized_start = 1301
+    _globals["_MAILBOXSTATUS"]._serialized_end = 1366
+    _globals["_PEERSTATUS"]._serialized_start = 1369
+    _globals["_PEERSTATUS"]._serialized_end = 1521
+    _globals["_STATUSRESPONSE"]._serialized_start = 1524
+    _globals["_STATUSRESPONSE"]._serialized_end = 1951
+    _globals["_MIXSERVER"]._serialized_start = 1954
+    _globals["_MIXSERVER"]._serialized_end = 2404
+    _globals["_CLIENT"]._serialized_start = 2407
+    _globals["_CLIENT"]._serialized_end = 2669
+    _globals["_ADMIN"]._serialized_start = 2672
+    _globals["_ADMIN"]._serialized_end = 2880
 # @@protoc_insertion_point(module_scope)
@@ -43,6 +43,12 @@ class MixServerStub(object):
             response_deserializer=mixnet__pb2.ForwardMessageResponse.FromString,
             _registered_method=True,
         )
+        self.ForwardMessages = channel.unary_unary(
+            "/mixnet.MixServer/ForwardMessages",
+            request_serializer=mixnet__pb2.ForwardMessagesRequest.SerializeToString,
+            response_deserializer=mixnet__pb2.ForwardMessageResponse.FromString,
+            _registered_method=True,
+        )
         self.PollMessages = channel.unary_unary(
             "/mixnet.MixServer/PollMessages",
             request_serializer=mixnet__pb2.PollMessagesRequest.SerializeToString,
@@ -61,6 +67,12 @@ class MixServerStub(object):
             response_deserializer=mixnet__pb2.WaitForStartResponse.FromString,
             _registered_method=True,
         )
+        self.RoundClock = channel.unary_stream(
+            "/mixnet.MixServer/RoundClock",
+            request_serializer=mixnet__pb2.RoundClockRequest.SerializeToString,
+            response_deserializer=mixnet__pb2.RoundTick.FromString,
+            _registered_method=True,
+        )
 
 
 class MixServerServicer(object):
@@ -72,6 +84,12 @@ class MixServerServicer(object):
         context.set_details("Method not implemented!")
         raise NotImplementedError("Method not implemented!")
 
+    def ForwardMessages(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
     def PollMessages(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -90,6 +108,14 @@ class MixServerServicer(object):
         context.set_details("Method not implemented!")
         raise NotImplementedError("Method not implemented!")
 
+    def RoundClock(self, request, context):
+        """Registers clients and streams the round boundaries to them, replacing
+        Register and WaitForStart
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
 
 def add_MixServerServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -98,6 +124,11 @@ def add_MixServerServicer_to_server(servicer, server):
             request_deserializer=mixnet__pb2.ForwardMessageRequest.FromString,
             response_serializer=mixnet__pb2.ForwardMessageResponse.SerializeToString,
         ),
+        "ForwardMessages": grpc.unary_unary_rpc_method_handler(
+            servicer.ForwardMessages,
+            request_deserializer=mixnet__pb2.ForwardMessagesRequest.FromString,
+            response_serializer=mixnet__pb2.ForwardMessageResponse.SerializeToString,
+        ),
         "PollMessages": grpc.unary_unary_rpc_method_handler(
             servicer.PollMessages,
             request_deserializer=mixnet__pb2.PollMessagesRequest.FromString,
@@ -113,6 +144,11 @@ def add_MixServerServicer_to_server(servicer, server):
             request_deserializer=mixnet__pb2.WaitForStartRequest.FromString,
             response_serializer=mixnet__pb2.WaitForStartResponse.SerializeToString,
         ),
+        "RoundClock": grpc.unary_stream_rpc_method_handler(
+            servicer.RoundClock,
+            request_deserializer=mixnet__pb2.RoundClockRequest.FromString,
+            response_serializer=mixnet__pb2.RoundTick.SerializeToString,
+        ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
         "mixnet.MixServer", rpc_method_handlers
@@ -155,6 +191,36 @@ class MixServer(object):
             _registered_method=True,
         )
 
+    @staticmethod
+    def ForwardMessages(
+        request,
+        target,
+        options=(),
+        channel_credentials=None,
+        call_credentials=None,
+        insecure=False,
+        compression=None,
+        wait_for_ready=None,
+        timeout=None,
+        metadata=None,
+    ):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            "/mixnet.MixServer/ForwardMessages",
+            mixnet__pb2.ForwardMessagesRequest.SerializeToString,
+            mixnet__pb2.ForwardMessageResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True,
+        )
+
     @staticmethod
     def PollMessages(
         request,
@@ -245,6 +311,36 @@ class MixServer(object):
             _registered_method=True,
         )
 
+    @staticmethod
+    def RoundClock(
+        request,
+        target,
+        options=(),
+        channel_credentials=None,
+        call_credentials=None,
+        insecure=False,
+        compression=None,
+        wait_for_ready=None,
+        timeout=None,
+        metadata=None,
+    ):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            "/mixnet.MixServer/RoundClock",
+            mixnet__pb2.RoundClockRequest.SerializeToString,
+            mixnet__pb2.RoundTick.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True,
+        )
+
 
 class ClientStub(object):
     """Missing associated documentation comment in .proto file."""
@@ -261,6 +357,12 @@ class ClientStub(object):
             response_deserializer=mixnet__pb2.PrepareMessageResponse.FromString,
             _registered_method=True,
         )
+        self.PrepareMessages = channel.stream_stream(
+            "/mixnet.Client/PrepareMessages",
+            request_serializer=mixnet__pb2.PrepareMessageRequest.SerializeToString,
+            response_deserializer=mixnet__pb2.PrepareMessageResponse.FromString,
+            _registered_method=True,
+        )
         self.PollMessages = channel.unary_unary(
             "/mixnet.Client/PollMessages",
             request_serializer=mixnet__pb2.ClientPollMessagesRequest.SerializeToString,
@@ -278,6 +380,12 @@ class ClientServicer(object):
         context.set_details("Method not implemented!")
         raise NotImplementedError("Method not implemented!")
 
+    def PrepareMessages(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
     def PollMessages(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -292,6 +400,11 @@ def add_ClientServicer_to_server(servicer, server):
             request_deserializer=mixnet__pb2.PrepareMessageRequest.FromString,
             response_serializer=mixnet__pb2.PrepareMessageResponse.SerializeToString,
         ),
+        "PrepareMessages": grpc.stream_stream_rpc_method_handler(
+            servicer.PrepareMessages,
+            request_deserializer=mixnet__pb2.PrepareMessageRequest.FromString,
+            response_serializer=mixnet__pb2.PrepareMessageResponse.SerializeToString,
+        ),
         "PollMessages": grpc.unary_unary_rpc_method_handler(
             servicer.PollMessages,
             request_deserializer=mixnet__pb2.ClientPollMessagesRequest.FromString,
@@ -339,6 +452,36 @@ class Client(object):
             _registered_method=True,
         )
 
+    @staticmethod
+    def PrepareMessages(
+        request_iterator,
+        target,
+        options=(),
+        channel_credentials=None,
+        call_credentials=None,
+        insecure=False,
+        compression=None,
+        wait_for_ready=None,
+        timeout=None,
+        metadata=None,
+    ):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            "/mixnet.Client/PrepareMessages",
+            mixnet__pb2.PrepareMessageRequest.SerializeToString,
+            mixnet__pb2.PrepareMessageResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True,
+        )
+
     @staticmethod
     def PollMessages(
         request,
@@ -368,3 +511,176 @@ class Client(object):
             metadata,
             _registered_method=True,
         )
+
+
+class AdminStub(object):
+    """Operations on a running node, served by mix servers, clients and client hosts"""
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.StartProfile = channel.unary_unary(
+            "/mixnet.Admin/StartProfile",
+            request_serializer=mixnet__pb2.StartProfileRequest.SerializeToString,
+            response_deserializer=mixnet__pb2.ProfileResponse.FromString,
+            _registered_method=True,
+        )
+        self.StopProfile = channel.unary_unary(
+            "/mixnet.Admin/StopProfile",
+            request_serializer=mixnet__pb2.StopProfileRequest.SerializeToString,
+            response_deserializer=mixnet__pb2.ProfileResponse.FromString,
+            _registered_method=True,
+        )
+        self.GetStatus = channel.unary_unary(
+            "/mixnet.Admin/GetStatus",
+            request_serializer=mixnet__pb2.GetStatusRequest.SerializeToString,
+            response_deserializer=mixnet__pb2.StatusResponse.FromString,
+            _registered_method=True,
+        )
+
+
+class AdminServicer(object):
+    """Operations on a running node, served by mix servers, clients and client hosts"""
+
+    def StartProfile(self, request, context):
+        """Profiles the node until `seconds` passed or `rounds` ended (or StopProfile is
+        called, if neither is set), then returns the path of the profile
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
+    def StopProfile(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
+    def GetStatus(self, request, context):
+        """A snapshot of the node's round progress, queues and peers"""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
+
+def add_AdminServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+        "StartProfile": grpc.unary_unary_rpc_method_handler(
+            servicer.StartProfile,
+            request_deserializer=mixnet__pb2.StartProfileRequest.FromString,
+            response_serializer=mixnet__pb2.ProfileResponse.SerializeToString,
+        ),
+        "StopProfile": grpc.unary_unary_rpc_method_handler(
+            servicer.StopProfile,
+            request_deserializer=mixnet__pb2.StopProfileRequest.FromString,
+            response_serializer=mixnet__pb2.ProfileResponse.SerializeToString,
+        ),
+        "GetStatus": grpc.unary_unary_rpc_method_handler(
+            servicer.GetStatus,
+            request_deserializer=mixnet__pb2.GetStatusRequest.FromString,
+            response_serializer=mixnet__pb2.StatusResponse.SerializeToString,
+        ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+        "mixnet.Admin", rpc_method_handlers
+    )
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers("mixnet.Admin", rpc_method_handlers)
+
+
+# This class is part of an EXPERIMENTAL API.
+class Admin(object):
+    """Operations on a running node, served by mix servers, clients and client hosts"""
+
+    @staticmethod
+    def StartProfile(
+        request,
+        target,
+        options=(),
+        channel_credentials=None,
+        call_credentials=None,
+        insecure=False,
+        compression=None,
+        wait_for_ready=None,
+        timeout=None,
+        metadata=None,
+    ):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            "/mixnet.Admin/StartProfile",
+            mixnet__pb2.StartProfileRequest.SerializeToString,
+            mixnet__pb2.ProfileResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True,
+        )
+
+    @staticmethod
+    def StopProfile(
+        request,
+        target,
+        options=(),
+        channel_credentials=None,
+        call_credentials=None,
+        insecure=False,
+        compression=None,
+        wait_for_ready=None,
+        timeout=None,
+        metadata=None,
+    ):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            "/mixnet.Admin/StopProfile",
+            mixnet__pb2.StopProfileRequest.SerializeToString,
+            mixnet__pb2.ProfileResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True,
+        )
+
+    @staticmethod
+    def GetStatus(
+        request,
+        target,
+        options=(),
+        channel_credentials=None,
+        call_credentials=None,
+        insecure=False,
+        compression=None,
+        wait_for_ready=None,
+        timeout=None,
+        metadata=None,
+    ):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            "/mixnet.Admin/GetStatus",
+            mixnet__pb2.GetStatusRequest.SerializeToString,
+            mixnet__pb2.StatusResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True,
+        )
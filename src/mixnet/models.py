@@ -1,22 +1,17 @@
-import base64
-from typing import List
+from typing import List, Literal, NamedTuple, Optional, Union
 
-from pydantic import BaseModel, field_serializer, field_validator
+from pydantic import BaseModel
 
 
-class Message(BaseModel):
-    payload: bytes
-    address: str
-
-    @field_validator("payload", mode="before")
-    def decode_base64(cls, v):
-        if isinstance(v, str):
-            return base64.b64decode(v)
-        return v
+class Message(NamedTuple):
+    """A peeled onion layer: the payload to hand to the next hop and its node ID.
+    On the mix servers the payload is a view into the decrypted layer.
+    """
 
-    @field_serializer("payload")
-    def encode_base64(self, v: bytes, _info):
-        return base64.b64encode(v).decode()
+    payload: Union[bytes, memoryview]
+    next_hop: int
+    # Set on the handshake layer of a session (see mixnet.session)
+    opens_session: bool = False
 
 
 class Server(BaseModel):
@@ -27,11 +22,134 @@ class Server(BaseModel):
 class Client(BaseModel):
     id: str
     address: str
+    # The address of the client host serving this client along with others, if any.
+    # The client's own address then only names it in the mixnet and must be unique
+    host: Optional[str] = None
+
+
+class Mixing(BaseModel):
+    """How the mix servers decide when received messages leave them.
+    "threshold" flushes each round once `messages_per_round` messages arrived,
+    "pool" flushes `pool_fraction` of the messages above `pool_min` every `interval`
+    seconds, and "continuous" delays each message by an exponential time with mean
+    `mean_delay` seconds, checked every `tick` seconds.
+    """
+
+    strategy: Literal["threshold", "pool", "continuous"] = "threshold"
+    interval: float = 1
+    pool_min: int = 0
+    pool_fraction: float = 1
+    mean_delay: float = 0.5
+    tick: float = 0.01
+
+
+class GrpcTuning(BaseModel):
+    """Options of every gRPC server and channel of the mixnet. Unset (None) values
+    keep gRPC's defaults.
+    - `max_message_bytes`: largest message sent or received (gRPC receives 4 MB by default)
+    - `initial_window_bytes`: HTTP/2 flow-control window of each stream; setting it turns
+      off gRPC's dynamic window sizing (BDP probing) so that the window stays fixed
+    - `keepalive_time_ms` / `keepalive_timeout_ms`: interval of keepalive pings on idle
+      connections, and how long to wait for their acknowledgement
+    - `compression`: compression of every call, "none", "gzip" or "deflate"
+    - `maximum_concurrent_rpcs`: RPCs a server handles at once before rejecting more
+    """
+
+    max_message_bytes: Optional[int] = 64 * 1024 * 1024
+    initial_window_bytes: Optional[int] = None
+    keepalive_time_ms: Optional[int] = None
+    keepalive_timeout_ms: Optional[int] = None
+    compression: Literal["none", "gzip", "deflate"] = "none"
+    maximum_concurrent_rpcs: Optional[int] = None
+
+
+class Forwarding(BaseModel):
+    """How mix servers forward batches to the next mix server.
+    - `deadline`: seconds a forward call may take before it is abandoned (None waits
+      forever)
+    - `retries`: attempts after a failed or abandoned call, the n-th after a random wait
+      of up to `backoff` * 2**n seconds, capped at `max_backoff`
+    - `hedge_delay`: for forwards to the exit mix, seconds without a response after which
+      an identical call is sent alongside, the first response winning (None disables)
+    - `breaker_failures` / `breaker_reset`: consecutive failed forwards to a peer that
+      open its circuit, failing further forwards at once, and seconds until a trial
+      forward is let through
+    - `replay_window`: seconds a mix server remembers the packets it received, to drop
+      copies that arrive again (from retried or hedged forwards, or replays)
+    Batches that still fail are dropped, so that later rounds are not held up.
+    """
+
+    deadline: Optional[float] = 5
+    retries: int = 2
+    backoff: float = 0.05
+    max_backoff: float = 1
+    hedge_delay: Optional[float] = None
+    breaker_failures: int = 5
+    breaker_reset: float = 10
+    replay_window: float = 60
+
+
+class Fragmentation(BaseModel):
+    """Large messages, whose compressed plaintext is longer than `fragment_bytes`, are
+    split into erasure-coded fragments of that size sent as messages of their own:
+    k fragments for the data and `parity` times as many more (at least one, unless it
+    is 0), any k of which rebuild the message. A message may have up to 255 fragments.
+    """
+
+    fragment_bytes: int = 4096
+    parity: float = 0.5
+
+
+class Diagnostics(BaseModel):
+    """Event-loop stall detection: every node records the lag of its event loop, and
+    samples the stack of the code blocking it when the lag passes `stall_threshold`
+    seconds, into `<dir>/<node id>_loop.json` (`dir` is relative to the config
+    directory). The loop is checked every `interval` seconds.
+    """
+
+    dir: str = "diagnostics"
+    stall_threshold: float = 0.1
+    interval: float = 0.02
+
+
+class EventLoop(BaseModel):
+    """The event loop the nodes run on: `asyncio`'s default loop, `uvloop` (which needs
+    the uvloop package) or `auto`, uvloop if it is installed. With `eager_tasks`, a new
+    task runs up to its first suspension as soon as it is created, which saves a loop
+    iteration for the RPC handlers and callbacks that complete without waiting.
+    """
+
+    loop: Literal["asyncio", "uvloop", "auto"] = "asyncio"
+    eager_tasks: bool = False
 
 
 class Config(BaseModel):
     messages_per_round: int
     round_duration: float = 1
     dummy_payload: str = "dummy"
+    mixing: Mixing = Mixing()
+    # Compression of the innermost plaintext, shared by all the clients. The dictionary
+    # is a file in the config directory, e.g. made by mixnet.compression.train_dictionary
+    compression: Literal["none", "zlib", "zstd"] = "none"
+    compression_dictionary: Optional[str] = None
+    # Opt-in: mark dummies in their final layer so that the exit mix drops them instead
+    # of storing them. The exit mix then learns which of its packets are cover traffic,
+    # and how many messages of a round are real
+    drop_dummies_at_exit: bool = False
+    # Session mode: rounds per epoch, in which the clients agree a key with every mix
+    # server once and seal the following layers with a symmetric AEAD. None seals every
+    # layer with its own ephemeral key pair. Requires threshold mixing
+    session_epoch: Optional[int] = None
+    # Aggregation: clients gather their messages of a round, each sealed for its
+    # recipient, in a bundle of this many bytes that the exit mix fans out. None sends
+    # one message per packet
+    aggregate_bytes: Optional[int] = None
+    # Splitting of large messages into fragments. None sends them as one packet
+    fragmentation: Optional[Fragmentation] = None
+    # Event-loop stall detection. None disables it
+    diagnostics: Optional[Diagnostics] = None
+    event_loop: EventLoop = EventLoop()
+    grpc_tuning: GrpcTuning = GrpcTuning()
+    forwarding: Forwarding = Forwarding()
     mix_servers: List[Server]
     clients: List[Client]
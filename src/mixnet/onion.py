@@ -0,0 +1,240 @@
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Union
+
+from nacl.public import SealedBox
+
+from mixnet.crypto import sealing_box
+from mixnet.models import Message
+from mixnet.routing import AGGREGATE_ID, DROP_ID
+from mixnet.session import ClientSessions, RoundSeals
+
+# A layer is the next hop's node ID (see mixnet.routing) followed by the payload. The
+# ID has a fixed size, so layers are the same size whichever node they are for
+_NEXT_HOP = struct.Struct("<I")
+# The top bit of the next hop flags the handshake layer of a session
+SESSION_FLAG = 1 << 31
+
+
+def encode_layer(
+    ciphertext: bytes, next_hop: int, opens_session: bool = False
+) -> bytes:
+    """Serialize one onion layer: the next hop's node ID and the payload to hand it."""
+    if opens_session:
+        next_hop |= SESSION_FLAG
+    return _NEXT_HOP.pack(next_hop) + ciphertext
+
+
+def decode_layer(plaintext) -> Message:
+    """Split a decrypted layer into the next hop's node ID and a view of its payload.
+    The payload is not copied.
+
+    Raises:
+        ValueError: the layer is too short for a node ID
+    """
+    view = memoryview(plaintext)
+    if len(view) < _NEXT_HOP.size:
+        raise ValueError("Malformed layer: missing next hop")
+    (next_hop,) = _NEXT_HOP.unpack_from(view)
+    return Message(
+        payload=view[_NEXT_HOP.size :],
+        next_hop=next_hop & ~SESSION_FLAG,
+        opens_session=bool(next_hop & SESSION_FLAG),
+    )
+
+
+# A bundle record is the recipient's node ID and the length of the ciphertext for it
+_RECORD = struct.Struct("<II")
+RECORD_BYTES = _RECORD.size
+
+
+class Bundle:
+    """Messages sealed for several recipients that travel in one packet, as the payload
+    of a final layer addressed to the aggregate ID. Records are the recipient's node ID,
+    the ciphertext's length and the ciphertext, and the bundle is zero-padded to a fixed
+    size, so that every packet is the same size however many messages it carries.
+    """
+
+    __slots__ = ("size", "_records", "_used")
+
+    def __init__(self, size: int):
+        self.size = size
+        self._records: List[bytes] = []
+        self._used = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, ciphertext: bytes, recipient_id: int) -> bool:
+        """Adds a message if it fits, returning whether it did."""
+        record_size = RECORD_BYTES + len(ciphertext)
+        if self._used + record_size > self.size:
+            return False
+        self._records.append(_RECORD.pack(recipient_id, len(ciphertext)) + ciphertext)
+        self._used += record_size
+        return True
+
+    def encode(self) -> bytes:
+        return b"".join(self._records) + bytes(self.size - self._used)
+
+
+def add_to_bundles(
+    bundles: Dict[int, Bundle],
+    size: int,
+    round: int,
+    ciphertext: bytes,
+    recipient_id: int,
+) -> int:
+    """Adds a message sealed for its recipient to the bundle of the first round from
+    `round` on with room for it, creating the bundles of `size` bytes as needed.
+
+    Raises:
+        ValueError: the message does not fit in a bundle
+
+    Returns:
+        int: the round of the bundle
+    """
+    if RECORD_BYTES + len(ciphertext) > size:
+        raise ValueError(
+            f"Message of {len(ciphertext)} sealed bytes does not fit in a bundle"
+        )
+    while not bundles.setdefault(round, Bundle(size)).add(ciphertext, recipient_id):
+        round += 1
+    return round
+
+
+def decode_bundle(payload) -> List[Message]:
+    """Splits a bundle into one message per record, whose payloads are views into it.
+    The padding reads as a record for the drop ID with no ciphertext, which ends it.
+
+    Raises:
+        ValueError: a record overruns the bundle
+    """
+    view = memoryview(payload)
+    messages = []
+    offset = 0
+    while offset + RECORD_BYTES <= len(view):
+        recipient_id, length = _RECORD.unpack_from(view, offset)
+        if recipient_id == DROP_ID and length == 0:
+            break
+        offset += RECORD_BYTES
+        if offset + length > len(view):
+            raise ValueError("Malformed bundle: record overruns the bundle")
+        messages.append(Message(view[offset : offset + length], recipient_id))
+        offset += length
+    return messages
+
+
+class Route:
+    """The cascade of mix servers a packet passes through.
+    The sealing boxes of the mix servers are built once and reused for every packet.
+    """
+
+    def __init__(self, mix_pubkeys: List[bytes], mix_ids: List[int]):
+        self.mix_pubkeys = mix_pubkeys
+        self.mix_ids = mix_ids
+        # Innermost mix first, each paired with its position and the node ID it
+        # forwards to
+        boxes = [sealing_box(pubkey) for pubkey in mix_pubkeys]
+        hops = range(len(boxes) - 1, -1, -1)
+        self._layers = list(zip(boxes[::-1], hops, [None] + mix_ids[:0:-1]))
+
+    def open_sessions(self, epoch_rounds: int, start: int) -> ClientSessions:
+        """Starts a client's sessions with the mix servers, from round `start` on."""
+        return ClientSessions(self.mix_pubkeys, epoch_rounds, start)
+
+    def wrap(
+        self,
+        ciphertext: bytes,
+        recipient_id: int,
+        sessions: Optional[Union[ClientSessions, RoundSeals]] = None,
+        round: int = 0,
+    ) -> bytes:
+        """Wrap a ciphertext sealed for the recipient in one layer per mix server.
+
+        Args:
+            ciphertext (bytes): the message encrypted with the recipient's public key
+            recipient_id (int): the node ID of the recipient
+            sessions (Optional[Union[ClientSessions, RoundSeals]]): the sender's sessions,
+                or the seals of the round, in session mode
+            round (int): the round the packet is sent in, which keys session layers
+
+        Returns:
+            bytes: the packet to send to the first mix server
+        """
+        opens_session = sessions is not None and sessions.opens_session(round)
+        for box, hop, next_hop in self._layers:
+            layer = encode_layer(
+                ciphertext,
+                recipient_id if next_hop is None else next_hop,
+                opens_session,
+            )
+            sealed = sessions.seal(hop, layer, round) if sessions else None
+            ciphertext = box.encrypt(layer) if sealed is None else sealed
+        return ciphertext
+
+
+def build_onion(
+    message: bytes,
+    recipient_pubkey: bytes,
+    recipient_id: int,
+    route: Route,
+    sessions: Optional[ClientSessions] = None,
+    round: int = 0,
+) -> bytes:
+    """Encrypt a message with the recipient's public key and wrap it for the route."""
+    ciphertext = sealing_box(recipient_pubkey).encrypt(message)
+    return route.wrap(ciphertext, recipient_id, sessions, round)
+
+
+def build_bundle(
+    bundle: Bundle,
+    route: Route,
+    sessions: Optional[ClientSessions] = None,
+    round: int = 0,
+) -> bytes:
+    """Wrap a bundle of messages already sealed for their recipients for the route."""
+    return route.wrap(bundle.encode(), AGGREGATE_ID, sessions, round)
+
+
+def build_onions(
+    messages: Sequence[bytes],
+    recipient_keys: Sequence[bytes],
+    recipient_ids: Sequence[int],
+    route: Route,
+    max_workers: Optional[int] = None,
+) -> List[bytes]:
+    """Build the packets of many messages at once.
+    Messages are split into contiguous chunks that are built on a thread pool
+    (libsodium releases the GIL), each chunk filling its slots of a preallocated
+    output list. Recipient boxes are built once per distinct key.
+
+    Args:
+        messages (Sequence[bytes]): the messages to send
+        recipient_keys (Sequence[bytes]): the public key of each message's recipient
+        recipient_ids (Sequence[int]): the node ID of each message's recipient
+        route (Route): the mix servers all packets pass through
+        max_workers (Optional[int]): size of the thread pool, defaults to the CPU count
+
+    Returns:
+        List[bytes]: one packet per message, in the order of `messages`
+    """
+    if not len(messages) == len(recipient_keys) == len(recipient_ids):
+        raise ValueError("messages, recipient_keys and recipient_ids must match")
+    onions: List[bytes] = [b""] * len(messages)
+    boxes = {key: sealing_box(key) for key in set(recipient_keys)}
+
+    def build_chunk(start: int):
+        for i in range(start, min(start + chunk, len(messages))):
+            box: SealedBox = boxes[recipient_keys[i]]
+            onions[i] = route.wrap(box.encrypt(messages[i]), recipient_ids[i])
+
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(messages)))
+    chunk = -(-len(messages) // workers)
+    if workers == 1:
+        build_chunk(0)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(build_chunk, range(0, len(messages), chunk)))
+    return onions
@@ -0,0 +1,118 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from mixnet.models import Forwarding
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling a peer whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Fails calls to a peer fast once it keeps failing. After `failures` consecutive
+    failures the circuit opens and calls are refused; `reset_timeout` seconds later a
+    single trial call is let through (half-open), whose success closes the circuit
+    again and whose failure opens it for another `reset_timeout`.
+    """
+
+    def __init__(
+        self,
+        failures: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._max_failures = failures
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now."""
+        if self._opened_at is None:
+            return True
+        if self._trial or self._clock() < self._opened_at + self._reset_timeout:
+            return False
+        self._trial = True
+        return True
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._trial or self._failures >= self._max_failures:
+            self._opened_at = self._clock()
+            self._trial = False
+
+
+async def hedged(call: Callable[[], Awaitable[T]], delay: Optional[float]) -> T:
+    """Awaits `call()`, and if it did not complete within `delay` seconds, also a second
+    `call()`, returning the first successful result and cancelling the other call.
+    The callee must tolerate receiving both calls.
+    """
+    first = asyncio.ensure_future(call())
+    if delay is None:
+        return await first
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tasks.add(asyncio.ensure_future(call()))
+        pending = tasks
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call_with_retries(
+    call: Callable[[], Awaitable[T]],
+    policy: Forwarding,
+    breaker: Optional[CircuitBreaker] = None,
+) -> T:
+    """Awaits `call()` up to `policy.retries` more times while it fails, with jittered
+    exponential backoff in between, reporting each outcome to the breaker.
+
+    Raises:
+        CircuitOpenError: the breaker refused the call
+        Exception: the error of the last attempt
+    """
+    for attempt in range(policy.retries + 1):
+        if breaker and not breaker.allow():
+            raise CircuitOpenError("Circuit open")
+        try:
+            result = await call()
+        except Exception:
+            if breaker:
+                breaker.record_failure()
+            if attempt == policy.retries:
+                raise
+            # Full jitter spreads the retries of mixes that failed at the same time
+            await asyncio.sleep(
+                random.uniform(0, min(policy.max_backoff, policy.backoff * 2**attempt))
+            )
+        else:
+            if breaker:
+                breaker.record_success()
+            return result
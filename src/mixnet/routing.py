@@ -0,0 +1,77 @@
+from typing import Dict, Iterable, List, Optional
+
+from mixnet.models import Config
+
+# Node ID 0 is never assigned: a final layer addressed to it is dropped by the exit mix
+DROP_ID = 0
+# Nor is the largest ID: a final layer addressed to it carries a bundle of messages,
+# which the exit mix fans out to their recipients (see mixnet.onion.Bundle)
+AGGREGATE_ID = (1 << 31) - 1
+
+
+class RoutingTable:
+    """Compact integer IDs for the nodes of a mixnet, so that onion layers carry a
+    fixed-size ID instead of the next hop's address. IDs are assigned in order, the mix
+    servers first and then the clients, so every node building the table from the same
+    config agrees on them. Resolving an ID to its address and telling clients from mix
+    servers are list lookups.
+    Nodes can also be added one by one, for clusters whose ports are only known once
+    they are bound.
+    """
+
+    def __init__(self, mix_addrs: Iterable[str] = (), client_addrs: Iterable[str] = ()):
+        self._addresses: List[Optional[str]] = [None]
+        self._is_client: List[bool] = [False]
+        self._ids: Dict[str, int] = {}
+        # The last mix server of the route, which delivers to the clients
+        self.exit_mix: Optional[int] = None
+        for address in mix_addrs:
+            self.add(address)
+        for address in client_addrs:
+            self.add(address, client=True)
+
+    @classmethod
+    def from_config(cls, config: Config) -> "RoutingTable":
+        return cls(
+            [server.address for server in config.mix_servers],
+            [client.address for client in config.clients],
+        )
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, address: str, client: bool = False) -> int:
+        """Assigns the next ID to a node, returning it.
+
+        Raises:
+            ValueError: the address already has an ID
+        """
+        if address in self._ids:
+            raise ValueError(f"Address '{address}' is already in the routing table")
+        node_id = len(self._addresses)
+        self._addresses.append(address)
+        self._is_client.append(client)
+        self._ids[address] = node_id
+        if not client:
+            self.exit_mix = node_id
+        return node_id
+
+    def node_id(self, address: str) -> int:
+        """Raises:
+        ValueError: the address is not in the routing table
+        """
+        try:
+            return self._ids[address]
+        except KeyError:
+            raise ValueError(f"Unknown address '{address}'") from None
+
+    def address(self, node_id: int) -> str:
+        """Raises:
+        ValueError: no node has this ID
+        """
+        if 0 < node_id < len(self._addresses):
+            return self._addresses[node_id]
+        raise ValueError(f"Unknown node ID {node_id}")
+
+    def is_client(self, node_id: int) -> bool:
+        return 0 < node_id < len(self._is_client) and self._is_client[node_id]
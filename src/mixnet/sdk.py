@@ -0,0 +1,160 @@
+import asyncio
+import itertools
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import grpc
+
+from mixnet.config import load_config
+from mixnet.mixnet_pb2 import (
+    ClientPollMessagesRequest,
+    PrepareMessageRequest,
+    PrepareMessageResponse,
+)
+from mixnet.mixnet_pb2_grpc import ClientStub
+from mixnet.transport import grpc_compression, grpc_options
+
+
+class ClientSession:
+    """A long-lived connection to a client daemon for submitting messages at a high rate.
+    The config is loaded once, recipient public keys are read once and cached, and all
+    messages go over a single PrepareMessages stream on one channel.
+
+    Example:
+        async with ClientSession(config_path, "client_1") as session:
+            acks = await session.prepare_messages([("Hi", "client_2"), ("Yo", "client_3")])
+    """
+
+    def __init__(self, config_path: str, client_id: str):
+        self._config_dir = os.path.dirname(config_path)
+        self._config = load_config(config_path)
+        client = next((c for c in self._config.clients if c.id == client_id), None)
+        if not client:
+            raise ValueError(f"Client with id '{client_id}' not found in config.")
+        self._client_id = client_id
+        # A client served by a client host is reached at the host's address
+        self._addr = client.host or client.address
+        self._recipients: Dict[str, Tuple[bytes, str]] = {}
+        self._request_ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._write_lock = asyncio.Lock()
+        self._channel: Optional[grpc.aio.Channel] = None
+        self._stub: Optional[ClientStub] = None
+        self._stream = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def connect(self):
+        tuning = self._config.grpc_tuning
+        self._channel = grpc.aio.insecure_channel(
+            self._addr,
+            options=grpc_options(tuning),
+            compression=grpc_compression(tuning),
+        )
+        self._stub = ClientStub(self._channel)
+        self._stream = self._stub.PrepareMessages()
+        self._reader = asyncio.create_task(self._read_acks())
+
+    async def close(self):
+        if self._stream and not self._reader.done():
+            await self._stream.done_writing()
+        if self._reader:
+            await self._reader
+        if self._channel:
+            await self._channel.close()
+
+    def recipient(self, recipient_id: str) -> Tuple[bytes, str]:
+        """Returns the public key and address of a recipient, reading its key file on
+        first use only.
+
+        Raises:
+            ValueError: the recipient is not in the config
+            FileNotFoundError: the recipient's public key was not published
+        """
+        if recipient_id not in self._recipients:
+            recipient = next(
+                (c for c in self._config.clients if c.id == recipient_id), None
+            )
+            if not recipient:
+                raise ValueError(
+                    f"Recipient client with id '{recipient_id}' not found in config."
+                )
+            pubkey_path = os.path.join(self._config_dir, f"{recipient_id}.key")
+            with open(pubkey_path, "rb") as f:
+                self._recipients[recipient_id] = (f.read(), recipient.address)
+        return self._recipients[recipient_id]
+
+    def forget_recipient(self, recipient_id: str):
+        """Drops a cached public key, e.g. after the recipient restarted with a new key."""
+        self._recipients.pop(recipient_id, None)
+
+    async def prepare_message(
+        self, message: str, recipient_id: str
+    ) -> PrepareMessageResponse:
+        (ack,) = await self.prepare_messages([(message, recipient_id)])
+        return ack
+
+    async def prepare_messages(
+        self, messages: Sequence[Tuple[str, str]]
+    ) -> List[PrepareMessageResponse]:
+        """Submits a batch of messages over the stream and waits for their acks.
+
+        Args:
+            messages (Sequence[Tuple[str, str]]): (message, recipient ID) pairs
+
+        Raises:
+            ConnectionError: the stream to the client daemon is closed
+
+        Returns:
+            List[PrepareMessageResponse]: the ack of each message, in the same order
+        """
+        if not self._reader or self._reader.done():
+            raise ConnectionError("PrepareMessages stream is not open")
+        loop = asyncio.get_running_loop()
+        futures = []
+        async with self._write_lock:
+            for message, recipient_id in messages:
+                recipient_pubkey, recipient_addr = self.recipient(recipient_id)
+                request_id = next(self._request_ids)
+                future = loop.create_future()
+                self._pending[request_id] = future
+                futures.append(future)
+                await self._stream.write(
+                    PrepareMessageRequest(
+                        message=message,
+                        recipient_pubkey=recipient_pubkey,
+                        recipient_addr=recipient_addr,
+                        request_id=request_id,
+                        client_id=self._client_id,
+                    )
+                )
+        return list(await asyncio.gather(*futures))
+
+    async def poll_messages(self) -> List[str]:
+        response = await self._stub.PollMessages(
+            ClientPollMessagesRequest(client_id=self._client_id)
+        )
+        return list(response.messages)
+
+    async def _read_acks(self):
+        """Resolves the pending futures as acks arrive, and fails the remaining ones
+        once the stream ends.
+        """
+        error: Exception = ConnectionError("PrepareMessages stream closed")
+        try:
+            async for ack in self._stream:
+                future = self._pending.pop(ack.request_id, None)
+                if future and not future.done():
+                    future.set_result(ack)
+        except grpc.aio.AioRpcError as e:
+            error = ConnectionError(f"PrepareMessages stream failed: {e.details()}")
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
@@ -1,76 +1,261 @@
 import asyncio
+import hashlib
 import logging
 import os
 import time
-from typing import Dict, List
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
-import grpc
-
-from mixnet.crypto import decrypt, generate_key_pair
+from mixnet.admin import AdminService, PeerLatency, Profiler, Queues
+from mixnet.crypto import Unsealer, generate_key_pair, load_key_pair, secure_shuffle
+from mixnet.diagnostics import LoopMonitor
+from mixnet.mixing import MixingStrategy, ThresholdMixing
 from mixnet.mixnet_pb2 import (
-    ForwardMessageRequest,
     ForwardMessageResponse,
+    MailboxStatus,
     PollMessagesResponse,
     RegisterResponse,
+    RoundTick,
+    StatusResponse,
     WaitForStartResponse,
 )
-from mixnet.mixnet_pb2_grpc import (
-    MixServerServicer,
-    MixServerStub,
-    add_MixServerServicer_to_server,
-)
-from mixnet.models import Message
+from mixnet.mixnet_pb2_grpc import MixServerServicer
+from mixnet.models import Forwarding, Message
+from mixnet.onion import decode_bundle, decode_layer
+from mixnet.resilience import CircuitBreaker, call_with_retries, hedged
+from mixnet.routing import AGGREGATE_ID, DROP_ID, RoutingTable
+from mixnet.session import TAG_BYTES, MixSessions
+from mixnet.transport import GrpcTransport, Transport
+from mixnet.wal import WriteAheadLog
+from mixnet.wire import ForwardBatch, split_batch
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
 
-class MixServer(MixServerServicer):
+def _digest(payload) -> bytes:
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+class MixServer(MixServerServicer, AdminService):
     def __init__(
         self,
         id: str,
         port: int,
         messages_per_round: int,
-        clients_addrs: List[str],
-        config_dir: str,
-        output_dir: str,
+        routing: RoutingTable,
+        config_dir: Optional[str],
+        output_dir: Optional[str],
         round_duration: float = 1,
         enable_metrics: bool = False,
         metrics: Dict[str, float] = {},
+        wal_dir: Optional[str] = None,
+        mixing: Optional[MixingStrategy] = None,
+        transport: Optional[Transport] = None,
+        forwarding: Optional[Forwarding] = None,
+        session_epoch: Optional[int] = None,
+        monitor: Optional[LoopMonitor] = None,
     ):
         self._logger = logging.getLogger(id)
         self._id = id
         self._messages_per_round = messages_per_round
-        self._clients_addrs = clients_addrs
+        self._routing = routing
         self._output_dir = output_dir
         self._round_duration = round_duration
         self._port = port
         self._enable_metrics = enable_metrics
         self._metrics = metrics
+        # A transport created here is owned, and its pooled channels closed on stop
+        self._owns_transport = transport is None
+        self._transport = transport or GrpcTransport()
         self._server = None
+        self._forwarding = forwarding or Forwarding()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, PeerLatency] = {}
+        self._failed_forwards = 0
+        # When each round output still being sent started, by round
+        self._outputs: Dict[int, float] = {}
+        # Digests of the packets received within the replay window, oldest first
+        self._seen: "OrderedDict[bytes, float]" = OrderedDict()
+        self._duplicates = 0
+        self._mixing = mixing or ThresholdMixing(messages_per_round)
+        self._mixing.bind(self._release)
 
-        self._pubkey_path = os.path.join(config_dir, f"{id}.key")
-        self._privkey_b64, self._pubkey_b64 = generate_key_pair(self._pubkey_path)
-        self._round = 0
-        self._messages: Dict[int, List[Message]] = {}
-        self._cond = asyncio.Condition()
+        # Without a config directory the public key is only handed out in memory
+        self._pubkey_path = (
+            os.path.join(config_dir, f"{id}.key") if config_dir else None
+        )
+        self._wal = None
+        if wal_dir:
+            if not isinstance(self._mixing, ThresholdMixing):
+                raise ValueError("The write-ahead log requires threshold mixing")
+            # The key must survive restarts so that logged packets can be peeled again
+            self._wal = WriteAheadLog(os.path.join(wal_dir, id))
+            self._privkey_b64, self._pubkey_b64 = load_key_pair(
+                os.path.join(wal_dir, f"{id}.priv"), self._pubkey_path
+            )
+        else:
+            self._privkey_b64, self._pubkey_b64 = generate_key_pair(self._pubkey_path)
+        self._unsealer = Unsealer(self._privkey_b64)
+        self._sessions = None
+        if session_epoch:
+            # Session keys are derived from the round numbers, which only threshold
+            # mixing carries along the cascade, and they do not survive restarts
+            if not isinstance(self._mixing, ThresholdMixing) or self._wal:
+                raise ValueError(
+                    "Session mode requires threshold mixing without a write-ahead log"
+                )
+            # Each client opens at most one session per epoch, and a threshold round
+            # takes one packet per client
+            self._sessions = MixSessions(
+                self._unsealer, session_epoch, max_sessions=messages_per_round
+            )
         self._final_messages: Dict[str, List[bytes]] = {}
+        self._dropped_dummies = 0
         self._running = False
         self._registered_clients = set()
         self._start_event = asyncio.Event()
+        # The round the clock has open (-1 before the first), and an event set and
+        # replaced every time it moves on
+        self._clock_round = -1
+        self._clock_changed = asyncio.Event()
+        self._clock_future = None
+        self._delivered = asyncio.Event()
         self._wait_future = None
+        self._monitor = monitor
+        self._profiler = Profiler(id, output_dir)
 
     async def start(self):
-        # Create a gRPC server
-        self._server = grpc.aio.server()
-        add_MixServerServicer_to_server(self, self._server)
-        self._server.add_insecure_port(f"[::]:{self._port}")
+        if self._monitor:
+            self._monitor.start()
+        if self._wal:
+            self._recover()
+        self._server = self._transport.bind(self, self._port)
+        self._port = self._server.port
         self._running = True
         await self._server.start()
-        self._wait_future = asyncio.create_task(self._wait_for_round_messages())
+        self._wait_future = asyncio.create_task(self._mixing.run())
+        self._clock_future = asyncio.create_task(self._run_clock())
         self._logger.info(f"MixServer {self._id} started on port {self._port}")
 
+    @property
+    def port(self) -> int:
+        """The port the server listens on, known once it started."""
+        return self._port
+
+    @property
+    def pubkey(self) -> bytes:
+        return self._pubkey_b64
+
+    def _recover(self):
+        """Rebuilds the registrations, the current round, the pending round messages,
+        the replay window and the undelivered final messages from the write-ahead log.
+        """
+        self._wal.recover()
+        self._mixing.round = self._wal.round
+        self._registered_clients = set(self._wal.registered)
+        if len(self._registered_clients) >= self._messages_per_round:
+            self._start_event.set()
+        self._mixing.messages = {
+            round: [self._peel(payload, round) for payload in payloads]
+            for round, payloads in self._wal.packets.items()
+        }
+        # The recovered packets start a new replay window, so that a retry of a forward
+        # that was durable before the restart is not mixed twice
+        now = time.monotonic()
+        for payloads in self._wal.packets.values():
+            for payload in payloads:
+                self._seen[_digest(payload)] = now
+        self._final_messages = {
+            address: list(payloads) for address, payloads in self._wal.mailbox.items()
+        }
+        if self._wal.round or self._mixing.messages:
+            self._logger.info(
+                f"Resuming at round {self._mixing.round} with "
+                f"{len(self._mixing.messages.get(self._mixing.round, []))}/{self._messages_per_round} messages"
+            )
+
+    def _peel(self, payload, round: int) -> Message:
+        """Decrypts one onion layer into a buffer allocated for it and splits it into
+        the next hop's node ID and a view of the payload, without copying the payload.
+        In session mode, a layer is first looked up by its tag among the round's
+        session layers, and a handshake layer registers its sender's session.
+        """
+        plaintext = (
+            None if self._sessions is None else self._sessions.open(payload, round)
+        )
+        if plaintext is None:
+            plaintext = self._unsealer.unseal(payload)
+        message = decode_layer(plaintext)
+        if message.opens_session and self._sessions is not None:
+            if not self._sessions.register(memoryview(payload)[:TAG_BYTES], round):
+                self._logger.warning(
+                    f"Refused a round {round} handshake: its key was already used, "
+                    "or the epoch has a session for every client"
+                )
+        return message
+
+    def _fresh(self, payloads: list) -> Tuple[list, List[bytes]]:
+        """Filters out the packets already received within the replay window, so that
+        a forward that is retried or hedged, or a replayed packet, is only mixed once.
+        Returns the fresh packets and their digests, which are remembered right away so
+        that a concurrent copy is dropped, and forgotten again if they are not stored.
+        """
+        now = time.monotonic()
+        expired = now - self._forwarding.replay_window
+        while self._seen and next(iter(self._seen.values())) < expired:
+            self._seen.popitem(last=False)
+        fresh = []
+        digests = []
+        for payload in payloads:
+            digest = _digest(payload)
+            if digest in self._seen:
+                continue
+            self._seen[digest] = now
+            fresh.append(payload)
+            digests.append(digest)
+        if len(fresh) < len(payloads):
+            self._duplicates += len(payloads) - len(fresh)
+            self._logger.info(
+                f"Dropped {len(payloads) - len(fresh)} packets received before"
+            )
+        return fresh, digests
+
+    def _forget(self, digests: List[bytes]):
+        """Forgets packets that were not stored, so that a retry of them is accepted."""
+        for digest in digests:
+            self._seen.pop(digest, None)
+
+    async def _receive(self, payloads: list, round: int) -> List[Message]:
+        """Peels and stores the fresh packets of a forward. Each packet is peeled on its
+        own, and the ones that fail to peel are dropped with a warning. The packets are
+        only remembered as received once they are stored.
+
+        Returns:
+            List[Message]: the stored messages
+        """
+        received_time = time.perf_counter_ns()
+        payloads, digests = self._fresh(payloads)
+        stored = []
+        messages = []
+        failed = []
+        for payload, digest in zip(payloads, digests):
+            try:
+                messages.append(self._peel(payload, round))
+            except ValueError as e:
+                self._logger.warning(f"Dropping a round {round} packet: {e}")
+                failed.append(digest)
+                continue
+            stored.append(payload)
+        self._forget(failed)
+        try:
+            await self._store(stored, messages, round, received_time)
+        except BaseException:
+            self._forget(digests)
+            raise
+        return messages
+
     async def Register(self, request, context):
         """A gRPC API method for a client to register with the server.
         Sets start_event when the required number of clients is registered.
@@ -83,19 +268,97 @@ class MixServer(MixServerServicer):
             RegisterResponse: gRPC response indicating registration status
         """
         self._logger.info(f"Client '{request.client_id}' attempting to register.")
-        if len(self._registered_clients) >= self._messages_per_round:
+        return RegisterResponse(status=self._register([request.client_id]))
+
+    def _register(self, client_ids) -> bool:
+        """Registers clients all at once, or none of them if the server has no room
+        for all. Clients that are already registered are accepted again.
+        Sets start_event when the required number of clients is registered.
+        """
+        new_ids = [
+            id for id in dict.fromkeys(client_ids) if id not in self._registered_clients
+        ]
+        if len(self._registered_clients) + len(new_ids) > self._messages_per_round:
             self._logger.warning(
-                f"Registration failed for '{request.client_id}': server full."
+                f"Registration failed for {len(new_ids)} clients: server full."
             )
-            return RegisterResponse(status=False)
-        self._registered_clients.add(request.client_id)
+            return False
+        for client_id in new_ids:
+            self._registered_clients.add(client_id)
+            if self._wal:
+                self._wal.append_register(client_id)
         self._logger.info(
-            f"Client '{request.client_id}' registered. Total: {len(self._registered_clients)}/{self._messages_per_round}"
+            f"{len(new_ids)} clients registered. Total: {len(self._registered_clients)}/{self._messages_per_round}"
         )
-        if len(self._registered_clients) == self._messages_per_round:
+        if (
+            len(self._registered_clients) == self._messages_per_round
+            and not self._start_event.is_set()
+        ):
             self._logger.info("All clients registered. Starting round.")
             self._start_event.set()
-        return RegisterResponse(status=True)
+        return True
+
+    async def RoundClock(self, request, context):
+        """A server-streaming gRPC API method that registers the clients of a roster
+        and then streams the round boundaries to them, over a single stream.
+        Once all the clients are registered the clock opens round 0, and every round
+        duration it closes the open round (the clients then send their packets for it)
+        and opens the next one. A stream that falls behind catches up on every
+        boundary it missed, and a stream opened while rounds run starts at the open
+        round. The stream ends when the server stops.
+
+        Args:
+            request (RoundClockRequest): gRPC request containing the client IDs
+            context (_type_): gRPC context
+
+        Yields:
+            RoundTick: REGISTERED or REJECTED, then the OPEN and CLOSE events
+        """
+        if not self._running or not self._register(request.client_ids):
+            yield RoundTick(event=RoundTick.REJECTED)
+            return
+        yield RoundTick(event=RoundTick.REGISTERED, round_duration=self._round_duration)
+        seen = self._clock_round
+        if seen >= 0:
+            yield RoundTick(event=RoundTick.OPEN, round=seen)
+        while self._running:
+            changed = self._clock_changed
+            if self._clock_round == seen:
+                await changed.wait()
+                continue
+            for round in range(seen + 1, self._clock_round + 1):
+                if round > 0:
+                    yield RoundTick(event=RoundTick.CLOSE, round=round - 1)
+                yield RoundTick(
+                    event=RoundTick.OPEN,
+                    round=round,
+                    round_duration=self._round_duration,
+                )
+                seen = round
+
+    async def _run_clock(self):
+        """Moves the round clock on every round duration once all the clients are
+        registered, on a schedule that does not drift with the loop's delays.
+        A server resuming from the write-ahead log resumes at its current round.
+        """
+        await self._start_event.wait()
+        loop = asyncio.get_running_loop()
+        first_round = (
+            self._mixing.round if isinstance(self._mixing, ThresholdMixing) else 0
+        )
+        start_time = loop.time()
+        round = first_round
+        while self._running:
+            self._advance_clock(round)
+            round += 1
+            await asyncio.sleep(
+                start_time + (round - first_round) * self._round_duration - loop.time()
+            )
+
+    def _advance_clock(self, round: int):
+        self._clock_round = round
+        changed, self._clock_changed = self._clock_changed, asyncio.Event()
+        changed.set()
 
     async def WaitForStart(self, request, context):
         """A gRPC API method for a client to wait for the server to be ready.
@@ -125,93 +388,251 @@ class MixServer(MixServerServicer):
         forwarding them.
 
         Args:
-            request (ForwardMessageRequest): gRPC request containing the encrypted message and round number
+            request (ForwardFrame): gRPC request containing the encrypted message and round number
             context (_type_): gRPC context
 
         Returns:
             ForwardMessageResponse: gRPC response indicating the status of the operation
         """
-        if self._enable_metrics:
-            received_time = time.perf_counter_ns()
         self._logger.info(
             f"Received message from: '{context.peer()}' for round {request.round}"
         )
-        message = decrypt(request.payload, self._privkey_b64)
-        message = Message.model_validate_json(message.decode())
-        async with self._cond:
-            # Store the message
-            if request.round not in self._messages:
-                self._messages[request.round] = []
-                if request.round == 0 and self._enable_metrics:
-                    self._metrics[self._id]["round_start_time"] = received_time
-            self._messages[request.round].append(message)
-            self._logger.debug(
-                f"Stored message for round {request.round}. Count: {len(self._messages[request.round])}/{self._messages_per_round}"
+        messages = await self._receive([request.payload], request.round)
+        if not messages:
+            return ForwardMessageResponse(
+                status=f"Duplicate or corrupt message for round {request.round} dropped"
             )
-            if len(self._messages[request.round]) == self._messages_per_round:
-                self._logger.info(
-                    f"All messages received for round {request.round}. Notifying."
-                )
-                self._cond.notify()
         return ForwardMessageResponse(
-            status=f"Message to '{message.address}' received for round {request.round}"
+            status=f"Message to node {messages[0].next_hop} received for round {request.round}"
+        )
+
+    async def ForwardMessages(self, request, context):
+        """A gRPC API method to receive a batch of a round's messages from the previous
+        mix server, decrypt them, and store them like ForwardMessage does.
+
+        Args:
+            request (ForwardBatch): gRPC request containing the encrypted messages and round number
+            context (_type_): gRPC context
+
+        Returns:
+            ForwardMessageResponse: gRPC response indicating the status of the operation
+        """
+        self._logger.info(
+            f"Received {len(request.payloads)} messages from: '{context.peer()}' for round {request.round}"
+        )
+        messages = await self._receive(request.payloads, request.round)
+        return ForwardMessageResponse(
+            status=f"{len(messages)} messages received for round {request.round}"
         )
 
-    async def _wait_for_round_messages(self):
-        """An asynchronous task that waits for all the round messages to be received.
-        Once notified, it takes the messages from the dictionary and sends them.
+    async def _store(
+        self, payloads: list, messages: List[Message], round: int, received_time: int
+    ):
+        """Logs received messages and hands the peeled ones to the mixing strategy.
+        With a write-ahead log, it returns (and the sender is acknowledged) only once
+        the packets are durable.
+
+        Args:
+            payloads (list): the received (encrypted) payloads, for the write-ahead log
+            messages (List[Message]): the peeled messages
+            round (int): the round the messages belong to
+            received_time (int): when the messages were received, in nanoseconds
         """
-        while self._running:
-            async with self._cond:
-                await self._cond.wait()
-                if not self._running:
-                    break
-                messages = self._messages.pop(self._round)
-                current_round = self._round
-                self._logger.info(
-                    f"Processing round {current_round} with {len(messages)} messages."
-                )
-                self._round += 1
-            await self._send_round_messages(messages, current_round)
+        if self._wal:
+            for payload in payloads:
+                self._wal.append_packet(round, payload)
+            await self._wal.sync()
+        if (
+            round == 0
+            and self._enable_metrics
+            and "round_start_time" not in self._metrics[self._id]
+        ):
+            self._metrics[self._id]["round_start_time"] = received_time
+        await self._mixing.add(messages, round)
+
+    async def _release(self, messages: List[Message], round: int):
+        """Called by the mixing strategy with each batch of messages leaving the server."""
+        self._outputs[round] = time.monotonic()
+        try:
+            if self._wal:
+                # Checkpoint before sending, so that a restart does not deliver the
+                # round's payloads twice
+                await self._wal.release_round(round)
+            await self._send_round_messages(messages, round)
+            if self._wal:
+                self._wal.end_round(round)
+        finally:
+            del self._outputs[round]
+        self._profiler.round_ended()
 
     async def _send_round_messages(self, messages: List[Message], round: int):
-        """If the message is for a registered client, it stores it in the final
-        messages and saves the payload to a file.
-        If the message is for another mix server, it forwards it to that server.
+        """The output stage of a round (or of a batch released by a non-threshold mixing
+        strategy). It runs only once the whole batch is received and decrypted, and
+        permutes the batch with a cryptographic RNG so that the output order does not
+        reveal the arrival order. Bundles are first fanned out into the messages they
+        carry, so those are shuffled too. The permuted messages are grouped by next hop's node ID,
+        which the routing table resolves: messages for clients are stored in the final
+        messages and saved to files, and the messages for each other mix server are
+        forwarded to it as one batch, with all the batches sent concurrently. Dummies
+        whose final layer is addressed to the drop ID are counted and discarded, and
+        messages for unknown IDs, or whose forward failed, are dropped with a warning.
 
         Args:
             messages (List[Message]): messages to be sent in the current round
             round (int): the current round number
         """
+        start_time = time.perf_counter_ns()
+        messages = self._fan_out(messages, round)
+        # Dummies marked for dropping are discarded before anything else, keeping a count
+        count = len(messages)
+        messages = [message for message in messages if message.next_hop != DROP_ID]
+        dropped = count - len(messages)
+        self._dropped_dummies += dropped
+        batches: Dict[int, list] = {}
+        for message in secure_shuffle(messages):
+            batches.setdefault(message.next_hop, []).append(message.payload)
+        shuffle_time = time.perf_counter_ns() - start_time
+
+        forwards = []
+        for node_id, payloads in batches.items():
+            try:
+                address = self._routing.address(node_id)
+            except ValueError:
+                self._logger.warning(
+                    f"Dropping {len(payloads)} round {round} messages for unknown node {node_id}"
+                )
+                continue
+            if self._routing.is_client(node_id):
+                self._deliver(address, payloads, round)
+            else:
+                forwards.append(self._forward_batch(node_id, address, payloads, round))
+        failed = sum(await asyncio.gather(*forwards))
+
+        output_time = time.perf_counter_ns() - start_time
+        self._logger.info(
+            f"Round {round} output: {len(messages)} messages to {len(batches)} hops, "
+            f"{dropped} dummies dropped, {failed} failed to forward, "
+            f"shuffle {shuffle_time / 1_000_000:.2f} ms, total {output_time / 1_000_000:.2f} ms"
+        )
+        if self._enable_metrics:
+            self._metrics[self._id].setdefault("shuffle_times", []).append(shuffle_time)
+            self._metrics[self._id].setdefault("output_times", []).append(output_time)
+            self._metrics[self._id].setdefault("dropped_dummies", []).append(dropped)
+            self._metrics[self._id].setdefault("failed_forwards", []).append(failed)
+
+    def _fan_out(self, messages: List[Message], round: int) -> List[Message]:
+        """Replaces the bundles among a round's messages by the messages they carry,
+        which are then shuffled with the others. A malformed bundle is dropped.
+        """
+        if not any(message.next_hop == AGGREGATE_ID for message in messages):
+            return messages
+        fanned_out = []
         for message in messages:
-            if message.address in self._clients_addrs:
-                self._logger.info(
-                    f"Received message for address {message.address} to poll"
+            if message.next_hop != AGGREGATE_ID:
+                fanned_out.append(message)
+                continue
+            try:
+                fanned_out.extend(decode_bundle(message.payload))
+            except ValueError as e:
+                self._logger.warning(f"Dropping a round {round} bundle: {e}")
+        return fanned_out
+
+    def _deliver(self, address: str, payloads: list, round: int):
+        """Stores a round's payloads for a registered client to poll, and saves them to files.
+        Payloads a round released before a restart had already delivered are skipped.
+        """
+        self._logger.info(
+            f"Received {len(payloads)} messages for address {address} to poll"
+        )
+        if address not in self._final_messages:
+            self._final_messages[address] = []
+        for payload in payloads:
+            payload = bytes(payload)
+            if self._wal:
+                if self._wal.was_delivered(round, address, payload):
+                    continue
+                self._wal.append_deliver(address, payload, round)
+            self._final_messages[address].append(payload)
+            if self._enable_metrics:
+                round_end_time = time.perf_counter_ns()
+                if round == 0:
+                    self._metrics[self._id]["round_end_time"] = round_end_time
+            if not self._output_dir:
+                continue
+            output_file = os.path.join(
+                self._output_dir,
+                f"{self._id}_round_{round}_{address.replace(':', '_')}.txt",
+            )
+            with open(output_file, "wb") as f:
+                f.write(payload)
+        self._delivered.set()
+
+    async def wait_for_delivery(self, address: str):
+        """Waits until messages for `address` are stored for it to poll."""
+        while not self._final_messages.get(address):
+            self._delivered.clear()
+            await self._delivered.wait()
+
+    async def _forward_batch(
+        self, node_id: int, address: str, payloads: list, round: int
+    ) -> int:
+        """Forwards a round's payloads for a mix server, split into as few ForwardMessages
+        requests as the message size limit allows, sent concurrently. Each request is
+        bounded by the forwarding deadline and retried, and requests to the exit mix are
+        hedged when enabled. The peer's circuit breaker fails requests fast while it
+        keeps failing. Requests that still fail are dropped.
+
+        Returns:
+            int: the number of payloads that could not be forwarded
+        """
+        self._logger.info(
+            f"Forwarding {len(payloads)} round {round} messages to server at '{address}'"
+        )
+        policy = self._forwarding
+        hedge_delay = policy.hedge_delay if node_id == self._routing.exit_mix else None
+        breaker = self._breakers.get(address)
+        if breaker is None:
+            breaker = self._breakers[address] = CircuitBreaker(
+                policy.breaker_failures, policy.breaker_reset
+            )
+        latency = self._latencies.get(address)
+        if latency is None:
+            latency = self._latencies[address] = PeerLatency()
+
+        async def forward(chunk: list) -> int:
+            request = ForwardBatch(chunk, round)
+
+            def attempt():
+                return hedged(
+                    lambda: self._transport.call(
+                        address, "ForwardMessages", request, timeout=policy.deadline
+                    ),
+                    hedge_delay,
                 )
-                if message.address not in self._final_messages:
-                    self._final_messages[message.address] = []
-                self._final_messages[message.address].append(message.payload)
-                if self._enable_metrics:
-                    round_end_time = time.perf_counter_ns()
-                    if round == 0:
-                        self._metrics[self._id]["round_end_time"] = round_end_time
-                output_file = os.path.join(
-                    self._output_dir,
-                    f"{self._id}_round_{round}_{message.address.replace(':', '_')}.txt",
+
+            started = time.monotonic()
+            try:
+                response = await call_with_retries(attempt, policy, breaker)
+            except Exception as e:
+                latency.record(time.monotonic() - started, failed=True)
+                self._logger.warning(
+                    f"Dropping {len(chunk)} round {round} messages for '{address}': {e!r}"
                 )
-                with open(output_file, "wb") as f:
-                    f.write(message.payload)
-            else:
-                self._logger.info(
-                    f"Forwarding round {round} message to server at '{message.address}'"
+                return len(chunk)
+            latency.record(time.monotonic() - started)
+            self._logger.debug(f"Forwarded to {address}, response: {response.status}")
+            return 0
+
+        failed = sum(
+            await asyncio.gather(
+                *(
+                    forward(chunk)
+                    for chunk in split_batch(payloads, self._transport.max_batch_bytes)
                 )
-                async with grpc.aio.insecure_channel(message.address) as channel:
-                    stub = MixServerStub(channel)
-                    req = ForwardMessageRequest(payload=message.payload, round=round)
-                    response = await stub.ForwardMessage(req)
-                    self._logger.debug(
-                        f"Forwarded to {message.address}, response: {response.status}"
-                    )
+            )
+        )
+        self._failed_forwards += failed
+        return failed
 
     async def PollMessages(self, request, context):
         """A gRPC API method for a client to pol messages.
@@ -226,20 +647,76 @@ class MixServer(MixServerServicer):
         client_address = request.client_addr
         self._logger.info(f"Client '{client_address}' polling for messages.")
         payloads = self._final_messages.pop(client_address, [])
+        if self._wal and payloads:
+            self._wal.append_poll(client_address)
+            # The payloads' deliveries must not be replayed once the client has them
+            await self._wal.sync()
         self._logger.debug(
             f"Returned {len(payloads)} messages to client '{client_address}'."
         )
         return PollMessagesResponse(payloads=payloads)
 
+    def status(self) -> StatusResponse:
+        """A snapshot of the rounds, the messages held in the mix and in the mailboxes,
+        the forwards to each peer and the registrations.
+        """
+        queues = Queues()
+        for round, messages in self._mixing.held().items():
+            queues.add(
+                round, len(messages), sum(len(message.payload) for message in messages)
+            )
+        mailboxes = [
+            MailboxStatus(
+                address=address,
+                messages=len(payloads),
+                bytes=sum(len(payload) for payload in payloads),
+            )
+            for address, payloads in self._final_messages.items()
+            if payloads
+        ]
+        now = time.monotonic()
+        return StatusResponse(
+            node_id=self._id,
+            running=self._running,
+            round=self._mixing.round
+            if isinstance(self._mixing, ThresholdMixing)
+            else max(0, self._clock_round),
+            clock_round=self._clock_round,
+            registered=len(self._registered_clients),
+            expected=self._messages_per_round,
+            queues=queues.status(),
+            mailboxes=mailboxes,
+            bytes_held=queues.bytes + sum(mailbox.bytes for mailbox in mailboxes),
+            peers=[
+                latency.status(address, self._breakers[address].is_open)
+                for address, latency in self._latencies.items()
+            ],
+            outputs_in_flight=len(self._outputs),
+            oldest_output_age=now - min(self._outputs.values(), default=now),
+            dropped_dummies=self._dropped_dummies,
+            failed_forwards=self._failed_forwards,
+            duplicates=self._duplicates,
+            sessions=0 if self._sessions is None else len(self._sessions),
+        )
+
     async def stop(self):
         self._logger.info("Stopping server")
         self._running = False
-        async with self._cond:
-            self._cond.notify()  # Wake up forwarding thread to check running flag
+        # Wake the clock streams so that they end
+        self._clock_changed.set()
+        if self._clock_future:
+            self._clock_future.cancel()
+        await self._mixing.stop()
         if self._wait_future:
             await self._wait_future
         if self._server:
             await self._server.stop(grace=5.0)
-        if os.path.exists(self._pubkey_path):
+        if self._owns_transport:
+            await self._transport.close()
+        if self._wal:
+            self._wal.close()
+        if self._pubkey_path and os.path.exists(self._pubkey_path):
             os.remove(self._pubkey_path)
+        if self._monitor:
+            await self._monitor.stop()
         self._logger.info("server stopped")
@@ -0,0 +1,306 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from nacl.bindings import (
+    crypto_aead_chacha20poly1305_ietf_ABYTES,
+    crypto_aead_chacha20poly1305_ietf_encrypt,
+    crypto_box_afternm,
+    crypto_box_beforenm,
+)
+from nacl.encoding import Base64Encoder
+from nacl.public import PrivateKey, PublicKey
+
+from mixnet.crypto import Unsealer, aead_open_into
+
+# A session layer starts with its round's tag, by which the mix server finds the key.
+# With the AEAD's MAC it is as long as a sealed box's ephemeral key and MAC, so session
+# layers are the size of sealed layers
+TAG_BYTES = 32
+# Every round key encrypts a single layer, so the nonce is fixed
+_NONCE = bytes(12)
+
+
+def _kdf(key: bytes, person: bytes, size: int = 32) -> bytes:
+    return hashlib.blake2b(key=key, digest_size=size, person=person).digest()
+
+
+def epoch_of(round: int, epoch_rounds: int) -> int:
+    return round // epoch_rounds
+
+
+class Ratchet:
+    """The round keys of one epoch of a session, from the round after the handshake
+    on. They come from a hash chain over the epoch's shared secret: every round steps
+    the chain, and the round's tag and key are derived from its chain key. Forgetting
+    the chain keys of past rounds keeps their layers from being opened later, and since
+    the tags of the rounds are unrelated, the layers of one session cannot be linked
+    from one round to the next without the chain.
+    """
+
+    __slots__ = ("_first", "_chain")
+
+    def __init__(self, secret: bytes, first_round: int):
+        self._first = first_round
+        self._chain: List[Optional[bytes]] = [_kdf(secret, b"mixnet-chain")]
+
+    @property
+    def first_round(self) -> int:
+        return self._first
+
+    def keys(self, round: int) -> Tuple[bytes, bytes]:
+        """The tag and the key of a round.
+
+        Raises:
+            ValueError: the round is before the ratchet, or was forgotten
+        """
+        index = round - self._first
+        if index < 0:
+            raise ValueError(f"Round {round} is before the session")
+        while len(self._chain) <= index:
+            self._chain.append(_kdf(self._chain[-1], b"mixnet-chain"))
+        chain_key = self._chain[index]
+        if chain_key is None:
+            raise ValueError(f"The key of round {round} was forgotten")
+        digest = _kdf(chain_key, b"mixnet-round", 2 * TAG_BYTES)
+        return digest[:TAG_BYTES], digest[TAG_BYTES:]
+
+    def forget(self, round: int):
+        """Erases the chain keys of the rounds before `round`, but the latest one."""
+        for index in range(min(round - self._first, len(self._chain) - 1)):
+            self._chain[index] = None
+
+
+def seal_layer(layer: bytes, tag: bytes, key: bytes) -> bytes:
+    return tag + crypto_aead_chacha20poly1305_ietf_encrypt(layer, tag, _NONCE, key)
+
+
+def open_layer(packet, key: bytes) -> bytearray:
+    """Decrypts a session layer into a buffer allocated for it, like `Unsealer.unseal`.
+
+    Raises:
+        ValueError: the layer is corrupted
+    """
+    view = memoryview(packet)
+    tag = view[:TAG_BYTES].tobytes()
+    ciphertext = view[TAG_BYTES:]
+    if len(ciphertext) < crypto_aead_chacha20poly1305_ietf_ABYTES:
+        raise ValueError("Decryption failed. Invalid layer size.")
+    out = bytearray(len(ciphertext) - crypto_aead_chacha20poly1305_ietf_ABYTES)
+    if not aead_open_into(out, ciphertext, tag, _NONCE, key):
+        raise ValueError("Decryption failed. Invalid key or corrupted layer.")
+    return out
+
+
+class _Handshake:
+    """A client's epoch with one mix server: the ephemeral key pair of the epoch, the
+    key agreed with the mix server and the ratchet of the rounds after the handshake.
+    """
+
+    __slots__ = ("round", "epk", "nonce", "box_key", "ratchet")
+
+    def __init__(self, mix_pk: bytes, round: int):
+        esk = PrivateKey.generate()
+        self.round = round
+        self.epk = bytes(esk.public_key)
+        # The nonce of a sealed box, so that the mix server opens the handshake as one
+        self.nonce = hashlib.blake2b(self.epk + mix_pk, digest_size=24).digest()
+        self.box_key = crypto_box_beforenm(mix_pk, bytes(esk))
+        self.ratchet = Ratchet(self.box_key, round + 1)
+
+
+class ClientSessions:
+    """A client's sessions with the mix servers of its route, in session mode.
+    Rounds are grouped in epochs of `epoch_rounds` rounds. The first layer a client
+    sends a mix server in an epoch is a handshake: a sealed box under a fresh ephemeral
+    key pair, flagged so that the mix server keeps the key they agree on. The layers of
+    the following rounds of the epoch are sealed with a symmetric AEAD under the round's
+    key from the ratchet, so that a client does one X25519 multiplication per mix server
+    and epoch instead of one per layer, and so does the mix server.
+    """
+
+    def __init__(self, mix_pubkeys: List[bytes], epoch_rounds: int, start: int):
+        self._mix_pks = [
+            bytes(PublicKey(pubkey, encoder=Base64Encoder)) for pubkey in mix_pubkeys
+        ]
+        self._epoch_rounds = epoch_rounds
+        self._start = start
+        self._epochs: Dict[int, List[_Handshake]] = {}
+
+    def _handshakes(self, round: int) -> Optional[List[_Handshake]]:
+        if round < self._start:
+            return None
+        epoch = epoch_of(round, self._epoch_rounds)
+        handshakes = self._epochs.get(epoch)
+        if handshakes is None:
+            first = max(self._start, epoch * self._epoch_rounds)
+            handshakes = self._epochs[epoch] = [
+                _Handshake(mix_pk, first) for mix_pk in self._mix_pks
+            ]
+        return handshakes
+
+    def seal(self, hop: int, layer: bytes, round: int) -> Optional[bytes]:
+        """Seals the layer of the `hop`-th mix server of the route for a round, or
+        returns None for a round before the sessions started.
+        """
+        handshakes = self._handshakes(round)
+        if handshakes is None:
+            return None
+        handshake = handshakes[hop]
+        if round == handshake.round:
+            return handshake.epk + crypto_box_afternm(
+                layer, handshake.nonce, handshake.box_key
+            )
+        return seal_layer(layer, *handshake.ratchet.keys(round))
+
+    def opens_session(self, round: int) -> bool:
+        """Whether the layers of a round are handshakes."""
+        handshakes = self._handshakes(round)
+        return handshakes is not None and handshakes[0].round == round
+
+    def round_seals(self, round: int) -> Optional["RoundSeals"]:
+        """The keys of a round's layers, for them to be sealed away from the sessions,
+        or None for a round before the sessions started.
+        """
+        handshakes = self._handshakes(round)
+        if handshakes is None:
+            return None
+        if handshakes[0].round == round:
+            return RoundSeals(
+                round,
+                True,
+                [
+                    (handshake.epk, handshake.nonce, handshake.box_key)
+                    for handshake in handshakes
+                ],
+            )
+        return RoundSeals(
+            round, False, [handshake.ratchet.keys(round) for handshake in handshakes]
+        )
+
+    def forget(self, round: int):
+        """Drops the epochs that ended before `round`."""
+        epoch = epoch_of(round, self._epoch_rounds)
+        for past in [past for past in self._epochs if past < epoch]:
+            del self._epochs[past]
+
+
+class RoundSeals:
+    """The keys a client seals one round's layers with, one per mix server of the
+    route, as `ClientSessions.round_seals` takes them. They hold no session state, so
+    the layers can be sealed on a worker thread while the event loop moves the sessions
+    on. Like `ClientSessions`, they are passed to `Route.wrap`.
+    """
+
+    __slots__ = ("_round", "_opens_session", "_keys")
+
+    def __init__(self, round: int, opens_session: bool, keys: List[Tuple[bytes, ...]]):
+        self._round = round
+        self._opens_session = opens_session
+        self._keys = keys
+
+    def opens_session(self, round: int) -> bool:
+        return self._opens_session and round == self._round
+
+    def seal(self, hop: int, layer: bytes, round: int) -> bytes:
+        """Seals the layer of the `hop`-th mix server of the route.
+
+        Raises:
+            ValueError: the seals are for another round
+        """
+        if round != self._round:
+            raise ValueError(f"The seals are for round {self._round}, not {round}")
+        if self._opens_session:
+            epk, nonce, box_key = self._keys[hop]
+            return epk + crypto_box_afternm(layer, nonce, box_key)
+        return seal_layer(layer, *self._keys[hop])
+
+
+class MixSessions:
+    """A mix server's side of the sessions. A flagged handshake registers the key
+    agreed with its sender, and the tags of the following rounds of the epoch are
+    looked up in a table built once per round, which maps them to the round keys.
+    A round key opens a single layer, and the tables of the last `rounds_kept` rounds
+    are kept for the packets that come late. An epoch keeps at most `max_sessions`
+    sessions, one per ephemeral key, so that replayed or forged handshakes cannot grow
+    the sessions and the tables without bound.
+    """
+
+    def __init__(
+        self,
+        unsealer: Unsealer,
+        epoch_rounds: int,
+        max_sessions: int,
+        rounds_kept: int = 4,
+    ):
+        self._unsealer = unsealer
+        self._epoch_rounds = epoch_rounds
+        self._max_sessions = max_sessions
+        self._rounds_kept = rounds_kept
+        # The ratchets of each epoch, by the ephemeral key of their handshake
+        self._ratchets: Dict[int, Dict[bytes, Ratchet]] = {}
+        self._tables: "OrderedDict[int, Dict[bytes, bytes]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return sum(len(ratchets) for ratchets in self._ratchets.values())
+
+    def register(self, epk, round: int) -> bool:
+        """Keeps the key agreed by a handshake received for `round`. Returns False if
+        the handshake is refused, because its key already opened a session of the
+        epoch or the epoch has `max_sessions` sessions.
+        """
+        if epoch_of(round + 1, self._epoch_rounds) != epoch_of(
+            round, self._epoch_rounds
+        ):
+            # The epoch ends with the handshake's round
+            return True
+        epk = bytes(epk)
+        ratchets = self._ratchets.setdefault(epoch_of(round, self._epoch_rounds), {})
+        if epk in ratchets or len(ratchets) >= self._max_sessions:
+            return False
+        ratchet = ratchets[epk] = Ratchet(self._unsealer.shared_key(epk), round + 1)
+        # Tables of later rounds may already be built, if the handshake came late
+        for table_round, table in self._tables.items():
+            if table_round > round and epoch_of(
+                table_round, self._epoch_rounds
+            ) == epoch_of(round, self._epoch_rounds):
+                tag, key = ratchet.keys(table_round)
+                table[tag] = key
+        return True
+
+    def _table(self, round: int) -> Dict[bytes, bytes]:
+        table = self._tables.get(round)
+        if table is not None:
+            return table
+        epoch = epoch_of(round, self._epoch_rounds)
+        for past in [past for past in self._ratchets if past < epoch]:
+            del self._ratchets[past]
+        table = {}
+        for ratchet in self._ratchets.get(epoch, {}).values():
+            if round < ratchet.first_round:
+                continue
+            try:
+                tag, key = ratchet.keys(round)
+            except ValueError:
+                # A round older than the kept tables
+                continue
+            table[tag] = key
+            ratchet.forget(round + 1)
+        self._tables[round] = table
+        while len(self._tables) > self._rounds_kept:
+            self._tables.popitem(last=False)
+        return table
+
+    def open(self, packet, round: int) -> Optional[bytearray]:
+        """Opens a session layer of a round, or returns None if the packet does not
+        start with a tag of the round, for it to be unsealed instead.
+
+        Raises:
+            ValueError: the layer is corrupted
+        """
+        if len(packet) < TAG_BYTES:
+            return None
+        key = self._table(round).pop(bytes(memoryview(packet)[:TAG_BYTES]), None)
+        if key is None:
+            return None
+        return open_layer(packet, key)
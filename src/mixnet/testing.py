@@ -0,0 +1,331 @@
+import asyncio
+import math
+import os
+import random
+from typing import Dict, List, Optional
+
+import yaml
+
+from mixnet.client import Client
+from mixnet.compression import Compressor
+from mixnet.host import ClientHost
+from mixnet.mixing import make_mixing
+from mixnet.mixnet_pb2 import ForwardMessageResponse
+from mixnet.mixnet_pb2_grpc import MixServerServicer
+from mixnet.models import Client as ClientConfig
+from mixnet.models import Config, Forwarding, Fragmentation, Mixing, Server
+from mixnet.routing import RoutingTable
+from mixnet.server import MixServer
+from mixnet.transport import GrpcTransport, Listener, Transport
+
+
+class Cluster:
+    """A whole mixnet (mix servers and clients) running in the current event loop, for
+    tests and benchmarks. Every node listens on an OS-assigned port, so several clusters
+    can run at once, and public keys are handed out in memory unless `config_dir` is
+    given, in which case the config and the key files are written there as for the CLI.
+    Readiness is awaited instead of slept for: `start` returns once all the clients are
+    registered and the first round started, and `receive` returns as soon as the last
+    mix server delivers. With an InMemoryTransport the nodes call each other directly
+    instead of over gRPC (the clients then cannot be reached by the SDK or the CLI).
+    With `client_host` all the clients are identities of a single ClientHost instead of
+    separate Client nodes.
+
+    Example:
+        async with Cluster(num_clients=2) as cluster:
+            await cluster.send("client_1", "Hi", "client_2")
+            assert await cluster.receive("client_2") == ["Hi"]
+    """
+
+    def __init__(
+        self,
+        num_clients: int = 2,
+        num_servers: int = 3,
+        round_duration: float = 0.02,
+        dummy_payload: str = "dummy",
+        mixing: Optional[Mixing] = None,
+        config_dir: Optional[str] = None,
+        output_dir: Optional[str] = None,
+        enable_metrics: bool = False,
+        host: str = "localhost",
+        transport: Optional[Transport] = None,
+        compressor: Optional[Compressor] = None,
+        drop_dummies_at_exit: bool = False,
+        forwarding: Optional[Forwarding] = None,
+        client_host: bool = False,
+        session_epoch: Optional[int] = None,
+        aggregate_bytes: Optional[int] = None,
+        fragmentation: Optional[Fragmentation] = None,
+    ):
+        self._num_clients = num_clients
+        self._num_servers = num_servers
+        self._round_duration = round_duration
+        self._dummy_payload = dummy_payload
+        self._mixing = mixing or Mixing()
+        self._config_dir = config_dir
+        self._output_dir = output_dir
+        self._enable_metrics = enable_metrics
+        self._host = host
+        self._transport = transport
+        self._compressor = compressor or Compressor()
+        self._drop_dummies_at_exit = drop_dummies_at_exit
+        self._forwarding = forwarding or Forwarding()
+        self._client_host = client_host
+        self._session_epoch = session_epoch
+        self._aggregate_bytes = aggregate_bytes
+        self._fragmentation = fragmentation
+        self.metrics: Dict[str, dict] = {}
+        self.servers: List[MixServer] = []
+        self.clients: Dict[str, Client] = {}
+        self.host: Optional[ClientHost] = None
+        self._addresses: Dict[str, str] = {}
+        self._pubkeys: Dict[str, bytes] = {}
+        self.config: Optional[Config] = None
+        self.routing = RoutingTable()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    @property
+    def config_path(self) -> str:
+        return os.path.join(self._config_dir, "config.yaml")
+
+    async def start(self):
+        # The nodes share the routing table, and each node is added to it once its
+        # port is bound: the mix servers first, in route order, then the clients
+        for i in range(self._num_servers):
+            id = f"server_{i + 1}"
+            self.metrics[id] = {}
+            self.servers.append(
+                MixServer(
+                    id,
+                    0,
+                    self._num_clients,
+                    self.routing,
+                    config_dir=self._config_dir,
+                    output_dir=self._output_dir,
+                    round_duration=self._round_duration,
+                    enable_metrics=self._enable_metrics,
+                    metrics=self.metrics,
+                    mixing=make_mixing(self._mixing, self._num_clients),
+                    transport=self._transport,
+                    forwarding=self._forwarding,
+                    session_epoch=self._session_epoch,
+                )
+            )
+        await asyncio.gather(*(server.start() for server in self.servers))
+        mix_addrs = [f"{self._host}:{server.port}" for server in self.servers]
+        for address in mix_addrs:
+            self.routing.add(address)
+        mix_pubkeys = [server.pubkey for server in self.servers]
+
+        if self._client_host:
+            self._start_host(mix_pubkeys, mix_addrs)
+        for i in range(0 if self._client_host else self._num_clients):
+            id = f"client_{i + 1}"
+            self.metrics[id] = {}
+            client = Client(
+                id,
+                f"{self._host}:0",
+                0,
+                config_dir=self._config_dir,
+                mix_pubkeys=mix_pubkeys,
+                mix_addrs=mix_addrs,
+                routing=self.routing,
+                dummy_payload=self._dummy_payload,
+                enable_metrics=self._enable_metrics,
+                metrics=self.metrics,
+                transport=self._transport,
+                compressor=self._compressor,
+                drop_dummies_at_exit=self._drop_dummies_at_exit,
+                session_epoch=self._session_epoch,
+                aggregate_bytes=self._aggregate_bytes,
+                fragmentation=self._fragmentation,
+                output_dir=self._output_dir,
+            )
+            client.bind()
+            self.routing.add(client.address, client=True)
+            self.clients[id] = client
+            self._addresses[id] = client.address
+            self._pubkeys[id] = client.pubkey
+
+        self.config = Config(
+            messages_per_round=self._num_clients,
+            round_duration=self._round_duration,
+            dummy_payload=self._dummy_payload,
+            mixing=self._mixing,
+            compression=self._compressor.codec,
+            drop_dummies_at_exit=self._drop_dummies_at_exit,
+            forwarding=self._forwarding,
+            session_epoch=self._session_epoch,
+            aggregate_bytes=self._aggregate_bytes,
+            fragmentation=self._fragmentation,
+            mix_servers=[
+                Server(id=f"server_{i + 1}", address=address)
+                for i, address in enumerate(mix_addrs)
+            ],
+            clients=[
+                ClientConfig(
+                    id=id,
+                    address=address,
+                    host=self.host.address if self.host else None,
+                )
+                for id, address in self._addresses.items()
+            ],
+        )
+        if self._config_dir:
+            with open(self.config_path, "w", encoding="utf-8") as f:
+                yaml.safe_dump(self.config.model_dump(), f)
+        if self.host:
+            await self.host.start()
+        await asyncio.gather(*(client.start() for client in self.clients.values()))
+
+    def _start_host(self, mix_pubkeys: List[bytes], mix_addrs: List[str]):
+        """Binds the client host, and adds the clients to it, each named by an address
+        under the host's.
+        """
+        self.host = ClientHost(
+            f"{self._host}:0",
+            0,
+            self._config_dir,
+            mix_pubkeys,
+            mix_addrs,
+            self.routing,
+            dummy_payload=self._dummy_payload,
+            transport=self._transport,
+            compressor=self._compressor,
+            drop_dummies_at_exit=self._drop_dummies_at_exit,
+            output_dir=self._output_dir,
+            session_epoch=self._session_epoch,
+            aggregate_bytes=self._aggregate_bytes,
+            fragmentation=self._fragmentation,
+        )
+        self.host.bind()
+        for i in range(self._num_clients):
+            id = f"client_{i + 1}"
+            address = f"{id}@{self.host.address}"
+            self.routing.add(address, client=True)
+            self._addresses[id] = address
+            self._pubkeys[id] = self.host.add(id, address)
+
+    @property
+    def client_ids(self) -> List[str]:
+        return list(self._addresses)
+
+    def address(self, client_id: str) -> str:
+        return self._addresses[client_id]
+
+    def pubkey(self, client_id: str) -> bytes:
+        return self._pubkeys[client_id]
+
+    async def stop(self):
+        """Stops the clients, then the servers one after the other along the route, so
+        that no server stops while the previous one still forwards to it.
+        """
+        await asyncio.gather(*(client.stop() for client in self.clients.values()))
+        if self.host:
+            await self.host.stop()
+        for server in self.servers:
+            await server.stop()
+
+    async def send(self, sender_id: str, message: str, recipient_id: str) -> int:
+        """Prepares a message on the sender, returning the round it will be sent in."""
+        recipient_pubkey = self._pubkeys[recipient_id]
+        recipient_addr = self._addresses[recipient_id]
+        if self.host:
+            return await self.host.prepare_message(
+                sender_id, message, recipient_pubkey, recipient_addr
+            )
+        return await self.clients[sender_id]._prepare_message(
+            message, recipient_pubkey, recipient_addr
+        )
+
+    async def receive(
+        self, client_id: str, count: int = 1, timeout: float = 5
+    ) -> List[str]:
+        """Waits for the last mix server to deliver `count` messages (not counting
+        dummies) to a client, and returns them.
+
+        Raises:
+            TimeoutError: fewer messages arrived within `timeout` seconds
+        """
+        last = self.servers[-1]
+        last_addr = f"{self._host}:{last.port}"
+        messages: List[str] = []
+        async with asyncio.timeout(timeout):
+            while len(messages) < count:
+                await last.wait_for_delivery(self._addresses[client_id])
+                if self.host:
+                    polled = await self.host.poll_messages(client_id, last_addr)
+                else:
+                    polled = await self.clients[client_id]._poll_messages(last_addr)
+                messages.extend(polled)
+        return messages
+
+
+class StandInServer(MixServerServicer):
+    """A stand-in for a mix server that accepts forwards and misbehaves on demand, to
+    test how the mix server before it copes with a faulty peer. Every forward call
+    waits `delay` seconds; the first `stall_first` calls, and others with probability
+    `stall_rate`, then stall for `stall_time` seconds (forever by default); the first
+    `fail_first` calls, and others with probability `failure_rate`, fail. The payloads
+    of the calls that succeed are kept in `received`, in arrival order.
+    """
+
+    def __init__(
+        self,
+        transport: Optional[Transport] = None,
+        delay: float = 0,
+        stall_rate: float = 0,
+        stall_first: int = 0,
+        stall_time: float = math.inf,
+        failure_rate: float = 0,
+        fail_first: int = 0,
+        seed: Optional[int] = None,
+    ):
+        self._transport = transport or GrpcTransport()
+        self._delay = delay
+        self._stall_rate = stall_rate
+        self._stall_first = stall_first
+        self._stall_time = stall_time
+        self._failure_rate = failure_rate
+        self._fail_first = fail_first
+        self._rng = random.Random(seed)
+        self._listener: Optional[Listener] = None
+        self.calls = 0
+        self.received: List[bytes] = []
+
+    @property
+    def port(self) -> int:
+        return self._listener.port
+
+    async def start(self):
+        self._listener = self._transport.bind(self, 0)
+        await self._listener.start()
+
+    async def stop(self):
+        await self._listener.stop(grace=0)
+
+    async def _misbehave(self):
+        self.calls += 1
+        await asyncio.sleep(self._delay)
+        if self.calls <= self._stall_first or self._rng.random() < self._stall_rate:
+            if math.isinf(self._stall_time):
+                await asyncio.Event().wait()
+            await asyncio.sleep(self._stall_time)
+        if self.calls <= self._fail_first or self._rng.random() < self._failure_rate:
+            raise ConnectionError("Injected failure")
+
+    async def ForwardMessage(self, request, context):
+        await self._misbehave()
+        self.received.append(bytes(request.payload))
+        return ForwardMessageResponse(status="Received")
+
+    async def ForwardMessages(self, request, context):
+        await self._misbehave()
+        self.received.extend(bytes(payload) for payload in request.payloads)
+        return ForwardMessageResponse(status="Received")
@@ -0,0 +1,195 @@
+import asyncio
+from array import array
+from typing import Any, Callable, List, Optional
+
+_SLOT_BITS = 8
+_SLOTS = 1 << _SLOT_BITS
+_SLOT_MASK = _SLOTS - 1
+
+
+class _Slot:
+    """The items of one slot, with their expiry ticks packed in an array next to them.
+    Slots of the first level expire all their items at once, so they skip the array.
+    """
+
+    __slots__ = ("items", "expiries")
+
+    def __init__(self, with_expiries: bool):
+        self.items: List[Any] = []
+        self.expiries: Optional[array] = array("Q") if with_expiries else None
+
+
+class TimerWheel:
+    """A hierarchical timer wheel with `levels` levels of 256 slots each, covering
+    delays of up to 256**levels ticks. An item is placed on the lowest level whose
+    slots span the part of its expiry tick that differs from the current tick, and
+    cascades one level down when the wheel reaches its slot, so inserting and expiring
+    are O(1) per item (amortized over at most `levels` cascades).
+    Advancing the wheel by one tick returns every item expiring at that tick.
+    """
+
+    def __init__(self, levels: int = 4):
+        self._levels = [
+            [_Slot(with_expiries=level > 0) for _ in range(_SLOTS)]
+            for level in range(levels)
+        ]
+        self._max_delay = (1 << (_SLOT_BITS * levels)) - 1
+        self._tick = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def tick(self) -> int:
+        return self._tick
+
+    def insert(self, item: Any, delay_ticks: int):
+        """Schedule `item` to expire `delay_ticks` ticks from now (at least one, and
+        at most the span of the wheel).
+        """
+        expiry = self._tick + min(max(1, delay_ticks), self._max_delay)
+        self._place(item, expiry)
+        self._size += 1
+
+    def _place(self, item: Any, expiry: int):
+        # The level is given by the highest bits in which the expiry and the current
+        # tick differ: all the lower bits are resolved by the levels below it.
+        # Items beyond the top level's rotation stay there until their rotation comes
+        level = min(
+            max(0, (expiry ^ self._tick).bit_length() - 1) >> 3, len(self._levels) - 1
+        )
+        slot = self._levels[level][(expiry >> (_SLOT_BITS * level)) & _SLOT_MASK]
+        slot.items.append(item)
+        if level:
+            slot.expiries.append(expiry)
+
+    def advance(self, ticks: int = 1) -> List[Any]:
+        """Move the wheel `ticks` ticks forward and return the items that expired,
+        in expiry order.
+        """
+        expired: List[Any] = []
+        if not self._size:
+            # Nothing can expire or cascade, so the wheel can jump ahead
+            self._tick += ticks
+            return expired
+        for remaining in range(ticks, 0, -1):
+            if not self._size:
+                self._tick += remaining
+                break
+            self._tick += 1
+            self._cascade()
+            slot = self._levels[0][self._tick & _SLOT_MASK]
+            if slot.items:
+                expired.extend(slot.items)
+                self._size -= len(slot.items)
+                slot.items = []
+        return expired
+
+    def _cascade(self):
+        """Moves down the items of the higher-level slots that the wheel just reached."""
+        level = 1
+        while level < len(self._levels) and not self._tick & (
+            (1 << (_SLOT_BITS * level)) - 1
+        ):
+            index = (self._tick >> (_SLOT_BITS * level)) & _SLOT_MASK
+            slot = self._levels[level][index]
+            if slot.items:
+                items, expiries = slot.items, slot.expiries
+                slot.items, slot.expiries = [], array("Q")
+                for item, expiry in zip(items, expiries):
+                    self._place(item, expiry)
+            level += 1
+
+    def items(self) -> List[Any]:
+        """The items waiting in the wheel, in no particular order."""
+        return [item for level in self._levels for slot in level for item in slot.items]
+
+    def clear(self) -> List[Any]:
+        """Removes and returns all the items waiting in the wheel."""
+        items: List[Any] = []
+        for level in self._levels:
+            for slot in level:
+                if slot.items:
+                    items.extend(slot.items)
+                    slot.items = []
+                    if slot.expiries is not None:
+                        slot.expiries = array("Q")
+        self._size = 0
+        return items
+
+
+class TimerScheduler:
+    """Drives a TimerWheel from the asyncio event loop: while the wheel holds items, it
+    advances once every `tick` seconds and hands each tick's expired items to `release`
+    as one batch, together with the tick number. A single loop timer serves all the
+    items, and none is scheduled while the wheel is empty.
+    If the loop falls behind, the missed ticks are caught up in one callback.
+    """
+
+    def __init__(
+        self,
+        tick: float,
+        release: Callable[[List[Any], int], None],
+        levels: int = 4,
+    ):
+        self._tick = tick
+        self._release = release
+        self._wheel = TimerWheel(levels)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        # Loop time of the wheel's tick 0
+        self._origin = 0.0
+
+    def __len__(self) -> int:
+        return len(self._wheel)
+
+    @property
+    def tick(self) -> int:
+        return self._wheel.tick
+
+    def items(self) -> List[Any]:
+        return self._wheel.items()
+
+    def schedule(self, item: Any, delay: float):
+        """Release `item` after `delay` seconds, rounded to the nearest tick."""
+        if self._handle is None:
+            self._start()
+        self._wheel.insert(item, self._elapsed() + int(delay / self._tick + 0.5))
+
+    def _elapsed(self) -> int:
+        """Ticks passed since the wheel's last advance, which an insert must add to its
+        delay to count it from now.
+        """
+        now_tick = int((self._loop.time() - self._origin) / self._tick)
+        return max(0, now_tick - self._wheel.tick)
+
+    def _start(self):
+        self._loop = asyncio.get_running_loop()
+        # The wheel is idle, so realign its tick 0 with the current time
+        self._origin = self._loop.time() - self._wheel.tick * self._tick
+        self._schedule_next()
+
+    def _schedule_next(self):
+        self._handle = self._loop.call_at(
+            self._origin + (self._wheel.tick + 1) * self._tick, self._on_tick
+        )
+
+    def _on_tick(self):
+        ticks = max(
+            1, int((self._loop.time() - self._origin) / self._tick) - self._wheel.tick
+        )
+        expired = self._wheel.advance(ticks)
+        if expired:
+            self._release(expired, self._wheel.tick)
+        if len(self._wheel):
+            self._schedule_next()
+        else:
+            self._handle = None
+
+    def cancel(self) -> List[Any]:
+        """Stops the timer and returns the items still waiting in the wheel."""
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+        return self._wheel.clear()
@@ -0,0 +1,261 @@
+import abc
+import asyncio
+import itertools
+import sys
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+import grpc
+
+from mixnet.mixnet_pb2_grpc import (
+    AdminServicer,
+    AdminStub,
+    ClientServicer,
+    MixServerServicer,
+    MixServerStub,
+    add_AdminServicer_to_server,
+    add_ClientServicer_to_server,
+    add_MixServerServicer_to_server,
+)
+from mixnet.models import GrpcTuning
+from mixnet.wire import (
+    MAX_BATCH_BYTES,
+    add_forward_handler_to_server,
+    forward_message_callable,
+    forward_messages_callable,
+)
+
+_COMPRESSION = {
+    "none": grpc.Compression.NoCompression,
+    "gzip": grpc.Compression.Gzip,
+    "deflate": grpc.Compression.Deflate,
+}
+
+
+def grpc_options(tuning: GrpcTuning) -> List[Tuple[str, int]]:
+    """The gRPC channel arguments of a tuning profile, shared by servers and channels."""
+    options = []
+    if tuning.max_message_bytes is not None:
+        options.append(("grpc.max_send_message_length", tuning.max_message_bytes))
+        options.append(("grpc.max_receive_message_length", tuning.max_message_bytes))
+    if tuning.initial_window_bytes is not None:
+        options.append(("grpc.http2.lookahead_bytes", tuning.initial_window_bytes))
+        options.append(("grpc.http2.bdp_probe", 0))
+    if tuning.keepalive_time_ms is not None:
+        options.append(("grpc.keepalive_time_ms", tuning.keepalive_time_ms))
+        options.append(("grpc.keepalive_permit_without_calls", 1))
+        options.append(("grpc.http2.max_pings_without_data", 0))
+        # Servers must accept pings as often as the peers send them
+        options.append(
+            ("grpc.http2.min_ping_interval_without_data_ms", tuning.keepalive_time_ms)
+        )
+    if tuning.keepalive_timeout_ms is not None:
+        options.append(("grpc.keepalive_timeout_ms", tuning.keepalive_timeout_ms))
+    return options
+
+
+def grpc_compression(tuning: GrpcTuning) -> grpc.Compression:
+    return _COMPRESSION[tuning.compression]
+
+
+class Listener(abc.ABC):
+    """A node's bound endpoint, returned by `Transport.bind`."""
+
+    port: int
+
+    @abc.abstractmethod
+    async def start(self):
+        """Starts serving the bound servicer."""
+
+    @abc.abstractmethod
+    async def stop(self, grace: float):
+        """Stops serving, letting the calls in progress finish for `grace` seconds."""
+
+
+class Transport(abc.ABC):
+    """How mix servers and clients listen and call the mix servers' MixServer methods,
+    and any node's Admin methods.
+    Calls take the method name and the request, and return the response: the forward
+    methods take ForwardFrame/ForwardBatch requests, the others the protobuf requests.
+    """
+
+    # The payload bytes a single ForwardMessages request may carry
+    max_batch_bytes: int = MAX_BATCH_BYTES
+
+    @abc.abstractmethod
+    def bind(self, servicer, port: int) -> Listener:
+        """Binds a MixServer or Client servicer to `port` (0 picks a free port)."""
+
+    @abc.abstractmethod
+    async def call(
+        self, address: str, method: str, request, timeout: Optional[float] = None
+    ):
+        """Calls `method` of the node at `address`, giving up after `timeout` seconds."""
+
+    @abc.abstractmethod
+    def stream(self, address: str, method: str, request) -> AsyncIterator:
+        """Calls the server-streaming `method` of the node at `address`, returning
+        the stream of responses. Cancelling the task that reads it ends the call.
+        """
+
+    async def close(self):
+        """Closes the connections the transport keeps open. Later calls reopen them."""
+
+
+class _GrpcListener(Listener):
+    def __init__(self, server: grpc.aio.Server, port: int):
+        self._server = server
+        self.port = port
+
+    async def start(self):
+        await self._server.start()
+
+    async def stop(self, grace: float):
+        await self._server.stop(grace=grace)
+
+
+class GrpcTransport(Transport):
+    """The network transport: every node is a gRPC server, and calls go over a pool
+    of channels, one per callee address, opened on the first call and reused by the
+    later ones along with their stubs. Servers and channels are configured by the
+    tuning profile.
+    """
+
+    def __init__(self, tuning: Optional[GrpcTuning] = None):
+        self._tuning = tuning or GrpcTuning()
+        self._options = grpc_options(self._tuning)
+        self._compression = grpc_compression(self._tuning)
+        if self._tuning.max_message_bytes is not None:
+            # Leave room for the request's framing
+            self.max_batch_bytes = self._tuning.max_message_bytes - 64 * 1024
+        self._channels: Dict[str, grpc.aio.Channel] = {}
+        self._stubs: Dict[str, Dict[str, Callable]] = {}
+
+    def bind(self, servicer, port: int) -> Listener:
+        server = grpc.aio.server(
+            options=self._options,
+            maximum_concurrent_rpcs=self._tuning.maximum_concurrent_rpcs,
+            compression=self._compression,
+        )
+        if isinstance(servicer, MixServerServicer):
+            add_MixServerServicer_to_server(servicer, server)
+            add_forward_handler_to_server(servicer, server)
+        if isinstance(servicer, ClientServicer):
+            add_ClientServicer_to_server(servicer, server)
+        if isinstance(servicer, AdminServicer):
+            add_AdminServicer_to_server(servicer, server)
+        # Port 0 binds an OS-assigned port
+        return _GrpcListener(server, server.add_insecure_port(f"[::]:{port}"))
+
+    def _stub(self, address: str, method: str) -> Callable:
+        stubs = self._stubs.get(address)
+        if stubs is None:
+            channel = grpc.aio.insecure_channel(
+                address, options=self._options, compression=self._compression
+            )
+            self._channels[address] = channel
+            # The forward methods skip protobuf, the others use the generated stub
+            stubs = self._stubs[address] = {
+                "ForwardMessage": forward_message_callable(channel),
+                "ForwardMessages": forward_messages_callable(channel),
+            }
+        stub = stubs.get(method)
+        if stub is None:
+            channel = self._channels[address]
+            stub_class = (
+                MixServerStub if hasattr(MixServerServicer, method) else AdminStub
+            )
+            stub = stubs[method] = getattr(stub_class(channel), method)
+        return stub
+
+    async def call(
+        self, address: str, method: str, request, timeout: Optional[float] = None
+    ):
+        return await self._stub(address, method)(request, timeout=timeout)
+
+    def stream(self, address: str, method: str, request) -> AsyncIterator:
+        return self._stub(address, method)(request)
+
+    async def close(self):
+        channels = list(self._channels.values())
+        self._channels.clear()
+        self._stubs.clear()
+        for channel in channels:
+            await channel.close()
+
+
+class _InMemoryContext:
+    """The part of the gRPC servicer context that the servicers use."""
+
+    def __init__(self, address: str):
+        self._address = address
+
+    def peer(self) -> str:
+        return f"memory:{self._address}"
+
+
+class _InMemoryListener(Listener):
+    def __init__(self, transport: "InMemoryTransport", port: int):
+        self._transport = transport
+        self.port = port
+
+    async def start(self):
+        pass
+
+    async def stop(self, grace: float):
+        self._transport._nodes.pop(self.port, None)
+
+
+class InMemoryTransport(Transport):
+    """A transport for nodes running in the same event loop: a call awaits the callee's
+    servicer method directly, passing the request and the response by reference, with
+    no serialization or sockets. It isolates the cost of crypto and mixing from the
+    network, and lets single-host simulations run large topologies.
+    Nodes are told apart by port only, so all the nodes of a simulation share one
+    transport, which assigns the ports that are bound as 0.
+    A call's timeout bounds only the caller's wait: the callee's method keeps running
+    in its own task, as a remote handler would, instead of being cancelled midway.
+    """
+
+    # Requests are passed by reference, so batches are never split
+    max_batch_bytes = sys.maxsize
+
+    def __init__(self):
+        self._nodes: Dict[int, object] = {}
+        self._ports = itertools.count(1)
+        # The callee methods still running after their caller timed out
+        self._handlers: Set[asyncio.Task] = set()
+
+    def bind(self, servicer, port: int) -> Listener:
+        if not port:
+            port = next(port for port in self._ports if port not in self._nodes)
+        if port in self._nodes:
+            raise OSError(f"Port {port} is already bound")
+        self._nodes[port] = servicer
+        return _InMemoryListener(self, port)
+
+    async def call(
+        self, address: str, method: str, request, timeout: Optional[float] = None
+    ):
+        servicer = self._nodes.get(int(address.rsplit(":", 1)[1]))
+        if servicer is None:
+            raise ConnectionError(f"No node is listening at {address}")
+        handler = getattr(servicer, method)(request, _InMemoryContext(address))
+        if timeout is None:
+            return await handler
+        task = asyncio.ensure_future(handler)
+        self._handlers.add(task)
+        task.add_done_callback(self._handler_done)
+        async with asyncio.timeout(timeout):
+            return await asyncio.shield(task)
+
+    def _handler_done(self, task: asyncio.Task):
+        self._handlers.discard(task)
+        if not task.cancelled():
+            # Retrieve the exception nobody waits for after a timeout
+            task.exception()
+
+    def stream(self, address: str, method: str, request) -> AsyncIterator:
+        servicer = self._nodes.get(int(address.rsplit(":", 1)[1]))
+        if servicer is None:
+            raise ConnectionError(f"No node is listening at {address}")
+        return getattr(servicer, method)(request, _InMemoryContext(address))
@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import logging
+import os
+import struct
+import zlib
+from typing import BinaryIO, Dict, List, Optional, Set, Tuple
+
+# Record kinds
+PACKET = 1  # encrypted packet received for a round
+ROUND = 2  # round fully processed and forwarded
+DELIVER = 3  # payload stored for a client at the exit mix
+POLL = 4  # client mailbox drained
+REGISTER = 5  # client registered
+RELEASE = 6  # round released: its output is being sent
+DELIVERED = 7  # digest of a payload delivered by a released round, in checkpoints
+
+# kind, crc32 of the body, round, key length, payload length
+_HEADER = struct.Struct("<BIiHI")
+_SEGMENT_SUFFIX = ".wal"
+
+
+def _digest(payload: bytes) -> bytes:
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+class WriteAheadLog:
+    """Append-only log of a mix server's round state, split into numbered segments.
+
+    Every record is written and flushed to the OS as soon as it is appended, so a
+    crashed process loses nothing, and `sync` makes the records durable with one fsync
+    shared by all the callers of a `sync_delay` window (group commit), so that the
+    server acknowledges packets only once they are on disk. The fsync runs in a worker
+    thread, leaving the event loop free to serve other calls. The log mirrors the live
+    state it describes, which lets `recover` rebuild it and lets compaction replace
+    old segments with a checkpoint, deleting them once the checkpoint is durable.
+
+    A round is logged as released, durably, before its output is sent, and as ended
+    once it was sent. A round released but not ended when the server crashed is run
+    again on restart: the payloads it had already delivered are recorded, so that they
+    are not delivered twice, while its forwards are sent again, and dropped by the next
+    mix server as replays if it received them within its replay window.
+    """
+
+    def __init__(self, wal_dir: str, compact_every: int = 8, sync_delay: float = 0.002):
+        self._logger = logging.getLogger(f"wal:{os.path.basename(wal_dir)}")
+        self._dir = wal_dir
+        self._compact_every = compact_every
+        self._sync_delay = sync_delay
+        self._file: Optional[BinaryIO] = None
+        self._segment = 0
+        self._rounds_since_compaction = 0
+        os.makedirs(wal_dir, exist_ok=True)
+
+        self._appended = 0
+        self._synced = 0
+        self._sync_task: Optional[asyncio.Task] = None
+        # The files and segments replaced by a checkpoint that is not yet durable
+        self._retired: List[Tuple[Optional[BinaryIO], List[int]]] = []
+
+        self.round = 0
+        self.packets: Dict[int, List[bytes]] = {}
+        self.mailbox: Dict[str, List[bytes]] = {}
+        self.registered: Set[str] = set()
+        # The (address, payload digest) pairs delivered by the released rounds
+        self.delivered: Dict[int, Set[Tuple[str, bytes]]] = {}
+
+    def recover(self):
+        """Replay all existing segments into memory, then compact them into a fresh
+        segment that is used for appending from now on.
+        """
+        segments = self._segments()
+        for segment in segments:
+            self._replay_segment(segment)
+        if segments:
+            self._segment = segments[-1]
+            self._logger.info(
+                f"Recovered round {self.round} from {len(segments)} segment(s): "
+                f"{sum(map(len, self.packets.values()))} pending packet(s)"
+            )
+        self._compact()
+        self.commit()
+
+    def append_packet(self, round: int, payload: bytes):
+        self.packets.setdefault(round, []).append(payload)
+        self._append(PACKET, round, b"", payload)
+
+    def append_deliver(self, address: str, payload: bytes, round: int):
+        self.mailbox.setdefault(address, []).append(payload)
+        if round in self.delivered:
+            self.delivered[round].add((address, _digest(payload)))
+        self._append(DELIVER, round, address.encode(), payload)
+
+    def was_delivered(self, round: int, address: str, payload: bytes) -> bool:
+        """Whether a released round delivered the payload before a restart."""
+        delivered = self.delivered.get(round)
+        return bool(delivered) and (address, _digest(payload)) in delivered
+
+    def append_poll(self, address: str):
+        self.mailbox.pop(address, None)
+        self._append(POLL, 0, address.encode(), b"")
+
+    def append_register(self, client_id: str):
+        self.registered.add(client_id)
+        self._append(REGISTER, 0, client_id.encode(), b"")
+
+    def commit(self):
+        """Make every record appended so far durable with a single fsync, blocking.
+        Only used outside the event loop's serving: on recovery and on close.
+        """
+        if self._file:
+            os.fsync(self._file.fileno())
+        self._synced = self._appended
+        self._drop_retired()
+
+    async def sync(self):
+        """Waits until every record appended so far is durable. The callers within
+        `sync_delay` of the first one share one fsync, and so do the ones arriving
+        while it runs, which share the next.
+        """
+        appended = self._appended
+        while self._synced < appended:
+            if self._sync_task is None:
+                self._sync_task = asyncio.ensure_future(self._group_commit())
+            await asyncio.shield(self._sync_task)
+
+    async def _group_commit(self):
+        try:
+            await asyncio.sleep(self._sync_delay)
+            appended, retired = self._appended, self._retired
+            self._retired = []
+            await asyncio.to_thread(os.fsync, self._file.fileno())
+            self._synced = max(self._synced, appended)
+            self._retired = retired + self._retired
+            self._drop_retired(len(retired))
+        finally:
+            self._sync_task = None
+
+    def _drop_retired(self, count: Optional[int] = None):
+        """Closes and deletes the files and segments replaced by a durable checkpoint."""
+        count = len(self._retired) if count is None else count
+        for file, segments in self._retired[:count]:
+            if file:
+                file.close()
+            for segment in segments:
+                os.remove(self._segment_path(segment))
+        del self._retired[:count]
+
+    async def release_round(self, round: int):
+        """Durably record that `round` is released, before its output is sent."""
+        self.delivered.setdefault(round, set())
+        self._append(RELEASE, round, b"", b"")
+        await self.sync()
+
+    def end_round(self, round: int):
+        """Record that `round` was fully processed and compact the log periodically."""
+        self.packets.pop(round, None)
+        self.delivered.pop(round, None)
+        self.round = round + 1
+        self._append(ROUND, round, b"", b"")
+        self._rounds_since_compaction += 1
+        if self._rounds_since_compaction >= self._compact_every:
+            self._compact()
+
+    def close(self):
+        if self._file:
+            self.commit()
+            self._file.close()
+            self._file = None
+
+    def _append(self, kind: int, round: int, key: bytes, payload: bytes):
+        self._write(self._file, kind, round, key, payload)
+        self._file.flush()
+        self._appended += 1
+
+    @staticmethod
+    def _write(f: BinaryIO, kind: int, round: int, key: bytes, payload: bytes):
+        crc = zlib.crc32(payload, zlib.crc32(key))
+        f.write(_HEADER.pack(kind, crc, round, len(key), len(payload)))
+        f.write(key)
+        f.write(payload)
+
+    def _compact(self):
+        """Write the current state as a checkpoint into a new segment, which later
+        records are appended to. The older segments are deleted by the next fsync,
+        which makes the checkpoint durable.
+        """
+        retired = {segment for _, segments in self._retired for segment in segments}
+        old_segments = [
+            segment for segment in self._segments() if segment not in retired
+        ]
+        self._segment += 1
+        path = self._segment_path(self._segment)
+        new_file = open(path, "wb")
+        for client_id in self.registered:
+            self._write(new_file, REGISTER, 0, client_id.encode(), b"")
+        if self.round:
+            self._write(new_file, ROUND, self.round - 1, b"", b"")
+        for round, payloads in self.packets.items():
+            for payload in payloads:
+                self._write(new_file, PACKET, round, b"", payload)
+        for address, payloads in self.mailbox.items():
+            for payload in payloads:
+                self._write(new_file, DELIVER, -1, address.encode(), payload)
+        for round, delivered in self.delivered.items():
+            self._write(new_file, RELEASE, round, b"", b"")
+            for address, digest in delivered:
+                self._write(new_file, DELIVERED, round, address.encode(), digest)
+        new_file.flush()
+        self._retired.append((self._file, old_segments))
+        self._file = new_file
+        self._rounds_since_compaction = 0
+        self._logger.debug(
+            f"Compacted {len(old_segments)} segment(s) into segment {self._segment}"
+        )
+
+    def _replay_segment(self, segment: int):
+        with open(self._segment_path(segment), "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            kind, crc, round, key_len, payload_len = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size
+            end = start + key_len + payload_len
+            key = data[start : start + key_len]
+            payload = data[start + key_len : end]
+            if end > len(data) or zlib.crc32(payload, zlib.crc32(key)) != crc:
+                self._logger.warning(
+                    f"Ignoring torn record at offset {offset} of segment {segment}"
+                )
+                return
+            self._apply(kind, round, key.decode(), payload)
+            offset = end
+
+    def _apply(self, kind: int, round: int, key: str, payload: bytes):
+        if kind == PACKET:
+            self.packets.setdefault(round, []).append(payload)
+        elif kind == ROUND:
+            self.packets.pop(round, None)
+            self.delivered.pop(round, None)
+            self.round = max(self.round, round + 1)
+        elif kind == DELIVER:
+            self.mailbox.setdefault(key, []).append(payload)
+            if round in self.delivered:
+                self.delivered[round].add((key, _digest(payload)))
+        elif kind == RELEASE:
+            self.delivered.setdefault(round, set())
+        elif kind == DELIVERED:
+            self.delivered.setdefault(round, set()).add((key, payload))
+        elif kind == POLL:
+            self.mailbox.pop(key, None)
+        elif kind == REGISTER:
+            self.registered.add(key)
+
+    def _segments(self) -> List[int]:
+        return sorted(
+            int(name[: -len(_SEGMENT_SUFFIX)])
+            for name in os.listdir(self._dir)
+            if name.endswith(_SEGMENT_SUFFIX)
+        )
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self._dir, f"{segment:08d}{_SEGMENT_SUFFIX}")
@@ -0,0 +1,185 @@
+from typing import List, NamedTuple, Sequence, Tuple, Union
+
+import grpc
+
+from mixnet.mixnet_pb2 import ForwardMessageResponse
+
+FORWARD_MESSAGE_METHOD = "/mixnet.MixServer/ForwardMessage"
+FORWARD_MESSAGES_METHOD = "/mixnet.MixServer/ForwardMessages"
+
+# Upper bound for the payloads of one ForwardMessages request, below gRPC's default
+# 4 MB message size limit
+MAX_BATCH_BYTES = 4 * 1024 * 1024 - 64 * 1024
+
+# Field tags shared by ForwardMessageRequest and ForwardMessagesRequest:
+# payload(s) = 1 (length-delimited), round = 2 (varint)
+_PAYLOAD_TAG = 0x0A
+_ROUND_TAG = 0x10
+
+
+class ForwardFrame(NamedTuple):
+    """A ForwardMessageRequest whose payload is a view instead of a protobuf copy."""
+
+    payload: Union[bytes, memoryview]
+    round: int
+
+
+class ForwardBatch(NamedTuple):
+    """A ForwardMessagesRequest whose payloads are views instead of protobuf copies."""
+
+    payloads: List[Union[bytes, memoryview]]
+    round: int
+
+
+def _encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _decode_varint(data: memoryview, pos: int):
+    result = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("Truncated varint")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _parse(data: bytes) -> Tuple[List[memoryview], int]:
+    """Parse the payload field(s) and round of a serialized request, returning the
+    payloads as views into `data`.
+    """
+    view = memoryview(data)
+    payloads = []
+    round = 0
+    pos = 0
+    while pos < len(view):
+        tag, pos = _decode_varint(view, pos)
+        wire_type = tag & 0x7
+        if wire_type == 0:
+            value, pos = _decode_varint(view, pos)
+            if tag == _ROUND_TAG:
+                # int32 is sign-extended to 64 bits on the wire
+                value &= 0xFFFFFFFF
+                round = value - (1 << 32) if value & 0x80000000 else value
+        elif wire_type == 2:
+            length, pos = _decode_varint(view, pos)
+            if pos + length > len(view):
+                raise ValueError("Truncated length-delimited field")
+            if tag == _PAYLOAD_TAG:
+                payloads.append(view[pos : pos + length])
+            pos += length
+        elif wire_type == 1:
+            pos += 8
+        elif wire_type == 5:
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type}")
+    return payloads, round
+
+
+def _serialize(payloads: Sequence, round: int) -> bytes:
+    parts = []
+    if round:
+        parts.append(bytes((_ROUND_TAG,)) + _encode_varint(round & (2**64 - 1)))
+    for payload in payloads:
+        parts.append(bytes((_PAYLOAD_TAG,)) + _encode_varint(len(payload)))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+def parse_forward_request(data: bytes) -> ForwardFrame:
+    """Parse a serialized ForwardMessageRequest, returning the payload as a view into
+    `data` so that receiving a packet does not copy it.
+
+    Raises:
+        ValueError: `data` is not a valid ForwardMessageRequest
+    """
+    payloads, round = _parse(data)
+    # As in protobuf, the last occurrence of a singular field wins
+    return ForwardFrame(payload=payloads[-1] if payloads else b"", round=round)
+
+
+def parse_forward_batch(data: bytes) -> ForwardBatch:
+    """Parse a serialized ForwardMessagesRequest into views of its payloads.
+
+    Raises:
+        ValueError: `data` is not a valid ForwardMessagesRequest
+    """
+    payloads, round = _parse(data)
+    return ForwardBatch(payloads=payloads, round=round)
+
+
+def serialize_forward_request(frame: ForwardFrame) -> bytes:
+    """Serialize a ForwardFrame as a ForwardMessageRequest.
+    This is the only copy of the payload made when forwarding it.
+    """
+    return _serialize([frame.payload], frame.round)
+
+
+def serialize_forward_batch(batch: ForwardBatch) -> bytes:
+    """Serialize a ForwardBatch as a ForwardMessagesRequest, copying each payload once."""
+    return _serialize(batch.payloads, batch.round)
+
+
+def split_batch(payloads: Sequence, max_bytes: int = MAX_BATCH_BYTES) -> List[list]:
+    """Split payloads into consecutive chunks of at most `max_bytes` each, so that every
+    chunk fits in a single request. A payload larger than `max_bytes` is sent alone.
+    """
+    chunks: List[list] = []
+    chunk: list = []
+    size = 0
+    for payload in payloads:
+        if chunk and size + len(payload) > max_bytes:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(payload)
+        size += len(payload)
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def add_forward_handler_to_server(servicer, server: grpc.aio.Server):
+    """Replace the generated ForwardMessage and ForwardMessages handlers with ones that
+    parse requests into views. Must be called after `add_MixServerServicer_to_server`.
+    """
+    handlers = {
+        "ForwardMessage": grpc.unary_unary_rpc_method_handler(
+            servicer.ForwardMessage,
+            request_deserializer=parse_forward_request,
+            response_serializer=ForwardMessageResponse.SerializeToString,
+        ),
+        "ForwardMessages": grpc.unary_unary_rpc_method_handler(
+            servicer.ForwardMessages,
+            request_deserializer=parse_forward_batch,
+            response_serializer=ForwardMessageResponse.SerializeToString,
+        ),
+    }
+    server.add_registered_method_handlers("mixnet.MixServer", handlers)
+
+
+def forward_message_callable(channel: grpc.aio.Channel):
+    """A ForwardMessage callable that sends ForwardFrames without a protobuf copy."""
+    return channel.unary_unary(
+        FORWARD_MESSAGE_METHOD,
+        request_serializer=serialize_forward_request,
+        response_deserializer=ForwardMessageResponse.FromString,
+    )
+
+
+def forward_messages_callable(channel: grpc.aio.Channel):
+    """A ForwardMessages callable that sends ForwardBatches without protobuf copies."""
+    return channel.unary_unary(
+        FORWARD_MESSAGES_METHOD,
+        request_serializer=serialize_forward_batch,
+        response_deserializer=ForwardMessageResponse.FromString,
+    )
@@ -0,0 +1,9 @@
+import pytest_asyncio
+
+from mixnet.testing import Cluster
+
+
+@pytest_asyncio.fixture
+async def cluster():
+    async with Cluster() as cluster:
+        yield cluster
@@ -0,0 +1,128 @@
+import asyncio
+import pstats
+
+import pytest
+
+from mixnet.admin import AdminService
+from mixnet.crypto import encrypt
+from mixnet.mixnet_pb2 import GetStatusRequest, StartProfileRequest, StopProfileRequest
+from mixnet.models import Forwarding
+from mixnet.onion import encode_layer
+from mixnet.routing import RoutingTable
+from mixnet.server import MixServer
+from mixnet.testing import Cluster, StandInServer
+from mixnet.transport import GrpcTransport, InMemoryTransport
+from mixnet.wire import ForwardFrame
+
+
+@pytest.mark.asyncio
+async def test_profile_over_admin_service(tmp_path):
+    transport = GrpcTransport()
+    async with Cluster(output_dir=str(tmp_path), transport=transport) as cluster:
+        address = f"localhost:{cluster.servers[0].port}"
+        response = await transport.call(
+            address,
+            "StartProfile",
+            StartProfileRequest(mode=StartProfileRequest.DETERMINISTIC, rounds=2),
+        )
+        assert response.status
+        assert response.path.startswith(str(tmp_path / "server_1_profile_"))
+        assert pstats.Stats(response.path).total_calls > 0
+
+        response = await transport.call(address, "StopProfile", StopProfileRequest())
+        assert not response.status
+
+
+@pytest.mark.asyncio
+async def test_sampling_profile_is_stopped_early(tmp_path):
+    async with Cluster(output_dir=str(tmp_path)) as cluster:
+        client = cluster.clients["client_1"]
+        profile = asyncio.create_task(
+            client.StartProfile(StartProfileRequest(sample_interval=0.001), None)
+        )
+        await asyncio.sleep(0.1)
+        busy = await client.StartProfile(StartProfileRequest(), None)
+        assert not busy.status and "already running" in busy.error
+        stopped = await client.StopProfile(StopProfileRequest(), None)
+        response = await profile
+        assert response.status and response.path == stopped.path
+        assert response.path.startswith(str(tmp_path / "client_1_profile_"))
+        with open(response.path) as f:
+            stacks = f.read().splitlines()
+        assert stacks and all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+
+
+@pytest.mark.asyncio
+async def test_status_shows_queues_and_a_stuck_forward():
+    transport = InMemoryTransport()
+    stand_in = StandInServer(transport, stall_first=1, stall_time=0.2)
+    await stand_in.start()
+    server = MixServer(
+        "server_1",
+        0,
+        2,
+        RoutingTable([f"localhost:{stand_in.port}"]),
+        None,
+        None,
+        transport=transport,
+        forwarding=Forwarding(deadline=None),
+    )
+    await server.start()
+    address = f"localhost:{server.port}"
+
+    async def send(round):
+        packet = encrypt(encode_layer(b"hello", 1), server.pubkey)
+        await transport.call(address, "ForwardMessage", ForwardFrame(packet, round))
+
+    try:
+        await send(0)
+        status = await transport.call(address, "GetStatus", GetStatusRequest())
+        assert (status.node_id, status.round, status.expected) == ("server_1", 0, 2)
+        (queue,) = status.queues
+        assert (queue.round, queue.messages) == (0, 1) and queue.bytes > 0
+        assert status.bytes_held == queue.bytes and not status.outputs_in_flight
+
+        await send(0)
+        await asyncio.sleep(0.1)
+        status = await transport.call(address, "GetStatus", GetStatusRequest())
+        assert status.round == 1 and not status.queues
+        assert status.outputs_in_flight == 1 and status.oldest_output_age >= 0.05
+
+        async with asyncio.timeout(2):
+            while status.outputs_in_flight:
+                await asyncio.sleep(0.01)
+                status = await transport.call(address, "GetStatus", GetStatusRequest())
+        assert stand_in.received == [b"hello", b"hello"]
+        (peer,) = status.peers
+        assert peer.address == f"localhost:{stand_in.port}"
+        assert peer.forwards == 1 and not peer.failures
+        assert peer.max_latency >= 0.2
+    finally:
+        await server.stop()
+        await stand_in.stop()
+
+
+@pytest.mark.parametrize("client_host", [False, True])
+@pytest.mark.asyncio
+async def test_client_status(client_host):
+    transport = GrpcTransport()
+    async with Cluster(transport=transport, client_host=client_host) as cluster:
+        await cluster.send("client_1", "Hello", "client_2")
+        assert await cluster.receive("client_2") == ["Hello"]
+        address = (
+            cluster.host.address if client_host else cluster.clients["client_1"].address
+        )
+        status = await transport.call(address, "GetStatus", GetStatusRequest())
+        assert status.running and status.round > 0
+        assert status.registered == (2 if client_host else 1)
+        (peer,) = status.peers
+        assert peer.address == f"localhost:{cluster.servers[0].port}"
+        assert peer.forwards > 0 and not peer.failures
+
+
+def test_admin_service_needs_a_status():
+    class NoStatus(AdminService):
+        pass
+
+    with pytest.raises(TypeError):
+        NoStatus()
@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+
+
+def test_cli_import_is_lazy():
+    code = (
+        "import sys, mixnet.cli; "
+        "print(' '.join(m for m in ('grpc', 'pydantic', 'nacl', 'mixnet.server') "
+        "if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+        check=True,
+    )
+    assert result.stdout.strip() == ""
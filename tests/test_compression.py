@@ -0,0 +1,64 @@
+import json
+import os
+
+import pytest
+
+from mixnet import compression
+from mixnet.compression import Compressor, train_dictionary
+
+PAYLOAD = json.dumps(
+    {"user": "alice", "action": "message", "text": "Hello, Bob! " * 10}
+).encode()
+
+
+@pytest.mark.parametrize("codec", ["none", "zlib"])
+def test_round_trip(codec):
+    compressor = Compressor(codec)
+    compressed = compressor.compress(PAYLOAD)
+    assert compressor.decompress(compressed) == PAYLOAD
+    if codec == "none":
+        assert compressed == PAYLOAD
+    else:
+        assert len(compressed) < len(PAYLOAD)
+
+
+def test_incompressible_payload_is_sent_raw():
+    compressor = Compressor("zlib")
+    payload = os.urandom(100)
+    compressed = compressor.compress(payload)
+    assert len(compressed) == len(payload) + 1
+    assert compressor.decompress(compressed) == payload
+
+
+def test_dictionary_shrinks_small_payloads():
+    samples = [
+        json.dumps({"user": f"user{i}", "action": "message", "text": "Hi"}).encode()
+        for i in range(50)
+    ]
+    payload = json.dumps({"user": "bob", "action": "message", "text": "Yo"}).encode()
+    dictionary = train_dictionary("zlib", samples)
+    plain = Compressor("zlib")
+    trained = Compressor("zlib", dictionary)
+    assert len(trained.compress(payload)) < len(plain.compress(payload))
+    assert trained.decompress(trained.compress(payload)) == payload
+
+
+def test_zstd_round_trip():
+    pytest.importorskip("zstandard")
+    compressor = Compressor("zstd")
+    assert compressor.decompress(compressor.compress(PAYLOAD)) == PAYLOAD
+
+
+def test_zstd_names_its_extra(monkeypatch):
+    monkeypatch.setattr(compression, "zstandard", None)
+    with pytest.raises(ImportError, match=r"mixnet\[zstd\]"):
+        Compressor("zstd")
+    with pytest.raises(ImportError, match=r"mixnet\[zstd\]"):
+        train_dictionary("zstd", [PAYLOAD])
+
+
+def test_rejects_corrupt_payload():
+    with pytest.raises(ValueError):
+        Compressor("zlib").decompress(b"\x01not zlib")
+    with pytest.raises(ValueError):
+        Compressor("lz4")
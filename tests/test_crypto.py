@@ -77,3 +77,28 @@ def test_double_encryption_and_decryption():
     assert decrypted1 == ciphertext1
     decrypted2 = crypto.decrypt(decrypted1, privkey1_b64)
     assert decrypted2 == message
+
+
+def test_secure_shuffle_is_a_permutation():
+    items = list(range(1000))
+    shuffled = crypto.secure_shuffle(items)
+    assert sorted(shuffled) == items
+    assert shuffled != items
+    assert items == list(range(1000))
+
+
+def test_secure_shuffle_covers_all_orders():
+    orders = {tuple(crypto.secure_shuffle("abc")) for _ in range(300)}
+    assert len(orders) == 6
+
+
+def test_dummy_marker_recognises_own_dummies():
+    privkey_b64, pubkey_b64 = crypto.generate_key_pair()
+    other_privkey_b64, _ = crypto.generate_key_pair()
+    marker = crypto.DummyMarker(privkey_b64)
+    dummy = marker.make(53)
+    assert len(dummy) == 53
+    assert marker.is_dummy(dummy)
+    assert not crypto.DummyMarker(other_privkey_b64).is_dummy(dummy)
+    assert not marker.is_dummy(crypto.encrypt(b"dummy", pubkey_b64))
+    assert not marker.is_dummy(b"short")
@@ -0,0 +1,40 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from mixnet.diagnostics import LoopMonitor
+from mixnet.routing import RoutingTable
+from mixnet.server import MixServer
+
+
+def blocking_call():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_stall_is_attributed_to_the_blocking_call(tmp_path):
+    path = tmp_path / "server_1_loop.json"
+    server = MixServer(
+        "server_1",
+        0,
+        1,
+        RoutingTable(),
+        None,
+        None,
+        monitor=LoopMonitor(str(path), threshold=0.05),
+    )
+    await server.start()
+    try:
+        await asyncio.sleep(0.05)
+        blocking_call()
+        await asyncio.sleep(0.05)
+    finally:
+        await server.stop()
+    diagnostics = json.loads(path.read_text())
+    assert sum(diagnostics["lag_histogram"].values()) > 1
+    assert diagnostics["lag_histogram"]["<500ms"] == 1
+    (stall,) = diagnostics["stalls"]
+    assert stall["count"] == 1 and stall["max_lag"] >= 0.25
+    assert stall["stack"][-1].endswith("in blocking_call")
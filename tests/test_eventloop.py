@@ -0,0 +1,44 @@
+import asyncio
+import sys
+
+import pytest
+
+from mixnet.eventloop import loop_factory, run
+
+
+async def task_started_eagerly() -> bool:
+    started = []
+
+    async def task():
+        started.append(True)
+
+    asyncio.get_running_loop().create_task(task())
+    # An eager task has already run when create_task returns
+    return bool(started)
+
+
+@pytest.mark.parametrize("eager_tasks", [False, True])
+def test_eager_tasks(eager_tasks):
+    assert run(task_started_eagerly(), eager_tasks=eager_tasks) == eager_tasks
+
+
+def test_uvloop():
+    uvloop = pytest.importorskip("uvloop")
+
+    async def loop_type():
+        return type(asyncio.get_running_loop())
+
+    assert run(loop_type(), "uvloop") is uvloop.Loop
+    assert loop_factory("auto") is uvloop.new_event_loop
+
+
+def test_uvloop_names_its_extra(monkeypatch):
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    with pytest.raises(ImportError, match=r"mixnet\[uvloop\]"):
+        loop_factory("uvloop")
+    assert loop_factory("auto") is None
+
+
+def test_unknown_loop():
+    with pytest.raises(ValueError):
+        loop_factory("trio")
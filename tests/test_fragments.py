@@ -0,0 +1,45 @@
+import itertools
+import os
+import random
+
+import pytest
+
+from mixnet.fragments import (
+    HEADER_BYTES,
+    Reassembler,
+    decode,
+    encode,
+    is_fragment,
+    split_message,
+)
+
+
+@pytest.mark.parametrize("k, n", [(1, 1), (1, 3), (3, 5), (4, 4)])
+def test_any_k_shards_rebuild_the_data(k, n):
+    data = os.urandom(1000)
+    shards = encode(data, k, n)
+    assert len({len(shard) for shard in shards}) == 1
+    for indices in itertools.combinations(range(n), k):
+        assert decode({i: shards[i] for i in indices}, k, len(data)) == data
+    if k > 1:
+        with pytest.raises(ValueError):
+            decode({i: shards[i] for i in range(k - 1)}, k, len(data))
+
+
+def test_reassembler_rebuilds_from_any_k_fragments():
+    data = os.urandom(5000)
+    fragments = split_message(data, 1024, 0.5)
+    assert len(fragments) == 8
+    assert all(len(fragment) == HEADER_BYTES + 1024 for fragment in fragments)
+    assert all(is_fragment(fragment) for fragment in fragments)
+    assert not is_fragment("hello".encode())
+    reassembler = Reassembler()
+    received = random.sample(fragments, 6)
+    rebuilt = [reassembler.add(fragment) for fragment in received]
+    # The 5th fragment completes the message, and the later ones are ignored
+    assert rebuilt == [None] * 4 + [data, None]
+
+
+def test_split_message_limits_fragments():
+    with pytest.raises(ValueError):
+        split_message(b"x" * 300, 1, 0)
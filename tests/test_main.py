@@ -1,124 +1,216 @@
 import asyncio
 import os
+import threading
 
 import pytest
-import pytest_asyncio
-import yaml
 
-from mixnet.client import Client
-from mixnet.models import Config
+from mixnet.compression import Compressor
+from mixnet.fragments import Reassembler
+from mixnet.mixnet_pb2 import RoundClockRequest, RoundTick
+from mixnet.models import Fragmentation, Mixing
+from mixnet.routing import RoutingTable
+from mixnet.sdk import ClientSession
 from mixnet.server import MixServer
+from mixnet.testing import Cluster
+from mixnet.transport import InMemoryTransport
 
 
-@pytest.fixture
-def config(tmp_path_factory):
-    # Create a minimal config.yaml and dummy key files in a temp dir
-    temp_dir = tmp_path_factory.mktemp("test_config")
-    temp_config_dir = os.path.join(temp_dir, "config")
-    temp_output_dir = os.path.join(temp_dir, "output")
-    os.makedirs(temp_config_dir, exist_ok=True)
-    os.makedirs(temp_output_dir, exist_ok=True)
-    # Example config data (adjust as needed for your schema)
-    config_data = {
-        "mix_servers": [
-            {"id": "server_1", "address": "localhost:50051"},
-            {"id": "server_2", "address": "localhost:50052"},
-            {"id": "server_3", "address": "localhost:50053"},
-        ],
-        "clients": [
-            {"id": "client_1", "address": "localhost:50061"},
-            {"id": "client_2", "address": "localhost:50062"},
-        ],
-        "messages_per_round": 2,
-        "round_duration": 1,
-        "dummy_payload": "dummy",
-    }
-    config_path = os.path.join(temp_config_dir, "config.yaml")
-    with open(config_path, "w", encoding="utf-8") as f:
-        yaml.safe_dump(config_data, f)
-    # Create dummy key files for servers and clients
-    for server in config_data["mix_servers"]:
-        with open(os.path.join(temp_config_dir, f"{server['id']}.key"), "wb") as f:
-            f.write(b"dummy_server_key")
-    for client in config_data["clients"]:
-        with open(os.path.join(temp_config_dir, f"{client['id']}.key"), "wb") as f:
-            f.write(b"dummy_client_key")
-    with open(config_path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
-    cfg = Config(**data)
-    cfg._temp_config_dir = temp_config_dir  # Attach for later use
-    cfg._temp_output_dir = temp_output_dir  # Attach for later use
-    return cfg
-
-
-@pytest_asyncio.fixture
-async def servers_setup(config: Config):
-    servers = []
-    mix_addrs = []
-    mix_pubkeys = []
-    for server_config in config.mix_servers:
-        port = int(server_config.address.split(":")[1])
-        server = MixServer(
-            server_config.id,
-            port,
-            config.messages_per_round,
-            [client.address for client in config.clients],
-            config_dir=config._temp_config_dir,
-            output_dir=config._temp_output_dir,
-            round_duration=config.round_duration,
-        )
-        servers.append(server)
-        mix_addrs.append(server_config.address)
-        mix_pubkeys.append(server._pubkey_b64)
-    await asyncio.gather(*(server.start() for server in servers))
-    yield mix_addrs, mix_pubkeys
-    await asyncio.gather(*(server.stop() for server in servers))
-
-
-@pytest_asyncio.fixture
-async def clients_setup(config: Config, servers_setup):
-    mix_addrs, mix_pubkeys = servers_setup
-    clients = []
-    clients_addrs = []
-    clients_pubkeys = []
-    for client_config in config.clients:
-        port = int(client_config.address.split(":")[1])
-        client = Client(
-            client_config.id,
-            client_config.address,
-            port,
-            config_dir=config._temp_config_dir,
-            mix_pubkeys=mix_pubkeys,
-            mix_addrs=mix_addrs,
-            dummy_payload=config.dummy_payload,
+@pytest.mark.asyncio
+async def test_message_exchange(cluster):
+    await asyncio.gather(
+        cluster.send("client_1", "Hello, client2!", "client_2"),
+        cluster.send("client_2", "Hello, client1!", "client_1"),
+    )
+    messages = await asyncio.gather(
+        cluster.receive("client_1"), cluster.receive("client_2")
+    )
+    assert messages == [["Hello, client1!"], ["Hello, client2!"]]
+
+
+@pytest.mark.parametrize("drop_dummies_at_exit", [True, False])
+@pytest.mark.asyncio
+async def test_exit_mix_drops_dummies(drop_dummies_at_exit):
+    async with Cluster(drop_dummies_at_exit=drop_dummies_at_exit) as cluster:
+        await cluster.send("client_1", "Hello", "client_2")
+        exit_mix = cluster.servers[-1]
+        await exit_mix.wait_for_delivery(cluster.address("client_2"))
+        status = exit_mix.status()
+        # client_2's own dummy travelled in the same round as the message, and is
+        # stored next to it only while dummies are not dropped
+        assert (status.dropped_dummies > 0) == drop_dummies_at_exit
+        [mailbox] = status.mailboxes
+        assert mailbox.address == cluster.address("client_2")
+        assert mailbox.messages == (1 if drop_dummies_at_exit else 2)
+        assert await cluster.receive("client_2") == ["Hello"]
+
+
+@pytest.mark.asyncio
+async def test_multiple_rounds(cluster):
+    for i in range(3):
+        await cluster.send("client_1", f"Hello {i}", "client_2")
+    assert await cluster.receive("client_2", count=3) == [
+        f"Hello {i}" for i in range(3)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_in_memory_transport():
+    async with Cluster(num_clients=4, transport=InMemoryTransport()) as cluster:
+        await cluster.send("client_1", "Hello", "client_4")
+        await cluster.send("client_4", "Hi", "client_1")
+        messages = await asyncio.gather(
+            cluster.receive("client_4"), cluster.receive("client_1")
         )
-        clients.append(client)
-        clients_addrs.append(client_config.address)
-        clients_pubkeys.append(client._pubkey_b64)
-    await asyncio.gather(*(client.start() for client in clients))
-    yield clients, clients_addrs, clients_pubkeys
+        assert messages == [["Hello"], ["Hi"]]
+        assert all(server.port < 10 for server in cluster.servers)
 
 
 @pytest.mark.asyncio
-async def test_message_exchange(clients_setup, config):
-    clients, clients_addrs, clients_pubkeys = clients_setup
-    client_1 = clients[0]
-    client_1_addr = clients_addrs[0]
-    client_1_pubkey = clients_pubkeys[0]
-    client_2 = clients[1]
-    client_2_addr = clients_addrs[1]
-    client_2_pubkey = clients_pubkeys[1]
+async def test_compressed_exchange():
+    async with Cluster(compressor=Compressor("zlib")) as cluster:
+        await cluster.send("client_1", '{"text": "' + "Hello " * 20 + '"}', "client_2")
+        assert await cluster.receive("client_2") == [
+            '{"text": "' + "Hello " * 20 + '"}'
+        ]
 
-    await asyncio.gather(
-        client_1._prepare_message("Hello, client2!", client_2_pubkey, client_2_addr),
-        client_2._prepare_message("Hello, client1!", client_1_pubkey, client_1_addr),
+
+@pytest.mark.asyncio
+async def test_clusters_run_concurrently():
+    async def exchange(mixing):
+        async with Cluster(num_clients=3, mixing=mixing) as cluster:
+            await cluster.send("client_3", "Hello", "client_1")
+            return await cluster.receive("client_1")
+
+    results = await asyncio.gather(
+        exchange(Mixing()),
+        exchange(Mixing(strategy="continuous", mean_delay=0.01, tick=0.002)),
     )
-    await asyncio.sleep(1)
-    await asyncio.gather(*(client.stop() for client in clients))
-    await asyncio.sleep(1)
-    messages = await asyncio.gather(
-        client_1._poll_messages(config.mix_servers[2].address),
-        client_2._poll_messages(config.mix_servers[2].address),
+    assert results == [["Hello"], ["Hello"]]
+
+
+@pytest.mark.asyncio
+async def test_prepare_messages_stream(tmp_path):
+    async with Cluster(config_dir=str(tmp_path)) as cluster:
+        async with ClientSession(cluster.config_path, "client_1") as session:
+            acks = await session.prepare_messages(
+                [(f"Hello {i}", "client_2") for i in range(3)]
+            )
+            assert all(ack.status for ack in acks)
+            rounds = [ack.round for ack in acks]
+            assert rounds == sorted(set(rounds))
+
+            with pytest.raises(ValueError):
+                await session.prepare_message("Hello", "client_3")
+        assert len(await cluster.receive("client_2", count=3)) == 3
+
+
+@pytest.mark.asyncio
+async def test_round_clock_registers_roster():
+    transport = InMemoryTransport()
+    server = MixServer(
+        "server_1", 0, 3, RoutingTable(), None, None, 0.01, transport=transport
     )
-    assert "Hello, client2!" in messages[1]
-    assert "Hello, client1!" in messages[0]
+    await server.start()
+    address = f"localhost:{server.port}"
+
+    def clock(*client_ids):
+        request = RoundClockRequest(client_ids=client_ids)
+        return aiter(transport.stream(address, "RoundClock", request))
+
+    try:
+        roster = clock("a", "b", "c")
+        ticks = [await anext(roster) for _ in range(4)]
+        assert [(tick.event, tick.round) for tick in ticks] == [
+            (RoundTick.REGISTERED, 0),
+            (RoundTick.OPEN, 0),
+            (RoundTick.CLOSE, 0),
+            (RoundTick.OPEN, 1),
+        ]
+        assert (await anext(clock("d"))).event == RoundTick.REJECTED
+        # A registered client reconnecting joins at the open round
+        reconnect = clock("a")
+        assert (await anext(reconnect)).event == RoundTick.REGISTERED
+        tick = await anext(reconnect)
+        assert tick.event == RoundTick.OPEN and tick.round >= 1
+    finally:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_client_host_serves_many_clients(tmp_path):
+    async with Cluster(
+        num_clients=3, client_host=True, config_dir=str(tmp_path)
+    ) as cluster:
+        await cluster.send("client_1", "Hello", "client_3")
+        assert await cluster.receive("client_3") == ["Hello"]
+        # The SDK reaches a hosted client through the host, naming it in requests
+        async with ClientSession(cluster.config_path, "client_2") as session:
+            assert (await session.prepare_message("Hi", "client_1")).status
+        assert await cluster.receive("client_1") == ["Hi"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("client_host", [False, True])
+async def test_session_mode_exchange(client_host):
+    async with Cluster(
+        num_clients=3,
+        transport=InMemoryTransport(),
+        client_host=client_host,
+        session_epoch=2,
+    ) as cluster:
+        # The messages are sent over several epochs, each opened by a handshake
+        for i in range(5):
+            await cluster.send("client_1", f"Hello {i}", "client_3")
+        assert await cluster.receive("client_3", count=5) == [
+            f"Hello {i}" for i in range(5)
+        ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("client_host", [False, True])
+async def test_aggregated_messages_share_a_packet(client_host):
+    async with Cluster(
+        num_clients=3,
+        transport=InMemoryTransport(),
+        client_host=client_host,
+        aggregate_bytes=512,
+    ) as cluster:
+        rounds = [
+            await cluster.send("client_1", f"Hello {i}", f"client_{2 + i % 2}")
+            for i in range(4)
+        ]
+        assert len(set(rounds)) == 1
+        messages = await asyncio.gather(
+            cluster.receive("client_2", count=2), cluster.receive("client_3", count=2)
+        )
+        assert [sorted(received) for received in messages] == [
+            ["Hello 0", "Hello 2"],
+            ["Hello 1", "Hello 3"],
+        ]
+        with pytest.raises(ValueError):
+            await cluster.send("client_1", "x" * 512, "client_2")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("client_host", [False, True])
+async def test_large_message_is_sent_in_fragments(client_host, monkeypatch):
+    message = os.urandom(3000).hex()
+    threads = set()
+    add = Reassembler.add
+
+    def add_on_thread(self, fragment):
+        threads.add(threading.current_thread())
+        return add(self, fragment)
+
+    monkeypatch.setattr(Reassembler, "add", add_on_thread)
+    async with Cluster(
+        transport=InMemoryTransport(),
+        client_host=client_host,
+        fragmentation=Fragmentation(fragment_bytes=2048, parity=0.5),
+    ) as cluster:
+        first_round = await cluster.send("client_1", "Hi", "client_2")
+        # 6000 bytes are split in 3 fragments and 2 parity fragments
+        assert await cluster.send("client_1", message, "client_2") == first_round + 5
+        assert await cluster.receive("client_2", count=2) == ["Hi", message]
+    # The fragments are decrypted on a worker thread but reassembled on the event loop
+    assert threads == {threading.main_thread()}
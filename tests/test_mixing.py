@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from mixnet.mixing import (
+    ContinuousMixing,
+    MixingStrategy,
+    PoolMixing,
+    ThresholdMixing,
+    make_mixing,
+)
+from mixnet.models import Message, Mixing
+
+
+def messages(count):
+    return [Message(f"m{i}".encode(), 4) for i in range(count)]
+
+
+class Collector:
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, messages, round):
+        self.batches.append((round, messages))
+
+
+async def run_strategy(strategy, send, duration):
+    collector = Collector()
+    strategy.bind(collector)
+    task = asyncio.create_task(strategy.run())
+    await send(strategy)
+    await asyncio.sleep(duration)
+    await strategy.stop()
+    await task
+    return collector.batches
+
+
+@pytest.mark.asyncio
+async def test_threshold_releases_full_rounds_in_order():
+    async def send(strategy):
+        await strategy.add(messages(2), 1)
+        await strategy.add(messages(1), 0)
+        await strategy.add(messages(1), 0)
+
+    batches = await run_strategy(ThresholdMixing(2), send, 0.05)
+    assert [(round, len(batch)) for round, batch in batches] == [(0, 2), (1, 2)]
+
+
+@pytest.mark.asyncio
+async def test_pool_keeps_minimum():
+    async def send(strategy):
+        await strategy.add(messages(10), 0)
+
+    strategy = PoolMixing(interval=0.02, pool_min=4, fraction=0.5)
+    batches = await run_strategy(strategy, send, 0.07)
+    # 10 in the pool: release half of the 6 above the minimum, then half of the 3 left
+    assert [len(batch) for _, batch in batches][:2] == [3, 1]
+    released = sum(len(batch) for _, batch in batches)
+    assert released + len(strategy._pool) == 10
+
+
+@pytest.mark.asyncio
+async def test_continuous_releases_every_message():
+    sent = messages(50)
+
+    async def send(strategy):
+        await strategy.add(sent, 0)
+
+    batches = await run_strategy(ContinuousMixing(0.01, tick=0.001), send, 0.5)
+    released = [message for _, batch in batches for message in batch]
+    assert sorted(released) == sorted(sent)
+    # Messages leave independently, not as a single round
+    assert len(batches) > 1
+
+
+def test_make_mixing_from_config():
+    assert isinstance(make_mixing(Mixing(), 2), ThresholdMixing)
+    assert isinstance(make_mixing(Mixing(strategy="pool"), 2), PoolMixing)
+    assert isinstance(make_mixing(Mixing(strategy="continuous"), 2), ContinuousMixing)
+
+
+@pytest.mark.parametrize(
+    "strategy",
+    [
+        lambda: ThresholdMixing(2),
+        lambda: PoolMixing(0.01),
+        lambda: ContinuousMixing(0.01),
+    ],
+)
+@pytest.mark.asyncio
+async def test_stop_before_run(strategy):
+    strategy = strategy()
+    strategy.bind(Collector())
+    await strategy.stop()
+    # A run task scheduled before the stop, but started after it, exits at once
+    async with asyncio.timeout(1):
+        await strategy.run()
+
+
+def test_incomplete_strategy_cannot_be_created():
+    class NoRun(MixingStrategy):
+        async def add(self, messages, round):
+            pass
+
+    with pytest.raises(TypeError):
+        NoRun()
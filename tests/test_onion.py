@@ -0,0 +1,151 @@
+import os
+
+import pytest
+
+from mixnet.crypto import decrypt, generate_key_pair
+from mixnet.models import Message
+from mixnet.onion import (
+    Bundle,
+    Route,
+    build_onion,
+    build_onions,
+    decode_bundle,
+    decode_layer,
+    encode_layer,
+)
+from mixnet.routing import RoutingTable
+from mixnet.server import MixServer
+
+
+@pytest.fixture
+def mix_servers(tmp_path):
+    return [
+        MixServer(f"server_{i}", 0, 1, RoutingTable(), str(tmp_path), str(tmp_path))
+        for i in range(1, 4)
+    ]
+
+
+@pytest.fixture
+def route(mix_servers):
+    return Route([server._pubkey_b64 for server in mix_servers], [1, 2, 3])
+
+
+def peel_all(mix_servers, packet: bytes, round: int = 0):
+    next_hops = []
+    for server in mix_servers:
+        message = server._peel(packet, round)
+        next_hops.append(message.next_hop)
+        packet = message.payload
+    return next_hops, bytes(packet)
+
+
+def test_layer_round_trip():
+    layer = bytearray(encode_layer(b"\x00\x01ciphertext", 2))
+    message = decode_layer(layer)
+    assert message == Message(payload=b"\x00\x01ciphertext", next_hop=2)
+    assert message.payload.obj is layer
+
+
+def test_decode_layer_rejects_truncated_next_hop():
+    with pytest.raises(ValueError):
+        decode_layer(encode_layer(b"", 2)[:3])
+
+
+def test_build_onion_is_peeled_by_mix_servers(tmp_path, mix_servers, route):
+    privkey, pubkey = generate_key_pair(os.path.join(tmp_path, "client.key"))
+    packet = build_onion(b"hello", pubkey, 4, route)
+    next_hops, payload = peel_all(mix_servers, packet)
+    assert next_hops == [2, 3, 4]
+    assert decrypt(payload, privkey) == b"hello"
+
+
+def test_build_onions_batch(tmp_path, mix_servers, route):
+    keys = [
+        generate_key_pair(os.path.join(tmp_path, f"client_{i}.key")) for i in range(3)
+    ]
+    messages = [f"message {i}".encode() for i in range(20)]
+    recipients = [keys[i % 3] for i in range(20)]
+    ids = [4 + i % 3 for i in range(20)]
+    packets = build_onions(
+        messages, [pub for _, pub in recipients], ids, route, max_workers=4
+    )
+    assert len(packets) == len(messages)
+    for packet, message, (privkey, _), node_id in zip(
+        packets, messages, recipients, ids
+    ):
+        next_hops, payload = peel_all(mix_servers, packet)
+        assert next_hops[-1] == node_id
+        assert decrypt(payload, privkey) == message
+
+
+def test_build_onions_rejects_mismatched_lengths(route):
+    with pytest.raises(ValueError):
+        build_onions([b"a", b"b"], [b"key"], [4], route)
+
+
+def test_session_layers_are_peeled_across_epochs(tmp_path, route):
+    mix_servers = [
+        MixServer(
+            f"server_{i}", 0, 1, RoutingTable(), str(tmp_path), None, session_epoch=4
+        )
+        for i in range(1, 4)
+    ]
+    route = Route([server.pubkey for server in mix_servers], [1, 2, 3])
+    privkey, pubkey = generate_key_pair(os.path.join(tmp_path, "client.key"))
+    sessions = route.open_sessions(4, start=2)
+    sealed = route.wrap(b"x" * 60, 4)
+    # Rounds 2 and 4 open the epochs, the others are sealed with round keys
+    for round in range(2, 10):
+        # Every other round is sealed with seals taken from the sessions beforehand
+        seals = sessions.round_seals(round) if round % 2 == 0 else sessions
+        packet = build_onion(b"hello", pubkey, 4, route, seals, round)
+        assert len(packet) == len(build_onion(b"hello", pubkey, 4, route))
+        next_hops, payload = peel_all(mix_servers, packet, round)
+        assert next_hops == [2, 3, 4]
+        assert decrypt(payload, privkey) == b"hello"
+        assert len(mix_servers[0]._sessions) == (0 if round < 2 else 1)
+        sessions.forget(round + 1)
+    # A round key opens a single layer, and sealed layers are still peeled
+    with pytest.raises(ValueError):
+        peel_all(mix_servers, route.wrap(b"x" * 60, 4, sessions, 9), 9)
+    assert peel_all(mix_servers, sealed, 9)[0] == [2, 3, 4]
+
+
+def test_sessions_refuse_replayed_and_extra_handshakes(tmp_path):
+    server = MixServer(
+        "server_1", 0, 1, RoutingTable(), str(tmp_path), None, session_epoch=4
+    )
+    route = Route([server.pubkey], [1])
+    handshake = route.wrap(b"x" * 60, 4, route.open_sessions(4, start=4), 4)
+    assert server._peel(handshake, 4).next_hop == 4
+    # Replaying the handshake does not open another session
+    assert server._peel(handshake, 4).next_hop == 4
+    assert len(server._sessions) == 1
+    # A threshold round of one packet takes one client, so one session per epoch
+    other = route.wrap(b"y" * 60, 4, route.open_sessions(4, start=4), 4)
+    assert server._peel(other, 4).next_hop == 4
+    assert len(server._sessions) == 1
+
+
+def test_bundle_round_trip():
+    bundle = Bundle(64)
+    assert bundle.add(b"a" * 20, 4) and bundle.add(b"b" * 20, 5)
+    assert not bundle.add(b"c" * 20, 6)
+    payload = bundle.encode()
+    assert len(payload) == 64
+    assert decode_bundle(payload) == [Message(b"a" * 20, 4), Message(b"b" * 20, 5)]
+    assert decode_bundle(Bundle(64).encode()) == []
+    with pytest.raises(ValueError):
+        decode_bundle(payload[:40])
+
+
+def test_routing_table_ids():
+    routing = RoutingTable(["localhost:50051", "localhost:50052"], ["localhost:50061"])
+    assert routing.node_id("localhost:50052") == 2
+    assert routing.address(3) == "localhost:50061"
+    assert routing.is_client(3) and not routing.is_client(1)
+    assert not routing.is_client(0) and not routing.is_client(99)
+    with pytest.raises(ValueError):
+        routing.node_id("localhost:1")
+    with pytest.raises(ValueError):
+        routing.address(0)
@@ -0,0 +1,233 @@
+import asyncio
+
+import pytest
+
+from mixnet.client import Client
+from mixnet.crypto import encrypt, generate_key_pair
+from mixnet.host import ClientHost
+from mixnet.mixnet_pb2 import RoundTick
+from mixnet.models import Forwarding
+from mixnet.onion import encode_layer
+from mixnet.resilience import CircuitBreaker
+from mixnet.routing import RoutingTable
+from mixnet.server import MixServer
+from mixnet.testing import StandInServer
+from mixnet.transport import InMemoryTransport
+from mixnet.wire import ForwardBatch, ForwardFrame
+
+
+async def start_mix(transport, stand_in, forwarding, messages_per_round=1):
+    """Starts a mix server whose next (and exit) hop is the stand-in."""
+    await stand_in.start()
+    routing = RoutingTable([f"localhost:{stand_in.port}"])
+    server = MixServer(
+        "server_1",
+        0,
+        messages_per_round,
+        routing,
+        None,
+        None,
+        transport=transport,
+        forwarding=forwarding,
+    )
+    await server.start()
+    return server
+
+
+async def send(transport, server, round, packet=None):
+    packet = packet or encrypt(encode_layer(b"hello", 1), server.pubkey)
+    await transport.call(
+        f"localhost:{server.port}", "ForwardMessage", ForwardFrame(packet, round)
+    )
+
+
+async def wait_until(predicate, timeout=1):
+    async with asyncio.timeout(timeout):
+        while not predicate():
+            await asyncio.sleep(0.005)
+
+
+def test_circuit_breaker_opens_and_recovers():
+    now = [0.0]
+    breaker = CircuitBreaker(failures=2, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open and not breaker.allow()
+    now[0] = 10
+    # A single trial call is let through, and its failure opens the circuit again
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open and breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_forward_retries_transient_failures():
+    transport = InMemoryTransport()
+    stand_in = StandInServer(transport, fail_first=2)
+    server = await start_mix(transport, stand_in, Forwarding(backoff=0.001))
+    try:
+        await send(transport, server, 0)
+        await wait_until(lambda: stand_in.received)
+        assert stand_in.received == [b"hello"]
+        assert stand_in.calls == 3
+    finally:
+        await server.stop()
+        await stand_in.stop()
+
+
+@pytest.mark.asyncio
+async def test_stalled_peer_does_not_hold_up_rounds():
+    transport = InMemoryTransport()
+    stand_in = StandInServer(transport, stall_rate=1)
+    forwarding = Forwarding(
+        deadline=0.02, retries=1, backoff=0.001, breaker_failures=100
+    )
+    server = await start_mix(transport, stand_in, forwarding)
+    try:
+        for round in range(3):
+            await send(transport, server, round)
+        await wait_until(lambda: server._failed_forwards == 3)
+        assert stand_in.calls == 6
+    finally:
+        await server.stop()
+        await stand_in.stop()
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_fails_fast():
+    transport = InMemoryTransport()
+    stand_in = StandInServer(transport, failure_rate=1)
+    forwarding = Forwarding(retries=0, breaker_failures=2)
+    server = await start_mix(transport, stand_in, forwarding)
+    try:
+        for round in range(4):
+            await send(transport, server, round)
+        await wait_until(lambda: server._failed_forwards == 4)
+        assert stand_in.calls == 2
+    finally:
+        await server.stop()
+        await stand_in.stop()
+
+
+@pytest.mark.asyncio
+async def test_exit_hop_is_hedged():
+    transport = InMemoryTransport()
+    stand_in = StandInServer(transport, stall_first=1)
+    forwarding = Forwarding(deadline=None, retries=0, hedge_delay=0.01)
+    server = await start_mix(transport, stand_in, forwarding)
+    try:
+        await send(transport, server, 0)
+        await wait_until(lambda: stand_in.received)
+        assert stand_in.received == [b"hello"]
+        assert stand_in.calls == 2
+    finally:
+        await server.stop()
+        await stand_in.stop()
+
+
+@pytest.mark.asyncio
+async def test_duplicate_packets_are_mixed_once():
+    transport = InMemoryTransport()
+    stand_in = StandInServer(transport)
+    server = await start_mix(transport, stand_in, Forwarding(), messages_per_round=2)
+    try:
+        packet = encrypt(encode_layer(b"hello", 1), server.pubkey)
+        await send(transport, server, 0, packet)
+        await send(transport, server, 0, packet)
+        assert len(server._mixing.messages[0]) == 1
+        assert server._duplicates == 1
+    finally:
+        await server.stop()
+        await stand_in.stop()
+
+
+@pytest.mark.asyncio
+async def test_corrupt_packet_does_not_drop_its_batch():
+    transport = InMemoryTransport()
+    stand_in = StandInServer(transport)
+    server = await start_mix(transport, stand_in, Forwarding(), messages_per_round=2)
+    try:
+        batch = ForwardBatch(
+            [
+                encrypt(encode_layer(b"first", 1), server.pubkey),
+                b"corrupt" * 20,
+                encrypt(encode_layer(b"second", 1), server.pubkey),
+            ],
+            0,
+        )
+        # The retry finds the good packets already stored
+        for _ in range(2):
+            await transport.call(f"localhost:{server.port}", "ForwardMessages", batch)
+        await wait_until(lambda: len(stand_in.received) == 2)
+        assert sorted(stand_in.received) == [b"first", b"second"]
+        assert server._duplicates == 2
+    finally:
+        await server.stop()
+        await stand_in.stop()
+
+
+@pytest.mark.asyncio
+async def test_client_host_survives_a_failed_round():
+    transport = InMemoryTransport()
+    stand_in = StandInServer(transport, fail_first=1)
+    await stand_in.start()
+    mix_addr = f"localhost:{stand_in.port}"
+    routing = RoutingTable([mix_addr])
+    host = ClientHost(
+        "localhost:0",
+        0,
+        None,
+        [generate_key_pair()[1]],
+        [mix_addr],
+        routing,
+        transport=transport,
+    )
+    for i in range(3):
+        address = f"client_{i}@host"
+        routing.add(address, client=True)
+        host.add(f"client_{i}", address)
+    try:
+        await host._send_round(0)
+        assert host._failed_rounds == 1 and not stand_in.received
+        await host._send_round(1)
+        assert len(stand_in.received) == 3
+        assert host.status().failed_forwards == 3
+    finally:
+        await stand_in.stop()
+
+
+@pytest.mark.asyncio
+async def test_client_survives_a_failed_send():
+    transport = InMemoryTransport()
+    stand_in = StandInServer(transport, fail_first=1)
+    await stand_in.start()
+    mix_addr = f"localhost:{stand_in.port}"
+    routing = RoutingTable([mix_addr], ["client:1"])
+    client = Client(
+        "client_1",
+        "client:1",
+        1,
+        None,
+        [generate_key_pair()[1]],
+        [mix_addr],
+        routing,
+        transport=transport,
+    )
+
+    async def ticks():
+        for round in range(2):
+            yield RoundTick(event=RoundTick.CLOSE, round=round)
+
+    client._ticks = ticks()
+    try:
+        await client.run_forever()
+        # The first round's dummy is dropped, and the client sends the second one
+        assert len(stand_in.received) == 1
+        assert client.status().failed_forwards == 1
+    finally:
+        await stand_in.stop()
@@ -0,0 +1,66 @@
+import asyncio
+import random
+
+import pytest
+
+from mixnet.timer_wheel import TimerScheduler, TimerWheel
+
+
+def test_expires_each_item_at_its_tick():
+    wheel = TimerWheel(levels=3)
+    rng = random.Random(1)
+    delays = [
+        rng.choice([1, 255, 256, 257, 65535, 65536, rng.randrange(1, 200_000)])
+        for _ in range(2000)
+    ]
+    for item, delay in enumerate(delays):
+        wheel.insert(item, delay)
+    expired_at = {}
+    while len(wheel):
+        for item in wheel.advance():
+            expired_at[item] = wheel.tick
+    assert expired_at == dict(enumerate(delays))
+
+
+def test_insert_counts_from_current_tick():
+    wheel = TimerWheel()
+    wheel.advance(250)
+    wheel.insert("a", 10)  # Crosses the first level boundary
+    assert wheel.advance(9) == []
+    assert wheel.advance() == ["a"]
+    assert wheel.tick == 260
+
+
+def test_delay_is_clamped_to_wheel_span():
+    wheel = TimerWheel(levels=1)
+    wheel.insert("now", 0)
+    wheel.insert("late", 1000)
+    assert wheel.advance() == ["now"]
+    assert wheel.advance(254) == ["late"]
+
+
+def test_clear_returns_pending_items():
+    wheel = TimerWheel()
+    for delay in (1, 300, 100_000):
+        wheel.insert(delay, delay)
+    assert sorted(wheel.clear()) == [1, 300, 100_000]
+    assert len(wheel) == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_releases_batches_per_tick():
+    batches = []
+    scheduler = TimerScheduler(0.005, lambda items, tick: batches.append(items))
+    for item in range(100):
+        scheduler.schedule(item, 0.02 if item % 2 else 0.04)
+    await asyncio.sleep(0.1)
+    assert batches == [list(range(1, 100, 2)), list(range(0, 100, 2))]
+    assert len(scheduler) == 0
+    assert scheduler._handle is None
+
+
+@pytest.mark.asyncio
+async def test_scheduler_cancel():
+    scheduler = TimerScheduler(0.01, lambda items, tick: pytest.fail("released"))
+    scheduler.schedule("a", 1)
+    assert scheduler.cancel() == ["a"]
@@ -0,0 +1,121 @@
+import asyncio
+
+import grpc
+import pytest
+
+from mixnet.crypto import encrypt
+from mixnet.mixnet_pb2 import PollMessagesRequest
+from mixnet.models import GrpcTuning
+from mixnet.onion import encode_layer
+from mixnet.routing import RoutingTable
+from mixnet.server import MixServer
+from mixnet.transport import (
+    GrpcTransport,
+    InMemoryTransport,
+    Transport,
+    grpc_options,
+)
+from mixnet.wire import ForwardFrame
+
+
+def test_grpc_options():
+    options = dict(
+        grpc_options(
+            GrpcTuning(
+                max_message_bytes=1024,
+                initial_window_bytes=2048,
+                keepalive_time_ms=10_000,
+                keepalive_timeout_ms=5_000,
+            )
+        )
+    )
+    assert options["grpc.max_send_message_length"] == 1024
+    assert options["grpc.max_receive_message_length"] == 1024
+    assert options["grpc.http2.lookahead_bytes"] == 2048
+    assert options["grpc.http2.bdp_probe"] == 0
+    assert options["grpc.keepalive_time_ms"] == 10_000
+    assert options["grpc.keepalive_timeout_ms"] == 5_000
+    assert grpc_options(GrpcTuning(max_message_bytes=None)) == []
+
+
+@pytest.mark.parametrize("max_message_bytes", [None, 64 * 1024 * 1024])
+@pytest.mark.asyncio
+async def test_large_packet_needs_tuning(tmp_path, max_message_bytes):
+    tuning = GrpcTuning(max_message_bytes=max_message_bytes)
+    transport = GrpcTransport(tuning)
+    server = MixServer(
+        "server_1", 0, 2, RoutingTable(), None, str(tmp_path), transport=transport
+    )
+    await server.start()
+    packet = encrypt(encode_layer(b"y" * 5_000_000, 2), server.pubkey)
+    request = ForwardFrame(packet, 0)
+    try:
+        if max_message_bytes is None:
+            # gRPC receives at most 4 MB by default
+            with pytest.raises(grpc.aio.AioRpcError) as e:
+                await transport.call(
+                    f"localhost:{server.port}", "ForwardMessage", request
+                )
+            assert e.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+        else:
+            await transport.call(f"localhost:{server.port}", "ForwardMessage", request)
+            assert len(server._mixing.messages[0]) == 1
+    finally:
+        await transport.close()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_calls_reuse_pooled_channel():
+    server = MixServer("server_1", 0, 2, RoutingTable(), None, None)
+    await server.start()
+    transport = GrpcTransport()
+    address = f"localhost:{server.port}"
+    request = PollMessagesRequest(client_addr="localhost:1")
+    try:
+        for _ in range(3):
+            await transport.call(address, "PollMessages", request)
+        assert list(transport._channels) == [address]
+        await transport.close()
+        assert not transport._channels
+        # A closed transport reopens its channels on the next call
+        await transport.call(address, "PollMessages", request)
+    finally:
+        await transport.close()
+        await server.stop()
+
+
+class SlowServicer:
+    def __init__(self):
+        self.stored = False
+
+    async def Store(self, request, context):
+        await asyncio.sleep(0.05)
+        self.stored = True
+        return request
+
+
+@pytest.mark.asyncio
+async def test_in_memory_timeout_does_not_cancel_the_callee():
+    transport = InMemoryTransport()
+    servicer = SlowServicer()
+    listener = transport.bind(servicer, 0)
+    address = f"localhost:{listener.port}"
+    with pytest.raises(TimeoutError):
+        await transport.call(address, "Store", b"packet", timeout=0.01)
+    # The handler finishes even though its caller gave up
+    await asyncio.sleep(0.1)
+    assert servicer.stored
+    assert await transport.call(address, "Store", b"packet", timeout=1) == b"packet"
+
+
+def test_incomplete_transport_cannot_be_created():
+    class NoStream(Transport):
+        def bind(self, servicer, port):
+            pass
+
+        async def call(self, address, method, request, timeout=None):
+            pass
+
+    with pytest.raises(TypeError):
+        NoStream()
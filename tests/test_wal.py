@@ -0,0 +1,220 @@
+import asyncio
+import os
+from unittest.mock import Mock
+
+import pytest
+
+from mixnet.crypto import encrypt
+from mixnet.models import Message
+from mixnet.onion import encode_layer
+from mixnet.routing import RoutingTable
+from mixnet.server import MixServer
+from mixnet.transport import InMemoryTransport
+from mixnet.wal import WriteAheadLog
+from mixnet.wire import ForwardFrame
+
+
+def test_recover_restores_state(tmp_path):
+    wal = WriteAheadLog(str(tmp_path))
+    wal.recover()
+    wal.append_register("client_1")
+    wal.append_packet(0, b"first")
+    wal.append_packet(0, b"second")
+    wal.end_round(0)
+    wal.append_packet(1, b"third")
+    wal.append_deliver("localhost:1", b"hello", 0)
+    wal.append_deliver("localhost:2", b"bye", 0)
+    wal.append_poll("localhost:2")
+    wal.close()
+
+    recovered = WriteAheadLog(str(tmp_path))
+    recovered.recover()
+    assert recovered.round == 1
+    assert recovered.packets == {1: [b"third"]}
+    assert recovered.mailbox == {"localhost:1": [b"hello"]}
+    assert recovered.registered == {"client_1"}
+    recovered.close()
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    wal = WriteAheadLog(str(tmp_path))
+    wal.recover()
+    wal.append_packet(0, b"complete")
+    wal.append_packet(0, b"torn")
+    wal.close()
+    (segment,) = [name for name in os.listdir(tmp_path) if name.endswith(".wal")]
+    path = os.path.join(tmp_path, segment)
+    os.truncate(path, os.path.getsize(path) - 2)
+
+    recovered = WriteAheadLog(str(tmp_path))
+    recovered.recover()
+    assert recovered.packets == {0: [b"complete"]}
+    recovered.close()
+
+
+def test_compaction_replaces_old_segments(tmp_path):
+    wal = WriteAheadLog(str(tmp_path), compact_every=2)
+    wal.recover()
+    for round in range(5):
+        wal.append_packet(round, f"packet {round}".encode())
+        wal.end_round(round)
+    wal.append_packet(5, b"pending")
+    wal.close()
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".wal")]) == 1
+
+    recovered = WriteAheadLog(str(tmp_path))
+    recovered.recover()
+    assert recovered.round == 5
+    assert recovered.packets == {5: [b"pending"]}
+    recovered.close()
+
+
+def test_server_resumes_round_after_restart(tmp_path):
+    config_dir, output_dir, wal_dir = (
+        str(tmp_path / name) for name in ("config", "output", "wal")
+    )
+    os.makedirs(config_dir)
+    os.makedirs(output_dir)
+    server = MixServer(
+        "server_1", 0, 2, RoutingTable(), config_dir, output_dir, wal_dir=wal_dir
+    )
+    message = Message(payload=b"inner", next_hop=2)
+    payload = encrypt(encode_layer(*message), server._pubkey_b64)
+    server._wal.recover()
+    server._wal.append_register("client_1")
+    server._wal.append_packet(0, payload)
+    server._wal.close()
+
+    restarted = MixServer(
+        "server_1", 0, 2, RoutingTable(), config_dir, output_dir, wal_dir=wal_dir
+    )
+    assert restarted._pubkey_b64 == server._pubkey_b64
+    restarted._recover()
+    assert restarted._mixing.round == 0
+    assert restarted._registered_clients == {"client_1"}
+    assert restarted._mixing.messages == {0: [message]}
+    restarted._wal.close()
+
+
+@pytest.mark.asyncio
+async def test_released_round_remembers_its_deliveries(tmp_path):
+    wal = WriteAheadLog(str(tmp_path))
+    wal.recover()
+    wal.append_packet(0, b"packet")
+    await wal.release_round(0)
+    wal.append_deliver("localhost:1", b"hello", 0)
+    wal.close()
+
+    # Recovering twice also replays the checkpoint written by the first recovery
+    for _ in range(2):
+        recovered = WriteAheadLog(str(tmp_path))
+        recovered.recover()
+        assert recovered.round == 0 and recovered.packets == {0: [b"packet"]}
+        assert recovered.was_delivered(0, "localhost:1", b"hello")
+        assert not recovered.was_delivered(0, "localhost:1", b"other")
+        recovered.close()
+
+    recovered = WriteAheadLog(str(tmp_path))
+    recovered.recover()
+    recovered.end_round(0)
+    assert not recovered.was_delivered(0, "localhost:1", b"hello")
+    assert recovered.mailbox == {"localhost:1": [b"hello"]}
+    recovered.close()
+
+
+@pytest.mark.asyncio
+async def test_server_acknowledges_durable_packets_and_delivers_once(tmp_path):
+    wal_dir = str(tmp_path / "wal")
+    routing = RoutingTable()
+    routing.add("localhost:1", client=True)
+    client_id = routing.node_id("localhost:1")
+    server = MixServer("server_1", 0, 2, routing, None, None, wal_dir=wal_dir)
+    server._recover()
+    for text in (b"first", b"second"):
+        payload = encrypt(encode_layer(text, client_id), server._pubkey_b64)
+        await server.ForwardMessage(ForwardFrame(payload, 0), Mock())
+        # The sender is acknowledged only once its packet is on disk
+        assert server._wal._synced == server._wal._appended
+    # The server crashes after delivering the first payload of the released round
+    await server._wal.release_round(0)
+    server._deliver("localhost:1", [b"first"], 0)
+    server._wal.close()
+
+    restarted = MixServer("server_1", 0, 2, routing, None, None, wal_dir=wal_dir)
+    restarted._recover()
+    await restarted._release(restarted._mixing.messages.pop(0), 0)
+    assert sorted(restarted._final_messages["localhost:1"]) == [b"first", b"second"]
+    restarted._wal.close()
+
+
+@pytest.mark.asyncio
+async def test_recovered_packets_are_not_accepted_again(tmp_path):
+    wal_dir = str(tmp_path / "wal")
+    server = MixServer("server_1", 0, 2, RoutingTable(), None, None, wal_dir=wal_dir)
+    server._recover()
+    payload = encrypt(encode_layer(b"inner", 2), server._pubkey_b64)
+    await server.ForwardMessage(ForwardFrame(payload, 0), Mock())
+    server._wal.close()
+
+    restarted = MixServer("server_1", 0, 2, RoutingTable(), None, None, wal_dir=wal_dir)
+    restarted._recover()
+    # The upstream mix retries the forward it got no response to
+    await restarted.ForwardMessage(ForwardFrame(payload, 0), Mock())
+    assert len(restarted._mixing.messages[0]) == 1
+    assert restarted._wal.packets == {0: [payload]}
+    restarted._wal.close()
+
+
+@pytest.mark.asyncio
+async def test_syncs_within_the_delay_share_an_fsync(tmp_path, monkeypatch):
+    wal = WriteAheadLog(str(tmp_path), sync_delay=0.01)
+    wal.recover()
+    fsyncs = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: fsyncs.append(fd) or fsync(fd))
+
+    async def append_and_sync(index):
+        await asyncio.sleep(0.001 * index)
+        wal.append_packet(0, b"packet %d" % index)
+        await wal.sync()
+
+    await asyncio.gather(*(append_and_sync(index) for index in range(5)))
+    assert len(fsyncs) == 1 and wal._synced == wal._appended
+    wal.close()
+
+
+@pytest.mark.asyncio
+async def test_round_shares_its_fsyncs(tmp_path, monkeypatch):
+    transport = InMemoryTransport()
+    server = MixServer(
+        "server_1",
+        0,
+        10,
+        RoutingTable(),
+        None,
+        None,
+        wal_dir=str(tmp_path),
+        transport=transport,
+    )
+    await server.start()
+    fsyncs = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: fsyncs.append(fd) or fsync(fd))
+    try:
+        await asyncio.gather(
+            *(
+                transport.call(
+                    f"localhost:{server.port}",
+                    "ForwardMessage",
+                    ForwardFrame(encrypt(encode_layer(b"hello", 2), server.pubkey), 0),
+                )
+                for _ in range(10)
+            )
+        )
+        async with asyncio.timeout(1):
+            while server._wal.round == 0:
+                await asyncio.sleep(0.005)
+        # One fsync acknowledges the round's packets, and one checkpoints its release
+        assert len(fsyncs) == 2
+    finally:
+        await server.stop()
@@ -0,0 +1,98 @@
+import sys
+import tracemalloc
+
+import nacl._sodium
+import pytest
+
+from mixnet.crypto import encrypt
+from mixnet.mixnet_pb2 import ForwardMessageRequest, ForwardMessagesRequest
+from mixnet.onion import encode_layer
+from mixnet.routing import RoutingTable
+from mixnet.server import MixServer
+from mixnet.wire import (
+    ForwardFrame,
+    parse_forward_batch,
+    parse_forward_request,
+    serialize_forward_batch,
+    serialize_forward_request,
+    split_batch,
+)
+
+
+@pytest.mark.parametrize("round", [0, 1, 300, 2**31 - 1, -1])
+def test_frames_match_protobuf(round):
+    request = ForwardMessageRequest(payload=b"payload" * 50, round=round)
+    frame = parse_forward_request(request.SerializeToString())
+    assert bytes(frame.payload) == request.payload
+    assert frame.round == round
+    assert ForwardMessageRequest.FromString(serialize_forward_request(frame)) == request
+
+
+def test_batches_match_protobuf():
+    request = ForwardMessagesRequest(payloads=[b"a" * 10, b"", b"c" * 300], round=7)
+    batch = parse_forward_batch(request.SerializeToString())
+    assert [bytes(payload) for payload in batch.payloads] == list(request.payloads)
+    assert batch.round == 7
+    assert ForwardMessagesRequest.FromString(serialize_forward_batch(batch)) == request
+
+
+def test_split_batch_respects_limit():
+    payloads = [b"x" * 40, b"x" * 40, b"x" * 40, b"x" * 200, b"x" * 10]
+    chunks = split_batch(payloads, max_bytes=100)
+    assert chunks == [payloads[:2], payloads[2:3], payloads[3:4], payloads[4:]]
+    assert split_batch([]) == []
+
+
+def test_parse_payload_is_a_view():
+    data = ForwardMessageRequest(payload=b"payload", round=2).SerializeToString()
+    frame = parse_forward_request(data)
+    assert frame.payload.obj is data
+
+
+def test_parse_rejects_truncated_payload():
+    data = ForwardMessageRequest(payload=b"payload", round=2).SerializeToString()
+    with pytest.raises(ValueError):
+        parse_forward_request(data[:-1])
+
+
+class CountingFFI:
+    """Counts the bytes of the cffi buffers allocated with `new`, which tracemalloc
+    does not see.
+    """
+
+    def __init__(self, ffi):
+        self._ffi = ffi
+        self.allocated = 0
+
+    def new(self, cdecl, init=None):
+        buffer = self._ffi.new(cdecl, init)
+        self.allocated += self._ffi.sizeof(buffer)
+        return buffer
+
+    def __getattr__(self, name):
+        return getattr(self._ffi, name)
+
+
+def test_hop_copies_payload_once(tmp_path, monkeypatch):
+    size = 1_000_000
+    original = nacl._sodium.ffi
+    ffi = CountingFFI(original)
+    for module in list(sys.modules.values()):
+        if getattr(module, "ffi", None) is original:
+            monkeypatch.setattr(module, "ffi", ffi)
+    server = MixServer("server_1", 0, 1, RoutingTable(), str(tmp_path), str(tmp_path))
+    packet = encrypt(encode_layer(b"y" * size, 2), server._pubkey_b64)
+    data = ForwardMessageRequest(payload=packet, round=3).SerializeToString()
+
+    ffi.allocated = 0
+    tracemalloc.start()
+    frame = parse_forward_request(data)
+    message = server._peel(frame.payload, frame.round)
+    forwarded = serialize_forward_request(ForwardFrame(message.payload, frame.round))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # One buffer that libsodium decrypts into, and one copy into the outgoing frame
+    assert peak + ffi.allocated < 2.1 * size
+    assert message.next_hop == 2
+    assert ForwardMessageRequest.FromString(forwarded).payload == b"y" * size